@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Categoria, Proveedor, Producto, Cliente, Empleado, FacturaVenta, DetalleVenta, Movimiento
+from .models import Categoria, Proveedor, Producto, Cliente, Empleado, FacturaVenta, DetalleVenta, Movimiento, ReporteJob, Kardex
 from ..usuario import *
 
 
@@ -11,4 +11,5 @@ admin.site.register(Empleado)
 admin.site.register(FacturaVenta)
 admin.site.register(DetalleVenta)
 admin.site.register(Movimiento)
-
+admin.site.register(ReporteJob)
+admin.site.register(Kardex)
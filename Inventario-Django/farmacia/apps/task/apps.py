@@ -1,10 +1,21 @@
 
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 class TaskConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField' 
     name = 'apps.task'
 
+    def ready(self):
+        from . import signals  # noqa: F401  Conecta las señales de stock y totales
+        post_migrate.connect(_instalar_busqueda, sender=self)
+
+
+def _instalar_busqueda(using, **kwargs):
+    """El indice de texto de productos vive fuera del ORM (FTS5 / pg_trgm): se crea tras migrate."""
+    from .busqueda import instalar
+    instalar(using)
+
     
 
 
@@ -0,0 +1,124 @@
+"""Indice de prefijos en memoria para autocompletar nombres de productos.
+
+La pantalla de ventas descargaba el catalogo completo para filtrarlo en el
+navegador. /productos/autocomplete/?q= responde con pocos productos a partir
+de un indice por proceso:
+
+- dos arreglos ordenados de nombres normalizados (sin acentos, minusculas):
+  el nombre completo y el resto del nombre desde cada palabra siguiente, asi
+  'ibu' encuentra 'Ibuprofeno 400 mg' y tambien 'Advil ibuprofeno';
+- una busqueda es bisect + recorrido hasta juntar `limite` ids: primero los
+  nombres que empiezan por q, despues los que lo tienen al inicio de otra palabra.
+
+Precio y stock no se guardan en el indice (el stock cambia con cada venta por
+UPDATE, sin señales): se leen por clave primaria para los pocos ids hallados.
+
+Crear, borrar o renombrar un producto sube, al confirmar la transaccion, una
+version en la cache AUTOCOMPLETADO_CACHE_ALIAS; cada proceso reconstruye su
+indice la proxima vez que ve una version distinta. Con una cache compartida
+(Redis) todos los workers se enteran; con una local solo el proceso que hizo
+el cambio, asi que los indices duran AUTOCOMPLETADO_SEGUNDOS_LOCAL. Las cargas
+con bulk_create deben llamar a `invalidar()`.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .busqueda import normalizar
+from .models import Producto
+
+CLAVE_VERSION = 'autocompletado:version'
+LIMITE_MAXIMO = 50
+
+
+class IndicePrefijos:
+    """Arreglos ordenados (clave normalizada, id) para buscar por prefijo."""
+
+    def __init__(self, productos):
+        nombres, palabras = [], []
+        for pk, nombre in productos:
+            clave = ' '.join(normalizar(nombre).split())
+            nombres.append((clave, pk))
+            inicio = clave.find(' ')
+            while inicio != -1:  # El resto del nombre desde cada palabra siguiente
+                palabras.append((clave[inicio + 1:], pk))
+                inicio = clave.find(' ', inicio + 1)
+        nombres.sort()
+        palabras.sort()
+        self._arreglos = [([clave for clave, _ in arreglo], [pk for _, pk in arreglo])
+                          for arreglo in (nombres, palabras)]
+
+    def __len__(self):
+        return len(self._arreglos[0][0])
+
+    def buscar(self, texto, limite=10):
+        """Ids cuyo nombre (o una de sus palabras) empieza por `texto`, hasta `limite`."""
+        prefijo = ' '.join(normalizar(texto).split())
+        if not prefijo:
+            return []
+        encontrados = {}  # dict: sin repetidos y en orden
+        for claves, ids in self._arreglos:
+            posicion = bisect_left(claves, prefijo)
+            while posicion < len(claves) and len(encontrados) < limite and claves[posicion].startswith(prefijo):
+                encontrados.setdefault(ids[posicion])
+                posicion += 1
+        return list(encontrados)
+
+
+_indice = None
+_version = None
+_construido = 0.0  # time.monotonic() de la ultima reconstruccion
+_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.AUTOCOMPLETADO_CACHE_ALIAS]
+
+
+def cache_compartida():
+    """True si las versiones que sube un proceso las leen todos los demas."""
+    return not isinstance(_cache(), (LocMemCache, DummyCache))
+
+
+def invalidar():
+    """Marca los indices de todos los procesos como desactualizados."""
+    cache = _cache()
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:  # Todavia no existe en la cache
+        cache.add(CLAVE_VERSION, 1, timeout=None)
+
+
+def _vigente(version):
+    if _indice is None or _version != version:
+        return False
+    # Con cache local otro worker pudo cambiar nombres sin que este proceso vea la version
+    return cache_compartida() or time.monotonic() - _construido < settings.AUTOCOMPLETADO_SEGUNDOS_LOCAL
+
+
+def indice():
+    """El indice del proceso, reconstruido si la version de la cache cambio o vencio."""
+    global _indice, _version, _construido
+    version = _cache().get(CLAVE_VERSION, 0)
+    if _vigente(version):
+        return _indice
+    with _lock:
+        if not _vigente(version):
+            _indice = IndicePrefijos(Producto.objects.values_list('pk', 'nombre').iterator(chunk_size=5000))
+            _version = version
+            _construido = time.monotonic()
+    return _indice
+
+
+def autocompletar(texto, limite=10):
+    """Hasta `limite` productos (id, nombre, precio, stock) en el orden del indice."""
+    ids = indice().buscar(texto, min(limite, LIMITE_MAXIMO))
+    consulta = Producto.objects.filter(pk__in=ids).values('id', 'nombre', 'precio', 'stock')
+    filas = {fila['id']: fila for fila in consulta}
+    return [filas[pk] for pk in ids if pk in filas]
@@ -0,0 +1,538 @@
+"""Benchmarks de la API de farmacia.
+
+No forman parte de la suite normal (el runner solo descubre test*.py).
+Se ejecutan contra una base de pruebas desechable con:
+
+    python manage.py test apps.task.benchmarks
+
+El tamaño de los datos se controla con variables de entorno
+(BENCH_PRODUCTOS, BENCH_CLIENTES, BENCH_MOVIMIENTOS, BENCH_FACTURAS,
+BENCH_IMPORTACION, BENCH_CARGA_OPERACIONES, BENCH_RENDER_FILAS,
+BENCH_BUSQUEDA_PRODUCTOS). Con BENCH_SALIDA=archivo.json cada
+resultado se guarda tambien en ese JSON, junto al commit, para comparar
+corridas (`manage.py carga_http --salida` escribe en el mismo formato).
+"""
+
+import os
+import re
+import time
+from datetime import date, timedelta
+import tracemalloc
+from tempfile import TemporaryFile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import autocompletado, busqueda
+from .carga import ejecutar_carga, guardar_resultados, sembrar_datos
+from .importacion import importar_inventario
+from .lectura_rapida import LectorRapido
+from .pdf import ReportePaginado, build_producto_id_pdf, escribir_todos_movimientos_pdf, escribir_todos_productos_pdf
+from .renderers import JSONRapidoRenderer
+from .serializers import DetalleVentaSerializer, FacturaVentaSerializer, MovimientoSerializer, ProductoSerializer
+from .views import ProductoViewset
+from .models import Categoria, Cliente, DetalleVenta, Empleado, FacturaVenta, Movimiento, Producto, Proveedor
+from ..usuario.autenticacion import JWTSinConsultaAuthentication
+from ..usuario.models import Rol
+from ..usuario.serializers import CustomTokenObtainPairSerializer
+
+User = get_user_model()
+
+
+def _entero_env(nombre, defecto):
+    return int(os.environ.get(nombre, defecto))
+
+
+def medir(funcion, repeticiones=5):
+    """Ejecuta `funcion` varias veces y devuelve (mediana en ms, ultimo resultado)."""
+    tiempos, resultado = [], None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2], resultado
+
+
+def consultas_frecuentes(cliente, producto, dia):
+    """Consultas de los listados y del dashboard que deben resolverse con un indice."""
+    mes = (dia - timedelta(days=30), dia)
+    return {
+        'mis_facturas': FacturaVenta.objects.filter(id_cliente=cliente).order_by('-created', '-id')[:100],
+        'facturas_cliente_por_fecha': FacturaVenta.objects.filter(id_cliente=cliente, fecha__range=mes),
+        'ventas_por_fecha': FacturaVenta.objects.filter(fecha__range=mes).values('total'),
+        'listado_facturas': FacturaVenta.objects.order_by('-created', '-id')[:100],
+        'listado_detalles': DetalleVenta.objects.order_by('-created', '-id')[:100],
+        'listado_movimientos': Movimiento.objects.order_by('-created', '-id')[:100],
+        'movimientos_por_fecha': Movimiento.objects.filter(fecha__range=mes).values('tipo', 'cantidad'),
+        'historial_producto': Movimiento.objects.filter(id_producto=producto, fecha__gte=mes[0], tipo='salida'),
+        'stock_bajo': Producto.objects.filter(stock__lt=10).values('id'),
+    }
+
+
+def recorridos_completos(plan):
+    """Tablas que un plan de EXPLAIN recorre completas (SQLite: 'SCAN tabla' sin indice; PostgreSQL: 'Seq Scan on')."""
+    return re.findall(r'\bSCAN (\w+)\s*$', plan, re.M) + re.findall(r'Seq Scan on (\w+)', plan)
+
+
+@tag('benchmark')
+class BenchmarkAPITestCase(APITestCase):
+    """Base: siembra un inventario de tamaño configurable y autentica un administrador."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rol_admin = Rol.objects.create(name='administrador')
+        cls.admin_user = User.objects.create_user(username='admin', password='adminpass123', rol=rol_admin)
+        # bulk_create no dispara señales: solo se mide la lectura
+        cls.ids = sembrar_datos(
+            cls.admin_user,
+            productos=_entero_env('BENCH_PRODUCTOS', 2000),
+            clientes=_entero_env('BENCH_CLIENTES', 50),
+            facturas=_entero_env('BENCH_FACTURAS', 500),
+            movimientos=_entero_env('BENCH_MOVIMIENTOS', 5000),
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+
+    def descargar_todo(self, url):
+        """Recorre todas las paginas de un listado (cabecera Link) y devuelve los bytes recibidos."""
+        total, siguiente = 0, f'{url}?page_size=1000'
+        while siguiente:
+            response = self.client.get(siguiente)
+            total += len(response.content)
+            siguiente = None
+            for enlace in response.get('Link', '').split(','):
+                if 'rel="next"' in enlace:
+                    siguiente = enlace.split(';')[0].strip().strip('<>')
+        return total
+
+    def reportar(self, nombre, **valores):
+        detalle = ', '.join(f'{k}={v:.2f}' if isinstance(v, float) else f'{k}={v}' for k, v in valores.items())
+        print(f'\n[BENCH] {nombre}: {detalle}')
+        if os.environ.get('BENCH_SALIDA'):
+            guardar_resultados(os.environ['BENCH_SALIDA'], f'{type(self).__name__}: {nombre}', valores)
+
+
+class DashboardBenchmark(BenchmarkAPITestCase):
+    """/farmacia/dashboard/ frente a descargar productos, facturas y movimientos completos."""
+
+    def test_dashboard_vs_listados(self):
+        def listados():
+            return sum(self.descargar_todo(reverse(nombre))
+                       for nombre in ('producto-list', 'facturaventa-list', 'movimiento-list'))
+
+        ms_dashboard, response = medir(lambda: self.client.get(reverse('dashboard-list')))
+        ms_listados, bytes_listados = medir(listados, repeticiones=3)
+
+        self.reportar('dashboard', ms=ms_dashboard, bytes=len(response.content))
+        self.reportar('listados completos', ms=ms_listados, bytes=bytes_listados)
+        self.assertLess(len(response.content), bytes_listados)
+
+
+class PDFBenchmark(BenchmarkAPITestCase):
+    """Reporte paginado de movimientos: tiempo y pico de memoria de Python."""
+
+    def test_pdf_todos_movimientos(self):
+        movimientos = Movimiento.objects.select_related('id_producto', 'id_proveedor', 'id_cliente', 'responsable')
+        with TemporaryFile() as salida:
+            tracemalloc.start()
+            inicio = time.perf_counter()
+            escribir_todos_movimientos_pdf(movimientos, salida)
+            ms = (time.perf_counter() - inicio) * 1000
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            tamano = salida.tell()
+        self.reportar('pdf movimientos', filas=movimientos.count(), ms=ms,
+                      pico_mb=pico / 2**20, pdf_mb=tamano / 2**20)
+
+    def test_memoria_segun_filas(self):
+        """
+        Pico de memoria del motor paginado (sin base de datos) con 10.000 y
+        100.000 filas: cada pagina se escribe al terminarla, asi que no crece.
+        """
+        reporte = ReportePaginado('Memoria', ["ID", "Nombre", "Cantidad"], [60, 300, 80])
+        picos = {}
+        for filas in (10_000, 100_000):
+            with TemporaryFile() as salida:
+                tracemalloc.start()
+                reporte.escribir(salida, ((i, f'Producto {i}', i % 50) for i in range(filas)))
+                _, pico = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                tamano = salida.tell()
+            picos[filas] = pico
+            self.reportar(f'pdf {filas} filas', pico_mb=pico / 2**20, pdf_mb=tamano / 2**20)
+        self.reportar('pdf crecimiento de memoria', x10_filas=picos[100_000] / picos[10_000])
+        self.assertLess(picos[100_000], picos[10_000] * 2)
+
+
+class AutenticacionBenchmark(BenchmarkAPITestCase):
+    """p50 del listado de productos con JWTAuthentication frente a JWTSinConsultaAuthentication."""
+
+    def test_listado_productos_p50(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.admin_user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = f"{reverse('producto-list')}?page_size=20"
+
+        def medir_listado():
+            self.client.get(url)  # Calienta caches (rol del usuario)
+            with CaptureQueriesContext(connection) as consultas:
+                self.client.get(url)
+            total_consultas = len(consultas.captured_queries)  # Antes de que otra peticion limpie el log
+            ms, _ = medir(lambda: self.client.get(url), repeticiones=51)
+            return ms, total_consultas
+
+        ms_con_consulta, consultas_con = medir_listado()
+        # El claim 'rol' solo se usa con la lista de revocacion en una cache compartida (Redis en produccion)
+        with mock.patch.object(ProductoViewset, 'authentication_classes', [JWTSinConsultaAuthentication]), \
+                mock.patch('apps.usuario.roles.cache_compartida', return_value=True):
+            ms_sin_consulta, consultas_sin = medir_listado()
+
+        self.reportar('productos JWTAuthentication', p50_ms=ms_con_consulta, consultas=consultas_con)
+        self.reportar('productos JWTSinConsulta', p50_ms=ms_sin_consulta, consultas=consultas_sin)
+        self.assertLess(consultas_sin, consultas_con)
+
+
+class MicroBenchmark(BenchmarkAPITestCase):
+    """Serializers, señales y constructores de PDF medidos de forma aislada (ms por llamada y consultas)."""
+
+    def medir_con_consultas(self, nombre, funcion, repeticiones=5, **extra):
+        with CaptureQueriesContext(connection) as consultas:
+            funcion()
+        ms, _ = medir(funcion, repeticiones)
+        self.reportar(nombre, ms=ms, consultas=len(consultas.captured_queries), **extra)
+
+    def test_serializers(self):
+        productos = list(Producto.objects.select_related('id_categoria', 'id_proveedor')[:1000])
+        movimientos = list(Movimiento.objects.select_related(
+            'id_producto', 'id_proveedor', 'id_cliente', 'responsable')[:1000])
+        facturas = list(FacturaVenta.objects.prefetch_related('detalles__id_producto')[:200])
+        self.medir_con_consultas('ProductoSerializer x1000', lambda: ProductoSerializer(productos, many=True).data)
+        self.medir_con_consultas('MovimientoSerializer x1000', lambda: MovimientoSerializer(movimientos, many=True).data)
+        self.medir_con_consultas('FacturaVentaSerializer x200', lambda: FacturaVentaSerializer(facturas, many=True).data)
+
+    def test_senales(self):
+        producto = self.ids['productos_venta'][0]
+        factura = FacturaVenta.objects.first()
+
+        def crear_movimiento():
+            Movimiento.objects.create(tipo='entrada', cantidad=1, id_producto_id=producto,
+                                      id_proveedor_id=self.ids['proveedores'][0])
+
+        def crear_detalle():
+            DetalleVenta.objects.create(cantidad=1, precio_unitario=10, id_factura=factura, id_producto_id=producto)
+
+        # Stock + kardex por señal; total de la factura incremental
+        self.medir_con_consultas('Movimiento.create (señales de stock)', crear_movimiento, repeticiones=51)
+        self.medir_con_consultas('DetalleVenta.create (señales de total)', crear_detalle, repeticiones=51)
+
+    def test_pdf(self):
+        producto = Producto.objects.select_related('id_categoria', 'id_proveedor').first()
+        productos = Producto.objects.select_related('id_categoria', 'id_proveedor')
+
+        def todos_productos():
+            with TemporaryFile() as salida:
+                escribir_todos_productos_pdf(productos, salida)
+
+        self.medir_con_consultas('build_producto_id_pdf', lambda: build_producto_id_pdf(producto), repeticiones=21)
+        self.medir_con_consultas('escribir_todos_productos_pdf', todos_productos, repeticiones=3,
+                                 filas=productos.count())
+
+
+class RenderizadoJSONBenchmark(BenchmarkAPITestCase):
+    """JSONRenderer de DRF frente a JSONRapidoRenderer (orjson) sobre BENCH_RENDER_FILAS filas."""
+
+    def comparar(self, nombre, datos):
+        drf_ms, esperado = medir(lambda: JSONRenderer().render(datos))
+        rapido_ms, obtenido = medir(lambda: JSONRapidoRenderer().render(datos))
+        self.assertEqual(obtenido, esperado)
+        self.reportar(nombre, filas=len(datos), drf_ms=drf_ms, orjson_ms=rapido_ms,
+                      aceleracion=drf_ms / rapido_ms, mb=len(esperado) / 2**20)
+
+    def test_render_listados(self):
+        filas = _entero_env('BENCH_RENDER_FILAS', 10_000)
+        productos = ProductoSerializer(
+            Producto.objects.select_related('id_categoria', 'id_proveedor')[:filas], many=True).data
+        facturas = FacturaVentaSerializer(
+            FacturaVenta.objects.prefetch_related('detalles__id_producto')[:filas], many=True).data
+        # Si hay menos filas sembradas se repiten hasta llegar al tamaño pedido
+        self.comparar('render productos', (list(productos) * (filas // len(productos) + 1))[:filas])
+        self.comparar('render facturas con detalles', (list(facturas) * (filas // len(facturas) + 1))[:filas])
+
+
+class LecturaRapidaBenchmark(BenchmarkAPITestCase):
+    """Serializer completo (select_related) frente a LectorRapido (values()) en los listados, hasta 10k filas."""
+
+    def comparar(self, nombre, serializer_class, queryset, **opciones):
+        lector = LectorRapido(serializer_class, **opciones)
+        serializer_ms, esperado = medir(lambda: JSONRenderer().render(serializer_class(queryset, many=True).data))
+        rapido_ms, obtenido = medir(lambda: JSONRenderer().render(lector.representar(lector.valores(queryset))))
+        self.assertEqual(obtenido, esperado)
+        self.reportar(nombre, filas=len(queryset), serializer_ms=serializer_ms, values_ms=rapido_ms,
+                      aceleracion=serializer_ms / rapido_ms)
+
+    def test_listados(self):
+        self.comparar('productos', ProductoSerializer,
+                      Producto.objects.select_related('id_categoria', 'id_proveedor').order_by('id')[:10_000],
+                      calculados={'low_stock': ('stock',)})
+        self.comparar('movimientos', MovimientoSerializer, Movimiento.objects.select_related(
+            'id_producto', 'id_proveedor', 'id_cliente', 'responsable').order_by('-created', '-id')[:10_000])
+        self.comparar('detalles de venta', DetalleVentaSerializer, DetalleVenta.objects.select_related(
+            'id_producto', 'id_factura').order_by('-created', '-id')[:10_000])
+
+
+class ConsultaCondicionalBenchmark(BenchmarkAPITestCase):
+    """Peticion completa (200) frente a GET condicional con If-None-Match (304)."""
+
+    def test_listados(self):
+        for nombre in ('producto-list', 'movimiento-list', 'facturaventa-list', 'detalleventa-list'):
+            url = reverse(nombre)
+            completa_ms, response = medir(lambda: self.client.get(url), 21)
+            condicional_ms, no_modificado = medir(
+                lambda: self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']), 21)
+            self.assertEqual(no_modificado.status_code, 304)
+            self.reportar(nombre, completa_ms=completa_ms, condicional_ms=condicional_ms,
+                          bytes_ahorrados=len(response.content))
+
+
+class CacheCatalogoBenchmark(BenchmarkAPITestCase):
+    """Listados de catalogo con y sin la cache de cache_catalogo.py (ms por peticion)."""
+
+    def test_listados(self):
+        for nombre, params in (('producto-list', {'page_size': 100}), ('producto-list', {'page_size': 1000}),
+                               ('proveedor-list', {}), ('categoria-list', {})):
+            url = reverse(nombre)
+            with override_settings(CATALOGO_CACHE_ACTIVO=False):
+                sin_cache_ms, esperado = medir(lambda: self.client.get(url, params), 21)
+            self.client.get(url, params)
+            con_cache_ms, response = medir(lambda: self.client.get(url, params), 21)
+            self.assertEqual((response['X-Cache'], response.content), ('HIT', esperado.content))
+            self.reportar(f'{nombre} {params}', sin_cache_ms=sin_cache_ms, con_cache_ms=con_cache_ms,
+                          aceleracion=sin_cache_ms / con_cache_ms)
+
+
+@override_settings(SINCRONIZACION_MARGEN_SEGUNDOS=0)
+class SincronizacionBenchmark(BenchmarkAPITestCase):
+    """Primera sincronizacion (todo) frente a un delta con pocas ediciones y borrados: bytes y ms."""
+
+    def test_delta(self):
+        url = reverse('sync-list')
+        completa_ms, completa = medir(lambda: self.client.get(url), 3)
+        cursor = completa.json()['hasta']
+        categoria, proveedor = Categoria.objects.first(), Proveedor.objects.first()
+        for producto in Producto.objects.order_by('?')[:20]:
+            producto.precio += 1
+            producto.save(update_fields=['precio', 'modified'])
+        for _ in range(2):
+            Producto.objects.create(nombre='Temporal', precio=1, stock=0, id_categoria=categoria,
+                                    id_proveedor=proveedor).delete()
+        delta_ms, delta = medir(lambda: self.client.get(url, {'since': cursor}), 21)
+        datos = delta.json()
+        self.assertEqual(len(datos['cambios']['productos']), 20)
+        self.assertEqual(len(datos['eliminados']['productos']), 2)
+        self.reportar('sync', completa_ms=completa_ms, completa_bytes=len(completa.content),
+                      completa_entera=completa.json()['completo'], delta_ms=delta_ms, delta_bytes=len(delta.content))
+
+
+class BusquedaBenchmark(BenchmarkAPITestCase):
+    """?search= (indice de texto frente a LIKE) y autocompletado sobre BENCH_BUSQUEDA_PRODUCTOS productos."""
+
+    @classmethod
+    def setUpTestData(cls):  # Solo productos, sin ventas ni movimientos
+        rol_admin = Rol.objects.create(name='administrador')
+        cls.admin_user = User.objects.create_user(username='admin', password='adminpass123', rol=rol_admin)
+        cls.productos = _entero_env('BENCH_BUSQUEDA_PRODUCTOS', 200_000)
+        sembrar_datos(cls.admin_user, productos=cls.productos, clientes=1, facturas=0, movimientos=0)
+
+    def test_busqueda(self):
+        url = reverse('producto-list')
+        for texto in ('Producto 1234', 'vitam', 'Medicamentos 99'):
+            indice_ms, response = medir(lambda: self.client.get(url, {'search': texto, 'page_size': 20}), 21)
+            with mock.patch.object(busqueda, 'motor', return_value=None):
+                like_ms, esperado = medir(lambda: self.client.get(url, {'search': texto, 'page_size': 20}), 5)
+            # El indice busca prefijos de palabra; LIKE, subcadenas: el total puede diferir
+            self.reportar(f'search={texto!r}', productos=self.productos,
+                          resultados_indice=response['X-Total-Count'], resultados_like=esperado['X-Total-Count'],
+                          indice_ms=indice_ms, like_ms=like_ms, aceleracion=like_ms / indice_ms)
+
+    def test_autocompletado(self):
+        autocompletado.invalidar()
+        construccion_ms, _ = medir(autocompletado.indice, 1)
+        indice = autocompletado.indice()
+        url = reverse('producto-autocomplete')
+        for texto in ('prod', 'Producto 1234', '99'):
+            busqueda_ms, ids = medir(lambda: indice.buscar(texto, 10), 101)
+            servidor_ms, _ = medir(lambda: autocompletado.autocompletar(texto, 10), 101)
+            http_ms, response = medir(lambda: self.client.get(url, {'q': texto}), 21)
+            self.assertEqual([fila['id'] for fila in response.json()], ids)
+            self.reportar(f'autocomplete q={texto!r}', productos=len(indice), construccion_ms=construccion_ms,
+                          indice_ms=busqueda_ms, con_consulta_ms=servidor_ms, http_ms=http_ms)
+
+
+@override_settings(PERFIL_SQL_CABECERA=True)
+class CargaBenchmark(BenchmarkAPITestCase):
+    """
+    Escenario mixto (lecturas, ventas, movimientos) de carga.py sobre el cliente de
+    pruebas, en un solo hilo. Para varios hilos contra un servidor real:
+    `manage.py sembrar_datos` + `manage.py carga_http`.
+    """
+
+    def enviar(self, metodo, ruta, cuerpo):
+        if metodo == 'GET':
+            response = self.client.get(ruta, HTTP_X_PERFIL_SQL='1')
+        else:
+            response = self.client.post(ruta, cuerpo, format='json', HTTP_X_PERFIL_SQL='1')
+        return response.status_code, dict(response.headers), response.content
+
+    def test_escenario_mixto(self):
+        operaciones = _entero_env('BENCH_CARGA_OPERACIONES', 500)
+        resumen = ejecutar_carga(self.enviar, self.ids, operaciones=operaciones, concurrencia=1)
+        for operacion, valores in resumen.items():
+            self.reportar(f'carga {operacion}', **valores)
+        self.assertEqual(resumen['total']['errores'], 0)
+
+
+class MetricasBenchmark(BenchmarkAPITestCase):
+    """Sobrecosto de MetricsMiddleware en el p50 del listado de productos."""
+
+    def test_overhead_middleware(self):
+        url = f"{reverse('producto-list')}?page_size=20"
+        con, sin = [], []
+        for _ in range(3):  # Rondas alternadas: el ruido de la maquina afecta a ambas por igual
+            self.client.get(url)
+            con.append(medir(lambda: self.client.get(url), repeticiones=101)[0])
+            with self.modify_settings(MIDDLEWARE={'remove': 'farmacia.middleware.metrics.MetricsMiddleware'}):
+                self.client.get(url)
+                sin.append(medir(lambda: self.client.get(url), repeticiones=101)[0])
+        self.reportar('productos con metricas', p50_ms=min(con))
+        self.reportar('productos sin metricas', p50_ms=min(sin))
+
+class ExportacionBenchmark(BenchmarkAPITestCase):
+    """Exportacion CSV de movimientos: tiempo y pico de memoria de Python mientras se transmite."""
+
+    def test_export_movimientos(self):
+        response = self.client.get(f"{reverse('movimiento-export')}?formato=csv")
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        total = sum(len(bloque) for bloque in response.streaming_content)
+        ms = (time.perf_counter() - inicio) * 1000
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.reportar('export movimientos csv', filas=Movimiento.objects.count(), ms=ms,
+                      pico_mb=pico / 2**20, csv_mb=total / 2**20)
+        self.assertLess(pico, 16 * 2**20)
+
+class ImportacionBenchmark(BenchmarkAPITestCase):
+    """Filas por minuto de la importacion masiva (BENCH_IMPORTACION filas, mitad productos existentes)."""
+
+    def test_importar_csv(self):
+        filas = _entero_env('BENCH_IMPORTACION', 50_000)
+        existentes = Producto.objects.count()
+        with TemporaryFile('w+b') as archivo:
+            archivo.write(b'nombre,precio,categoria,proveedor,cantidad\n')
+            for i in range(filas):
+                # Los primeros nombres ya existen; cada producto nuevo aparece dos veces
+                numero = i if i < existentes else existentes + (i - existentes) // 2
+                archivo.write(f'Producto {numero},{5 + i % 90}.50,Medicamentos,Proveedor,{1 + i % 9}\n'.encode())
+            archivo.seek(0)
+            inicio = time.perf_counter()
+            resumen = importar_inventario(archivo, 'csv')
+            segundos = time.perf_counter() - inicio
+
+        por_minuto = filas / segundos * 60
+        self.reportar('importacion csv', filas=filas, s=segundos, filas_por_minuto=por_minuto,
+                      creados=resumen['creados'], actualizados=resumen['actualizados'])
+        self.assertEqual(resumen['errores_total'], 0)
+        self.assertGreaterEqual(por_minuto, 50_000)
+
+
+@tag('benchmark')
+class IndicesBenchmark(APITestCase):
+    """
+    EXPLAIN de las consultas frecuentes sobre BENCH_EXPLAIN_FILAS facturas,
+    detalles y movimientos (1M por defecto). Falla si alguna recorre una tabla
+    completa en lugar de usar los indices de models.py.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        filas = _entero_env('BENCH_EXPLAIN_FILAS', 1_000_000)
+        bloque = 10_000
+        dias = 3 * 365
+
+        rol = Rol.objects.create(name='administrador')
+        usuario = User.objects.create_user(username='admin', password='adminpass123', rol=rol)
+        categoria = Categoria.objects.create(nombre='Medicamentos')
+        proveedor = Proveedor.objects.create(nombre='Proveedor', contacto='bench@proveedor.com', usuario=usuario)
+        empleado = Empleado.objects.create(nombre='Empleado', usuario=usuario)
+        Cliente.objects.bulk_create(
+            Cliente(nombre=f'Cliente {i}', correo=f'cliente{i}@bench.com', telefono='1', usuario=usuario)
+            for i in range(1000)
+        )
+        Producto.objects.bulk_create(
+            Producto(nombre=f'Producto {i}', precio=10, stock=i % 200, id_categoria=categoria, id_proveedor=proveedor)
+            for i in range(10_000)
+        )
+        clientes = list(Cliente.objects.values_list('id', flat=True))
+        productos = list(Producto.objects.values_list('id', flat=True))
+
+        for inicio in range(0, filas, bloque):
+            rango = range(inicio, min(inicio + bloque, filas))
+            facturas = FacturaVenta.objects.bulk_create([
+                FacturaVenta(total=10, id_cliente_id=clientes[i % len(clientes)], id_empleado=empleado)
+                for i in rango
+            ])
+            DetalleVenta.objects.bulk_create([
+                DetalleVenta(cantidad=1, precio_unitario=10, subtotal=10, id_factura=factura,
+                             id_producto_id=productos[i % len(productos)])
+                for i, factura in zip(rango, facturas)
+            ])
+            Movimiento.objects.bulk_create([
+                Movimiento(tipo='entrada' if i % 2 else 'salida', cantidad=1,
+                           id_producto_id=productos[i % len(productos)], responsable=empleado)
+                for i in rango
+            ])
+
+        # auto_now_add ignora la fecha en bulk_create: se reparte despues por rangos de id
+        hoy = date.today()
+        for modelo in (FacturaVenta, Movimiento):
+            primero = modelo.objects.order_by('id').values_list('id', flat=True).first()
+            por_dia = max(filas // dias, 1)
+            for dia in range(dias):
+                desde = primero + dia * por_dia
+                modelo.objects.filter(id__gte=desde, id__lt=desde + por_dia).update(fecha=hoy - timedelta(days=dia))
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')  # Estadisticas reales para el planificador
+
+        cls.cliente = Cliente.objects.first()
+        cls.producto = Producto.objects.first()
+        cls.filas = filas
+
+    def test_consultas_frecuentes_usan_indices(self):
+        consultas = consultas_frecuentes(self.cliente, self.producto, date.today())
+        recorridos, ordenamientos = {}, {}
+        for nombre, queryset in consultas.items():
+            plan = queryset.explain()
+            ms, _ = medir(lambda: list(queryset.all()), repeticiones=3)
+            self.reportar_plan(nombre, ms, plan)
+            if recorridos_completos(plan):
+                recorridos[nombre] = plan
+            if nombre.startswith('listado_') and 'TEMP B-TREE' in plan:
+                ordenamientos[nombre] = plan  # La paginacion por cursor debe leer el indice ya ordenado
+        self.assertEqual(recorridos, {}, "Consultas que recorren tablas completas")
+        self.assertEqual(ordenamientos, {}, "Listados que ordenan toda la tabla")
+
+    def reportar_plan(self, nombre, ms, plan):
+        print(f'\n[BENCH] explain {nombre} ({self.filas} filas): ms={ms:.2f}')
+        for linea in plan.splitlines():
+            print(f'    {linea}')
@@ -0,0 +1,208 @@
+"""Busqueda de productos por texto completo.
+
+`?search=` en /productos/ filtraba con LIKE '%termino%' sobre el nombre y la
+categoria (con JOIN): ningun indice sirve y el costo crece con el catalogo.
+Ahora cada motor de base de datos usa su propio indice:
+
+- SQLite: tabla virtual FTS5 `producto_busqueda` (nombre, categoria) con el
+  tokenizador unicode61 sin acentos e indices de prefijo. La mantienen al dia
+  triggers sobre task_producto y task_categoria, asi que tambien cubren
+  bulk_create/bulk_update (importacion, sembrar_datos). Orden por bm25, con
+  mas peso en el nombre.
+- PostgreSQL: indices GIN de trigramas (pg_trgm) sobre el nombre sin acentos
+  del producto y de la categoria (unaccent envuelto en una funcion IMMUTABLE),
+  que tambien sirven para la expresion regular de inicio de palabra. Cada
+  palabra se busca con un UNION de una rama por indice: un OR entre columnas
+  de dos tablas no puede usar ninguno. Orden por word_similarity.
+
+En ambos casos cada palabra buscada es un prefijo (busqueda mientras se
+escribe) y todas deben aparecer, en el nombre o en la categoria. Los indices
+se crean en post_migrate (ver apps.py); si el motor no esta disponible
+(SQLite sin FTS5, sin permisos para las extensiones, MySQL) se usa el
+SearchFilter de DRF de siempre.
+"""
+
+import logging
+import re
+import unicodedata
+
+from django.db import DatabaseError, connections
+from django.db.models import CharField, F, Func, Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from .models import Categoria, Producto
+
+logger = logging.getLogger(__name__)
+
+_PALABRAS = re.compile(r'\w+')
+
+
+def normalizar(texto):
+    """Minusculas y sin acentos: 'Acetaminofén' -> 'acetaminofen'."""
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def terminos(texto):
+    """Palabras normalizadas de una busqueda."""
+    return _PALABRAS.findall(normalizar(texto))
+
+
+# ==================== SQLITE (FTS5) ====================
+
+class BusquedaSQLite:
+    TABLA = 'producto_busqueda'
+
+    def __init__(self):
+        producto, categoria = Producto._meta, Categoria._meta
+        self.producto = producto.db_table
+        self.categoria = categoria.db_table
+        self.columna_categoria = producto.get_field('id_categoria').column
+
+    def instalar(self, cursor):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [self.TABLA])
+        nueva = cursor.fetchone() is None
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.TABLA} USING fts5("
+            f"nombre, categoria, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+        )
+        fila_nueva = (
+            f"INSERT INTO {self.TABLA}(rowid, nombre, categoria) SELECT new.id, new.nombre, "
+            f"(SELECT nombre FROM {self.categoria} WHERE id = new.{self.columna_categoria});"
+        )
+        borrar = f"DELETE FROM {self.TABLA} WHERE rowid = old.id;"
+        triggers = {
+            'ai': f"AFTER INSERT ON {self.producto} BEGIN {fila_nueva} END",
+            'au': f"AFTER UPDATE OF nombre, {self.columna_categoria} ON {self.producto} BEGIN {borrar} {fila_nueva} END",
+            'ad': f"AFTER DELETE ON {self.producto} BEGIN {borrar} END",
+            'cu': (
+                f"AFTER UPDATE OF nombre ON {self.categoria} BEGIN UPDATE {self.TABLA} SET categoria = new.nombre "
+                f"WHERE rowid IN (SELECT id FROM {self.producto} WHERE {self.columna_categoria} = new.id); END"
+            ),
+        }
+        for sufijo, cuerpo in triggers.items():
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {self.TABLA}_{sufijo} {cuerpo}")
+        if nueva:
+            self.reconstruir(cursor)
+
+    def reconstruir(self, cursor):
+        """Vuelve a llenar el indice desde las tablas (productos creados antes de instalarlo)."""
+        cursor.execute(f"DELETE FROM {self.TABLA}")
+        cursor.execute(
+            f"INSERT INTO {self.TABLA}(rowid, nombre, categoria) SELECT p.id, p.nombre, c.nombre "
+            f"FROM {self.producto} p JOIN {self.categoria} c ON c.id = p.{self.columna_categoria}"
+        )
+
+    def disponible(self, cursor):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [self.TABLA])
+        return cursor.fetchone() is not None
+
+    def filtrar(self, queryset, palabras):
+        consulta = ' '.join(f'"{palabra}"*' for palabra in palabras)  # Prefijos, todos obligatorios
+        return queryset.extra(
+            tables=[self.TABLA],
+            where=[f'{self.TABLA}.rowid = "{self.producto}"."id"', f'{self.TABLA} MATCH %s'],
+            params=[consulta],
+        ).order_by(RawSQL(f'bm25({self.TABLA}, 10.0, 1.0)', ()), 'id')
+
+
+# ==================== POSTGRESQL (pg_trgm + unaccent) ====================
+
+class BusquedaPostgres:
+    FUNCION = 'farmacia_sin_acentos'
+    INDICE = 'producto_nombre_trgm_idx'
+    INDICE_CATEGORIA = 'categoria_nombre_trgm_idx'
+
+    def __init__(self):
+        producto, categoria = Producto._meta, Categoria._meta
+        self.producto = producto.db_table
+        self.categoria = categoria.db_table
+        self.columna_categoria = producto.get_field('id_categoria').column
+
+    def instalar(self, cursor):
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        # unaccent() no es IMMUTABLE (depende del search_path): la envoltura fija el diccionario
+        cursor.execute(
+            f"CREATE OR REPLACE FUNCTION {self.FUNCION}(text) RETURNS text "
+            f"LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+            f"AS $$ SELECT lower(public.unaccent('public.unaccent'::regdictionary, $1)) $$"
+        )
+        for indice, tabla in ((self.INDICE, self.producto), (self.INDICE_CATEGORIA, self.categoria)):
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {indice} ON {tabla} USING gin ({self.FUNCION}(nombre) gin_trgm_ops)"
+            )
+
+    def disponible(self, cursor):
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [self.INDICE])
+        return cursor.fetchone()[0]
+
+    def filtrar(self, queryset, palabras):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        # Productos con la palabra en el nombre UNION productos de categorias con la palabra:
+        # cada rama filtra por su propio indice de trigramas
+        coincidencias = (
+            f"SELECT id FROM {self.producto} WHERE {self.FUNCION}(nombre) ~ %s "
+            f"UNION SELECT p.id FROM {self.producto} p JOIN {self.categoria} c ON c.id = p.{self.columna_categoria} "
+            f"WHERE {self.FUNCION}(c.nombre) ~ %s"
+        )
+        condicion = Q()
+        for palabra in palabras:
+            # \m: inicio de palabra, como el prefijo de FTS5 ("ami" no encuentra "vitamina").
+            # Las palabras son solo \w, sin metacaracteres; pg_trgm tambien indexa `~`
+            inicio = rf'\m{palabra}'
+            condicion &= Q(pk__in=RawSQL(coincidencias, (inicio, inicio)))
+        sin_acentos = Func(F('nombre'), function=self.FUNCION, output_field=CharField())
+        return queryset.filter(condicion).order_by(
+            TrigramWordSimilarity(' '.join(palabras), sin_acentos).desc(), 'id',
+        )
+
+
+# ==================== SELECCION DEL MOTOR ====================
+
+MOTORES = {'sqlite': BusquedaSQLite, 'postgresql': BusquedaPostgres}
+
+_disponibles = {}  # (alias, NAME) -> motor o None
+
+
+def instalar(using='default'):
+    """Crea el indice del motor de la base `using` (idempotente). Se llama en post_migrate."""
+    conexion = connections[using]
+    clase = MOTORES.get(conexion.vendor)
+    _disponibles.clear()
+    if clase is None:
+        return
+    try:
+        with conexion.cursor() as cursor:
+            clase().instalar(cursor)
+    except DatabaseError as exc:  # SQLite sin FTS5, extensiones sin permisos...
+        logger.warning("[BUSQUEDA] Sin indice de texto en %s (%s): se usara LIKE.", conexion.vendor, exc)
+
+
+def motor(conexion):
+    """Motor de busqueda de la conexion, o None si su indice no esta instalado."""
+    clave = (conexion.alias, conexion.settings_dict['NAME'])
+    if clave not in _disponibles:
+        clase = MOTORES.get(conexion.vendor)
+        disponible = False
+        if clase is not None:
+            try:
+                with conexion.cursor() as cursor:
+                    disponible = clase().disponible(cursor)
+            except DatabaseError:
+                pass
+        _disponibles[clave] = clase() if disponible else None
+    return _disponibles[clave]
+
+
+class BusquedaProductoFilter(filters.SearchFilter):
+    """?search= con el indice de texto del motor; SearchFilter (icontains) si no hay indice."""
+
+    def filter_queryset(self, request, queryset, view):
+        palabras = terminos(' '.join(self.get_search_terms(request)))
+        buscador = motor(connections[queryset.db]) if palabras else None
+        if buscador is None:
+            return super().filter_queryset(request, queryset, view)
+        return buscador.filtrar(queryset, palabras)
@@ -0,0 +1,133 @@
+"""Cache de los listados de catalogo (categorias, proveedores y productos).
+
+Los dashboards piden estos listados todo el tiempo y cambian poco. Cada
+listado se guarda por URL completa (filtros, pagina y host incluidos) bajo
+una clave que lleva la version de cada recurso del que depende:
+
+    catalogo:producto.17:categoria.4:<sha1 de la URL>
+
+Invalidar es subir la version del recurso: las claves viejas dejan de
+leerse y expiran solas, sin recorrer la cache. Se invalida:
+
+- al guardar o borrar Categoria, Proveedor o Producto (signals.py);
+- al cambiar el stock (stock.py, que usan las señales de ventas y
+  movimientos y las cargas masivas);
+- al importar o sembrar datos con bulk_create.
+
+La version se sube en el momento y otra vez al confirmar la transaccion:
+una lectura de otra peticion durante la transaccion pudo guardar los datos
+anteriores con la version nueva.
+
+La cache es el alias CATALOGO_CACHE_ALIAS (memoria local por defecto;
+cualquier backend de Django). Aciertos y fallos por recurso se cuentan en
+/metrics (farmacia_cache_catalogo_total) y la respuesta lleva X-Cache.
+
+IMPORTANTE: las versiones viven en esa misma cache. Con memoria local cada
+worker tiene las suyas y no ve lo que invalidan los demas: un producto
+editado en un proceso sigue viejo en el resto hasta que su listado expira.
+Por eso con LocMem los listados duran solo CATALOGO_CACHE_SEGUNDOS_LOCAL
+(unos segundos). Con varios workers hay que configurar un backend compartido
+(Redis, Memcached, base de datos) para usar CATALOGO_CACHE_SEGUNDOS.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework.response import Response
+
+from farmacia.middleware.metrics import registro
+
+# Recursos de los que depende cada listado (?search= de productos mira la categoria)
+DEPENDENCIAS = {
+    'categoria': ('categoria',),
+    'proveedor': ('proveedor',),
+    'producto': ('producto', 'categoria'),
+}
+CABECERAS = ('Link', 'X-Total-Count')  # Las que agrega la paginacion
+METRICA = 'farmacia_cache_catalogo_total'
+
+
+def _cache():
+    return caches[settings.CATALOGO_CACHE_ALIAS]
+
+
+def cache_compartida():
+    """True si las versiones que sube un proceso las leen todos los demas."""
+    return not isinstance(_cache(), (LocMemCache, DummyCache))
+
+
+def _segundos():
+    """Vida de un listado: corta si otro worker pudo invalidarlo sin que este proceso lo vea."""
+    if cache_compartida():
+        return settings.CATALOGO_CACHE_SEGUNDOS
+    return min(settings.CATALOGO_CACHE_SEGUNDOS, settings.CATALOGO_CACHE_SEGUNDOS_LOCAL)
+
+
+def _clave_version(recurso):
+    return f'catalogo:version:{recurso}'
+
+
+def versiones(recursos):
+    """{recurso: version}. Una version ausente (nueva o expulsada) empieza en un valor unico."""
+    cache = _cache()
+    claves = {_clave_version(recurso): recurso for recurso in recursos}
+    actuales = cache.get_many(list(claves))
+    for clave in claves.keys() - actuales.keys():
+        cache.add(clave, time.time_ns(), timeout=None)  # Nunca repite una version ya usada
+        actuales[clave] = cache.get(clave)
+    return {recurso: actuales[clave] for clave, recurso in claves.items()}
+
+
+def _subir(recursos):
+    cache = _cache()
+    for recurso in recursos:
+        try:
+            cache.incr(_clave_version(recurso))
+        except ValueError:  # No existia: la primera lectura crea una nueva
+            pass
+
+
+def invalidar(*recursos):
+    """Sube la version de `recursos` ahora y al confirmar la transaccion actual."""
+    _subir(recursos)
+    transaction.on_commit(lambda: _subir(recursos))
+
+
+def _contar(recurso, resultado):
+    registro.incrementar(METRICA, 'Lecturas de la cache de catalogo.', recurso=recurso, resultado=resultado)
+
+
+def estadisticas():
+    """{recurso: {'hit': n, 'miss': n}} del proceso actual."""
+    return {
+        recurso: {resultado: registro.contador(METRICA, recurso=recurso, resultado=resultado)
+                  for resultado in ('hit', 'miss')}
+        for recurso in DEPENDENCIAS
+    }
+
+
+def listado_cacheado(recurso, request, generar):
+    """Respuesta de `generar()` para la URL de `request`, desde la cache si su version sigue vigente."""
+    url = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+    prefijo = ':'.join(f'{r}.{v}' for r, v in versiones(DEPENDENCIAS[recurso]).items())
+    clave = f'catalogo:{prefijo}:{url}'
+    guardada = _cache().get(clave)
+    if guardada is not None:
+        _contar(recurso, 'hit')
+        datos, cabeceras = guardada
+        response = Response(datos, headers=cabeceras)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    _contar(recurso, 'miss')
+    response = generar()
+    if response.status_code == 200:
+        cabeceras = {nombre: response[nombre] for nombre in CABECERAS if nombre in response}
+        _cache().set(clave, (list(response.data), cabeceras), _segundos())
+    response['X-Cache'] = 'MISS'
+    return response
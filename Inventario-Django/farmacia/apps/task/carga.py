@@ -0,0 +1,261 @@
+"""Generador de datos y escenario de carga HTTP para medir la API.
+
+- `sembrar_datos` llena la base con un inventario reproducible (semilla fija)
+  usando bulk_create; lo usan los benchmarks y `manage.py sembrar_datos`.
+- `ejecutar_carga` mezcla lecturas, ventas y movimientos contra la API con
+  varios hilos y mide throughput, latencias p50/p95/p99 y consultas SQL
+  (estas ultimas solo si el servidor acepta la cabecera X-Perfil-SQL).
+  El transporte es una funcion `enviar(metodo, ruta, cuerpo)`, asi que el
+  mismo escenario corre contra un servidor real (`manage.py carga_http`) o
+  contra el cliente de pruebas de DRF.
+- `guardar_resultados` acumula los resultados en un JSON con el commit
+  actual, para comparar corridas.
+"""
+
+import json
+import random
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import autocompletado, cache_catalogo
+from .models import Categoria, Cliente, DetalleVenta, Empleado, FacturaVenta, Movimiento, Producto, Proveedor
+
+# Peso de cada operacion en el escenario mixto
+MEZCLA = {
+    'listar_productos': 50,
+    'buscar_productos': 15,
+    'dashboard': 5,
+    'listar_facturas': 10,
+    'crear_venta': 10,
+    'crear_movimiento': 10,
+}
+
+STOCK_VENTAS = 1000  # Stock de los productos que el escenario vende
+
+_CONSULTAS = re.compile(r'consultas=(\d+)')
+
+
+# ==================== DATOS ====================
+
+def sembrar_datos(usuario, productos=2000, clientes=50, facturas=500, movimientos=5000, semilla=0):
+    """
+    Crea categorias, proveedores, clientes, un empleado, productos, facturas con
+    1-3 lineas y movimientos. Todo con bulk_create (sin señales): los totales
+    y el stock se escriben ya calculados. Devuelve los ids que usa el escenario.
+    Los correos llevan un sufijo por corrida para poder sembrar de nuevo (--forzar).
+    """
+    azar = random.Random(semilla)
+    corrida = timezone.now().strftime('%Y%m%d%H%M%S%f')
+    nombres = ('Medicamentos', 'Vitaminas', 'Cuidado personal', 'Bebes', 'Equipos')
+    Categoria.objects.bulk_create((Categoria(nombre=nombre) for nombre in nombres), ignore_conflicts=True)
+    categorias = sorted(Categoria.objects.filter(nombre__in=nombres), key=lambda c: nombres.index(c.nombre))
+    proveedores = Proveedor.objects.bulk_create(
+        Proveedor(nombre='Proveedor' if i == 0 else f'Proveedor {i}', contacto=f'bench{i}-{corrida}@proveedor.com',
+                  usuario=usuario)
+        for i in range(10)
+    )
+    lista_clientes = Cliente.objects.bulk_create(
+        Cliente(nombre='Cliente' if i == 0 else f'Cliente {i}', correo=f'bench{i}-{corrida}@cliente.com',
+                telefono=str(3000000000 + i), usuario=usuario)
+        for i in range(max(clientes, 1))
+    )
+    empleado = Empleado.objects.create(nombre='Empleado', usuario=usuario)
+
+    Producto.objects.bulk_create(
+        # Uno de cada tres productos tiene stock de sobra para las ventas del escenario
+        (Producto(nombre=f'Producto {i}', precio=10 + i % 50, stock=i % 40 if i % 3 else STOCK_VENTAS + i % 40,
+                  id_categoria=categorias[i % len(categorias)], id_proveedor=proveedores[0])
+         for i in range(productos)),
+        batch_size=1000,
+    )
+    ids = list(Producto.objects.order_by('id').values_list('id', flat=True))
+    precios = dict(Producto.objects.values_list('id', 'precio'))
+    con_stock = list(Producto.objects.filter(stock__gte=STOCK_VENTAS).order_by('id').values_list('id', flat=True))
+
+    nuevas = FacturaVenta.objects.bulk_create(
+        (FacturaVenta(total=0, id_cliente=azar.choice(lista_clientes), id_empleado=empleado)
+         for _ in range(facturas)),
+        batch_size=1000,
+    )
+    detalles = []
+    for factura in nuevas:
+        for producto in azar.sample(ids, min(azar.randint(1, 3), len(ids))):
+            cantidad = azar.randint(1, 5)
+            detalles.append(DetalleVenta(cantidad=cantidad, precio_unitario=precios[producto],
+                                         subtotal=cantidad * precios[producto],
+                                         id_factura=factura, id_producto_id=producto))
+            factura.total += cantidad * precios[producto]
+    DetalleVenta.objects.bulk_create(detalles, batch_size=1000)
+    FacturaVenta.objects.bulk_update(nuevas, ['total'], batch_size=1000)
+
+    Movimiento.objects.bulk_create(
+        (Movimiento(tipo='entrada' if i % 2 else 'salida', cantidad=1 + i % 5,
+                    id_producto_id=ids[i % len(ids)], id_proveedor=proveedores[0],
+                    id_cliente=lista_clientes[i % len(lista_clientes)], responsable=empleado)
+         for i in range(movimientos)),
+        batch_size=1000,
+    )
+    autocompletado.invalidar()  # bulk_create no dispara señales
+    cache_catalogo.invalidar('categoria', 'proveedor', 'producto')
+    return {
+        'productos': ids,
+        'productos_venta': con_stock or ids,
+        'clientes': [cliente.pk for cliente in lista_clientes],
+        'proveedores': [proveedor.pk for proveedor in proveedores],
+        'empleado': empleado.pk,
+    }
+
+
+def ids_desde_api(enviar):
+    """Ids para el escenario leidos de la propia API (contra un servidor ya sembrado)."""
+    def listar(ruta):
+        estado, _, cuerpo = enviar('GET', f'{ruta}?page_size=1000', None)
+        if estado != 200:
+            raise RuntimeError(f"GET {ruta} respondio {estado}")
+        return json.loads(cuerpo)
+
+    productos = listar('/farmacia/productos/')
+    con_stock = [fila['id'] for fila in productos if fila['stock'] >= STOCK_VENTAS]
+    return {
+        'productos': [fila['id'] for fila in productos],
+        'productos_venta': con_stock or [fila['id'] for fila in productos],
+        'clientes': [fila['id'] for fila in listar('/farmacia/clientes/')],
+        'proveedores': [fila['id'] for fila in listar('/farmacia/proveedores/')],
+        'empleado': listar('/farmacia/empleados/')[0]['id'],
+    }
+
+
+# ==================== ESCENARIO ====================
+
+def percentiles(tiempos):
+    """p50/p95/p99 (ms) de una lista de tiempos en ms."""
+    if not tiempos:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    ordenados = sorted(tiempos)
+    valor = lambda p: round(ordenados[min(int(len(ordenados) * p), len(ordenados) - 1)], 3)
+    return {'p50_ms': valor(0.50), 'p95_ms': valor(0.95), 'p99_ms': valor(0.99)}
+
+
+def _peticion(operacion, ids, azar):
+    """(metodo, ruta, cuerpo) de una operacion del escenario."""
+    if operacion == 'listar_productos':
+        return 'GET', '/farmacia/productos/?page_size=50', None
+    if operacion == 'buscar_productos':
+        return 'GET', f'/farmacia/productos/?search=Producto%20{azar.randint(1, 99)}', None
+    if operacion == 'dashboard':
+        return 'GET', '/farmacia/dashboard/', None
+    if operacion == 'listar_facturas':
+        return 'GET', '/farmacia/facturasventa/?page_size=50', None
+    if operacion == 'crear_venta':
+        lineas = azar.sample(ids['productos_venta'], min(azar.randint(1, 3), len(ids['productos_venta'])))
+        return 'POST', '/farmacia/facturasventa/', {
+            'id_cliente': azar.choice(ids['clientes']),
+            'id_empleado': ids['empleado'],
+            'detalles': [{'id_producto': producto, 'cantidad': 1} for producto in lineas],
+        }
+    return 'POST', '/farmacia/movimientos/', {
+        'tipo': 'entrada',
+        'cantidad': azar.randint(1, 10),
+        'id_producto': azar.choice(ids['productos']),
+        'id_proveedor': azar.choice(ids['proveedores']),
+    }
+
+
+def ejecutar_carga(enviar, ids, duracion=None, operaciones=None, concurrencia=8, mezcla=None, semilla=0):
+    """
+    Lanza el escenario mixto con `concurrencia` hilos hasta cumplir `duracion`
+    segundos o `operaciones` peticiones. `enviar(metodo, ruta, cuerpo)` devuelve
+    (estado, cabeceras, cuerpo). Devuelve el resumen por operacion y total.
+    """
+    if duracion is None and operaciones is None:
+        raise ValueError("Indique duracion u operaciones.")
+    mezcla = mezcla or MEZCLA
+    nombres, pesos = list(mezcla), list(mezcla.values())
+    muestras = {nombre: {'ms': [], 'consultas': [], 'errores': 0} for nombre in nombres}
+    lock = threading.Lock()
+    restantes = [operaciones]
+    fin = time.perf_counter() + duracion if duracion is not None else None
+
+    def turno():
+        with lock:
+            if restantes[0] is not None:
+                if restantes[0] <= 0:
+                    return False
+                restantes[0] -= 1
+        return fin is None or time.perf_counter() < fin
+
+    def trabajador(numero):
+        azar = random.Random(semilla * 1000 + numero)
+        while turno():
+            operacion = azar.choices(nombres, pesos)[0]
+            metodo, ruta, cuerpo = _peticion(operacion, ids, azar)
+            inicio = time.perf_counter()
+            try:
+                estado, cabeceras, _ = enviar(metodo, ruta, cuerpo)
+            except Exception:
+                estado, cabeceras = None, {}
+            ms = (time.perf_counter() - inicio) * 1000
+            consultas = _CONSULTAS.search(cabeceras.get('X-Perfil-SQL', ''))
+            with lock:
+                muestra = muestras[operacion]
+                muestra['ms'].append(ms)
+                if consultas:
+                    muestra['consultas'].append(int(consultas.group(1)))
+                if estado is None or estado >= 400:
+                    muestra['errores'] += 1
+
+    inicio = time.perf_counter()
+    if concurrencia == 1:
+        trabajador(0)  # En el hilo actual: necesario con el cliente de pruebas (transaccion del test)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            list(pool.map(trabajador, range(concurrencia)))
+    segundos = time.perf_counter() - inicio
+
+    resumen = {}
+    for nombre, muestra in muestras.items():
+        if not muestra['ms']:
+            continue
+        resumen[nombre] = {
+            'peticiones': len(muestra['ms']),
+            'errores': muestra['errores'],
+            **percentiles(muestra['ms']),
+            'consultas_promedio': (round(sum(muestra['consultas']) / len(muestra['consultas']), 2)
+                                   if muestra['consultas'] else None),
+        }
+    todas = [ms for muestra in muestras.values() for ms in muestra['ms']]
+    resumen['total'] = {
+        'peticiones': len(todas),
+        'errores': sum(muestra['errores'] for muestra in muestras.values()),
+        'segundos': round(segundos, 3),
+        'peticiones_por_segundo': round(len(todas) / segundos, 2) if segundos else None,
+        'concurrencia': concurrencia,
+        **percentiles(todas),
+    }
+    return resumen
+
+
+# ==================== RESULTADOS ====================
+
+def _commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def guardar_resultados(ruta, nombre, valores):
+    """Agrega (o reemplaza) `nombre` en el JSON de resultados de `ruta`, con commit y fecha."""
+    archivo = Path(ruta)
+    datos = json.loads(archivo.read_text()) if archivo.exists() else {}
+    datos.update({'commit': _commit_actual(), 'fecha': timezone.now().isoformat()})
+    datos.setdefault('resultados', {})[nombre] = valores
+    archivo.write_text(json.dumps(datos, indent=2, ensure_ascii=False, default=str))
@@ -0,0 +1,317 @@
+"""Cola de generacion de reportes PDF en segundo plano.
+
+Una peticion encola un trabajo y recibe su id de inmediato; un pool local de
+hilos (REPORTES_MAX_CONCURRENCIA) genera el PDF con las funciones de pdf.py.
+No requiere broker externo. Hay dos almacenes de trabajos (REPORTES_COLA):
+
+- 'memoria' (por defecto): los trabajos viven en el proceso. Sirve para un
+  servidor de un solo proceso con varios hilos (waitress).
+- 'db': los trabajos se guardan en ReporteJob. El estado es visible desde
+  cualquier proceso y `manage.py procesar_reportes` puede atender la cola
+  desde un proceso aparte.
+
+Los trabajos terminados se eliminan pasados REPORTES_EXPIRACION segundos; en
+memoria ademas se conservan como mucho REPORTES_MAX_TERMINADOS_MEMORIA (los
+PDFs listos ocupan memoria del proceso).
+
+Cada vez que un trabajo se toma sube `intento`, y mientras se genera el PDF
+un latido renueva `modified`. Si el proceso que lo generaba muere, el latido
+se detiene y pasados REPORTES_TIMEOUT_PROCESANDO segundos el trabajo se
+reclama: vuelve a 'pendiente' una vez (al encolar otro reporte o en
+procesar_reportes) y, si vuelve a quedar atascado, pasa a 'error'. Asi no
+bloquea el limite de pendientes del usuario. El resultado solo se guarda si
+el trabajo sigue 'procesando' con el mismo `intento`: una ejecucion
+reclamada no pisa a la que la reemplazo.
+
+El mensaje de error que ve el usuario es generico; el detalle va al log.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from tempfile import SpooledTemporaryFile
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DetalleVenta, Movimiento, Producto, ReporteJob
+from .pdf import (
+    MAX_PDF_EN_MEMORIA,
+    escribir_todos_detalles_venta_pdf,
+    escribir_todos_movimientos_pdf,
+    escribir_todos_productos_pdf,
+)
+from .permissions import IsAdmin, IsEmployee
+
+logger = logging.getLogger(__name__)
+
+
+class TipoReporte(NamedTuple):
+    queryset: object       # callable(parametros) -> queryset
+    escribir: object       # escribir_*_pdf(queryset, salida)
+    nombre_archivo: str
+    permisos: tuple = ()   # Alguno debe cumplirse; vacio = cualquier usuario autenticado
+
+
+TIPOS_REPORTE = {
+    'productos': TipoReporte(
+        lambda parametros: Producto.objects.select_related('id_categoria', 'id_proveedor'),
+        escribir_todos_productos_pdf, 'todos_productos.pdf', (IsAdmin, IsEmployee),
+    ),
+    'movimientos': TipoReporte(
+        lambda parametros: Movimiento.objects.select_related('id_producto', 'id_proveedor', 'id_cliente', 'responsable'),
+        escribir_todos_movimientos_pdf, 'todos_movimientos.pdf', (IsAdmin, IsEmployee),
+    ),
+    'detalles_venta': TipoReporte(
+        lambda parametros: DetalleVenta.objects.select_related('id_producto', 'id_factura'),
+        escribir_todos_detalles_venta_pdf, 'todos_detalles_venta.pdf', (IsAdmin, IsEmployee),
+    ),
+    'mis_detalles_venta': TipoReporte(
+        lambda parametros: DetalleVenta.objects.select_related('id_producto', 'id_factura').filter(
+            id_factura__id_cliente_id=parametros['cliente_id']),
+        escribir_todos_detalles_venta_pdf, 'mis_detalles_venta.pdf',
+    ),
+}
+
+TERMINADOS = ('listo', 'error')
+REINTENTO = 'Reintento: el proceso que lo generaba no termino.'
+EXPIRADO = 'El reporte no termino a tiempo; vuelve a solicitarlo.'
+FALLIDO = 'No se pudo generar el reporte; vuelve a solicitarlo.'
+
+
+class LimiteDeTrabajosError(Exception):
+    """El usuario ya tiene demasiados reportes pendientes."""
+
+
+# ==================== ALMACENES DE TRABAJOS ====================
+
+class AlmacenMemoria:
+    """Trabajos en un diccionario del proceso (instancias de ReporteJob sin guardar)."""
+
+    def __init__(self):
+        self._trabajos = {}
+        self._lock = threading.Lock()
+
+    def crear(self, trabajo):
+        with self._lock:
+            self._trabajos[trabajo.pk] = trabajo
+
+    def obtener(self, pk):
+        return self._trabajos.get(pk)
+
+    def tomar(self, pk):
+        """Marca el trabajo como 'procesando' si seguia pendiente. Devuelve el trabajo o None."""
+        with self._lock:
+            trabajo = self._trabajos.get(pk)
+            if trabajo is None or trabajo.estado != 'pendiente':
+                return None
+            trabajo.estado, trabajo.modified = 'procesando', timezone.now()
+            trabajo.intento += 1
+            return trabajo
+
+    def _vigente(self, trabajo, intento):
+        return trabajo.estado == 'procesando' and trabajo.intento == intento
+
+    def latir(self, trabajo, intento):
+        with self._lock:
+            if self._vigente(trabajo, intento):
+                trabajo.modified = timezone.now()
+
+    def terminar(self, trabajo, intento, **campos):
+        """Guarda el resultado si esta ejecucion sigue siendo la vigente. Devuelve True si lo guardo."""
+        with self._lock:
+            if not self._vigente(trabajo, intento):
+                return False
+            for campo, valor in campos.items():
+                setattr(trabajo, campo, valor)
+            trabajo.modified = timezone.now()
+            self._recortar()
+            return True
+
+    def _recortar(self):
+        """Deja como mucho REPORTES_MAX_TERMINADOS_MEMORIA terminados (se van los mas viejos)."""
+        terminados = sorted((t for t in self._trabajos.values() if t.estado in TERMINADOS),
+                            key=lambda t: t.modified)
+        for trabajo in terminados[:max(len(terminados) - settings.REPORTES_MAX_TERMINADOS_MEMORIA, 0)]:
+            del self._trabajos[trabajo.pk]
+
+    def pendientes(self, usuario_id=None):
+        return [
+            t for t in list(self._trabajos.values())
+            if t.estado not in TERMINADOS and (usuario_id is None or t.usuario_id == usuario_id)
+        ]
+
+    def purgar(self, limite):
+        with self._lock:
+            for pk in [pk for pk, t in self._trabajos.items() if t.estado in TERMINADOS and t.modified < limite]:
+                del self._trabajos[pk]
+
+    def recuperar(self, limite):
+        """Reclama los trabajos 'procesando' sin latido desde `limite`. Devuelve los que vuelven a 'pendiente'."""
+        reintentos = []
+        with self._lock:
+            for trabajo in self._trabajos.values():
+                if trabajo.estado == 'procesando' and trabajo.modified < limite:
+                    if trabajo.intento > 1:  # Ya se reintento una vez
+                        trabajo.estado, trabajo.error = 'error', EXPIRADO
+                    else:
+                        trabajo.estado, trabajo.error = 'pendiente', REINTENTO
+                        reintentos.append(trabajo.pk)
+                    trabajo.modified = timezone.now()
+        return reintentos
+
+
+class AlmacenBaseDatos:
+    """Trabajos en la tabla ReporteJob; el estado se comparte entre procesos."""
+
+    def crear(self, trabajo):
+        trabajo.save()
+
+    def obtener(self, pk):
+        return ReporteJob.objects.filter(pk=pk).first()
+
+    def tomar(self, pk):
+        # UPDATE condicional: solo un proceso/hilo puede pasar el trabajo a 'procesando'
+        tomados = ReporteJob.objects.filter(pk=pk, estado='pendiente').update(
+            estado='procesando', intento=F('intento') + 1, modified=timezone.now())
+        return self.obtener(pk) if tomados else None
+
+    def _vigente(self, trabajo, intento):
+        return ReporteJob.objects.filter(pk=trabajo.pk, estado='procesando', intento=intento)
+
+    def latir(self, trabajo, intento):
+        self._vigente(trabajo, intento).update(modified=timezone.now())
+
+    def terminar(self, trabajo, intento, **campos):
+        """Guarda el resultado si esta ejecucion sigue siendo la vigente. Devuelve True si lo guardo."""
+        if not self._vigente(trabajo, intento).update(modified=timezone.now(), **campos):
+            return False
+        for campo, valor in campos.items():
+            setattr(trabajo, campo, valor)
+        return True
+
+    def pendientes(self, usuario_id=None):
+        trabajos = ReporteJob.objects.exclude(estado__in=TERMINADOS).defer('contenido')
+        if usuario_id is not None:
+            trabajos = trabajos.filter(usuario_id=usuario_id)
+        return list(trabajos.order_by('created'))
+
+    def purgar(self, limite):
+        ReporteJob.objects.filter(estado__in=TERMINADOS, modified__lt=limite).delete()
+
+    def recuperar(self, limite):
+        atascados = ReporteJob.objects.filter(estado='procesando', modified__lt=limite)
+        atascados.filter(intento__gt=1).update(estado='error', error=EXPIRADO, modified=timezone.now())
+        reintentos = list(atascados.values_list('pk', flat=True))
+        # Condicional: si el trabajo termino o latio entre ambas consultas no se toca
+        atascados.filter(pk__in=reintentos).update(estado='pendiente', error=REINTENTO, modified=timezone.now())
+        return reintentos
+
+
+_almacenes = {'memoria': AlmacenMemoria(), 'db': AlmacenBaseDatos()}
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def almacen():
+    return _almacenes[settings.REPORTES_COLA]
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.REPORTES_MAX_CONCURRENCIA, thread_name_prefix='reportes')
+        return _executor
+
+
+# ==================== API DE LA COLA ====================
+
+def purgar_expirados(destino=None):
+    (destino or almacen()).purgar(timezone.now() - timedelta(seconds=settings.REPORTES_EXPIRACION))
+
+
+def recuperar_atascados(destino=None):
+    """Reclama los trabajos atascados en 'procesando'; devuelve los pks que vuelven a 'pendiente'."""
+    limite = timezone.now() - timedelta(seconds=settings.REPORTES_TIMEOUT_PROCESANDO)
+    return (destino or almacen()).recuperar(limite)
+
+
+def _despachar(pk):
+    if settings.REPORTES_EJECUCION_INMEDIATA:
+        procesar(pk)
+    else:
+        # Con el almacen 'db' el hilo debe ver la fila ya confirmada
+        transaction.on_commit(lambda: _pool().submit(_procesar_en_hilo, pk))
+
+
+def encolar(tipo, usuario, parametros=None):
+    """Registra un trabajo y lo envia al pool. Devuelve el ReporteJob (sin contenido)."""
+    purgar_expirados()
+    for pk in recuperar_atascados():
+        _despachar(pk)
+    if len(almacen().pendientes(usuario.pk)) >= settings.REPORTES_MAX_PENDIENTES_POR_USUARIO:
+        raise LimiteDeTrabajosError("Ya tienes demasiados reportes en proceso; espera a que terminen.")
+
+    trabajo = ReporteJob(
+        tipo=tipo,
+        parametros=parametros or {},
+        usuario=usuario,
+        nombre_archivo=TIPOS_REPORTE[tipo].nombre_archivo,
+    )
+    almacen().crear(trabajo)
+    _despachar(trabajo.pk)
+    return trabajo
+
+
+def obtener(pk):
+    return almacen().obtener(pk)
+
+
+def _latir(destino, trabajo, intento, fin):
+    """Renueva `modified` del trabajo mientras se genera: solo los trabajos sin latido se reclaman."""
+    latidos = 0
+    try:
+        while not fin.wait(settings.REPORTES_TIMEOUT_PROCESANDO / 3):
+            destino.latir(trabajo, intento)
+            latidos += 1
+    finally:
+        if latidos and isinstance(destino, AlmacenBaseDatos):
+            connection.close()
+
+
+def procesar(pk, destino=None):
+    """Genera el PDF de un trabajo pendiente. Devuelve False si otro hilo/proceso ya lo tomo."""
+    destino = destino or almacen()
+    trabajo = destino.tomar(pk)
+    if trabajo is None:
+        return False
+    tipo, intento = TIPOS_REPORTE[trabajo.tipo], trabajo.intento
+    fin = threading.Event()
+    threading.Thread(target=_latir, args=(destino, trabajo, intento, fin), daemon=True).start()
+    try:
+        with SpooledTemporaryFile(max_size=MAX_PDF_EN_MEMORIA) as archivo:
+            tipo.escribir(tipo.queryset(trabajo.parametros), archivo)
+            archivo.seek(0)
+            contenido = archivo.read()
+        resultado = {'estado': 'listo', 'contenido': contenido, 'error': ''}
+    except Exception:
+        logger.exception("[REPORTES] Fallo el reporte %s (%s)", pk, trabajo.tipo)
+        resultado = {'estado': 'error', 'error': FALLIDO}
+    finally:
+        fin.set()
+    if not destino.terminar(trabajo, intento, **resultado):
+        logger.warning("[REPORTES] El reporte %s fue reclamado mientras se generaba; se descarta.", pk)
+    return True
+
+
+def _procesar_en_hilo(pk):
+    try:
+        procesar(pk)
+    finally:
+        connection.close()  # Cada hilo del pool abre su propia conexion
@@ -0,0 +1,77 @@
+"""ETag / Last-Modified y GET condicional para los ViewSets de modelos.
+
+Todos los modelos heredan TimeStampedModel, asi que el estado de un listado
+se resume con una sola consulta de agregacion sobre el queryset ya filtrado:
+count() y max(modified). Un alta cambia ambos, una edicion cambia el
+maximo, una baja cambia el conteo. Las actualizaciones por UPDATE (stock,
+total de la factura) tambien escriben `modified`.
+
+Los listados que muestran datos de otras tablas (producto_nombre,
+cliente_nombre, detalles anidados...) declaran esos modelos en
+`etag_dependencias`: su max(modified) entra en la firma, para que renombrar
+un producto cambie el ETag de los movimientos que lo muestran.
+
+La firma tambien incluye la URL (filtros, pagina, cursor), el usuario y el
+formato negociado. Si llega If-None-Match y coincide, se responde 304 sin
+serializar nada.
+
+Los listados se validan solo por ETag, sin Last-Modified: una baja no mueve
+max(modified), asi que un If-Modified-Since responderia 304 con la fila
+borrada todavia en la copia del cliente. Los detalles si lo llevan.
+"""
+
+import hashlib
+
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def _ultimo(*fechas):
+    fechas = [fecha for fecha in fechas if fecha is not None]
+    return max(fechas) if fechas else None
+
+
+def _ultimos_dependencias(dependencias):
+    """max(modified) de cada modelo del que el serializer lee datos."""
+    return [modelo.objects.aggregate(ultimo=Max('modified'))['ultimo'] for modelo in dependencias]
+
+
+def firma(request, *partes):
+    """(etag, ultima modificacion) de la respuesta a `request` con el estado `partes`."""
+    usuario = getattr(request.user, 'pk', None)
+    texto = '|'.join(str(parte) for parte in (request.get_full_path(), usuario,
+                                              getattr(request, 'accepted_media_type', ''), *partes))
+    etag = quote_etag(hashlib.sha1(texto.encode()).hexdigest())
+    fechas = [parte for parte in partes if hasattr(parte, 'timestamp')]
+    return etag, _ultimo(*fechas)
+
+
+def firma_listado(request, queryset, dependencias=()):
+    queryset = queryset.order_by()
+    # Dos consultas: un MAX solo se resuelve con el indice de modified, junto al COUNT recorre la tabla
+    filas = queryset.count()
+    ultimo = queryset.aggregate(ultimo=Max('modified'))['ultimo']
+    etag, _ = firma(request, filas, ultimo, *_ultimos_dependencias(dependencias))
+    return etag, None  # Sin Last-Modified: ver el docstring del modulo
+
+
+def firma_objeto(request, instancia, dependencias=()):
+    return firma(request, instancia.pk, instancia.modified, *_ultimos_dependencias(dependencias))
+
+
+def no_modificado(request, etag, ultimo):
+    """HttpResponseNotModified (con sus cabeceras) si el cliente ya tiene esta version; si no, None."""
+    respuesta = get_conditional_response(
+        request, etag=etag, last_modified=int(ultimo.timestamp()) if ultimo else None,
+    )
+    if respuesta is not None:
+        poner_cabeceras(respuesta, etag, ultimo)
+    return respuesta
+
+
+def poner_cabeceras(response, etag, ultimo):
+    response['ETag'] = etag
+    if ultimo is not None:
+        response['Last-Modified'] = http_date(ultimo.timestamp())
+    return response
@@ -0,0 +1,71 @@
+"""Indicadores del dashboard calculados en la base de datos.
+
+Reemplaza los reduce()/filter() que hacian los dashboards de React sobre los
+listados completos de productos, facturas y movimientos: tres consultas de
+agregacion devuelven solo los numeros que se muestran.
+"""
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import FacturaVenta, Movimiento, Producto
+
+UMBRAL_STOCK_BAJO = 10  # Igual que Producto.low_stock
+
+_DINERO = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _valor(cantidad, precio):
+    return ExpressionWrapper(F(cantidad) * F(precio), output_field=_DINERO)
+
+
+def _suma(expresion, **extra):
+    return Coalesce(Sum(expresion, **extra), 0, output_field=_DINERO)
+
+
+def _rango_fechas(queryset, desde=None, hasta=None):
+    if desde:
+        queryset = queryset.filter(fecha__gte=desde)
+    if hasta:
+        queryset = queryset.filter(fecha__lte=hasta)
+    return queryset
+
+
+def resumen_dashboard(desde=None, hasta=None):
+    """Devuelve los indicadores de inventario, ventas y movimientos.
+
+    `desde`/`hasta` (fechas, opcionales) filtran ventas y movimientos;
+    el inventario siempre es el estado actual.
+    """
+    inventario = Producto.objects.aggregate(
+        total_productos=Count('id'),
+        stock_bajo=Count('id', filter=Q(stock__lt=UMBRAL_STOCK_BAJO)),
+        sin_stock=Count('id', filter=Q(stock__lte=0)),
+        unidades_en_stock=Coalesce(Sum('stock'), 0),
+        valor_total_stock=_suma(_valor('precio', 'stock')),
+    )
+
+    ventas = _rango_fechas(FacturaVenta.objects.all(), desde, hasta).aggregate(
+        total_ventas=Count('id'),
+        monto_ventas=_suma('total'),
+    )
+
+    entradas, salidas = Q(tipo='entrada'), Q(tipo='salida')
+    valor_movimiento = _valor('cantidad', 'id_producto__precio')
+    movimientos = _rango_fechas(Movimiento.objects.all(), desde, hasta).aggregate(
+        total_movimientos=Count('id'),
+        entradas=Count('id', filter=entradas),
+        salidas=Count('id', filter=salidas),
+        unidades_entrada=Coalesce(Sum('cantidad', filter=entradas), 0),
+        unidades_salida=Coalesce(Sum('cantidad', filter=salidas), 0),
+        valor_entradas=_suma(valor_movimiento, filter=entradas),
+        valor_salidas=_suma(valor_movimiento, filter=salidas),
+    )
+
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'inventario': inventario,
+        'ventas': ventas,
+        'movimientos': movimientos,
+    }
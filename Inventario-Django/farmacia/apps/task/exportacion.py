@@ -0,0 +1,96 @@
+"""Exportacion de listados completos en CSV o NDJSON (una fila JSON por linea).
+
+La respuesta es un StreamingHttpResponse: las filas se leen con
+values_list(...).iterator() (cursor del servidor en PostgreSQL, fetchmany en
+SQLite) y se envian en bloques de texto, asi que la memoria no depende del
+tamaño de la exportacion. Cada columna es (encabezado, lookup del ORM).
+"""
+
+import csv
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .pdf import CHUNK_FILAS
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+FILAS_POR_BLOQUE = 500  # Filas por bloque de texto enviado al cliente
+
+COLUMNAS_PRODUCTO = (
+    ('id', 'id'), ('nombre', 'nombre'), ('precio', 'precio'), ('stock', 'stock'),
+    ('categoria', 'id_categoria__nombre'), ('proveedor', 'id_proveedor__nombre'),
+    ('modificado', 'modified'),
+)
+COLUMNAS_MOVIMIENTO = (
+    ('id', 'id'), ('fecha', 'fecha'), ('tipo', 'tipo'), ('cantidad', 'cantidad'),
+    ('producto_id', 'id_producto_id'), ('producto', 'id_producto__nombre'),
+    ('proveedor', 'id_proveedor__nombre'), ('cliente', 'id_cliente__nombre'),
+    ('responsable', 'responsable__nombre'),
+)
+COLUMNAS_DETALLE_VENTA = (
+    ('id', 'id'), ('factura', 'id_factura_id'), ('fecha', 'id_factura__fecha'),
+    ('producto_id', 'id_producto_id'), ('producto', 'id_producto__nombre'),
+    ('cantidad', 'cantidad'), ('precio_unitario', 'precio_unitario'), ('subtotal', 'subtotal'),
+)
+COLUMNAS_FACTURA_VENTA = (
+    ('id', 'id'), ('fecha', 'fecha'), ('cliente', 'id_cliente__nombre'),
+    ('empleado', 'id_empleado__nombre'), ('total', 'total'),
+)
+
+
+class _Eco:
+    """Archivo falso para csv.writer: devuelve la linea en vez de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def _celda_csv(valor):
+    # Evita que una hoja de calculo interprete como formula un texto cargado por usuarios
+    if isinstance(valor, str) and valor[:1] in ('=', '+', '-', '@'):
+        return "'" + valor
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return valor
+
+
+def _lineas_csv(encabezados, filas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(encabezados)
+    for fila in filas:
+        yield escritor.writerow([_celda_csv(valor) for valor in fila])
+
+
+def _lineas_ndjson(encabezados, filas):
+    codificador = DjangoJSONEncoder(ensure_ascii=False)
+    for fila in filas:
+        yield codificador.encode(dict(zip(encabezados, fila))) + '\n'
+
+
+def _en_bloques(lineas):
+    while True:
+        bloque = ''.join(islice(lineas, FILAS_POR_BLOQUE))
+        if not bloque:
+            return
+        yield bloque.encode('utf-8')
+
+
+def respuesta_exportacion(queryset, columnas, formato, nombre):
+    """Devuelve un StreamingHttpResponse con las `columnas` de cada fila del queryset."""
+    if not queryset.ordered:
+        queryset = queryset.order_by('pk')
+    encabezados = [encabezado for encabezado, _ in columnas]
+    filas = (
+        queryset.prefetch_related(None)
+        .values_list(*[lookup for _, lookup in columnas])
+        .iterator(chunk_size=CHUNK_FILAS)
+    )
+    lineas = _lineas_csv(encabezados, filas) if formato == 'csv' else _lineas_ndjson(encabezados, filas)
+    response = StreamingHttpResponse(_en_bloques(lineas), content_type=FORMATOS[formato])
+    extension = 'csv' if formato == 'csv' else 'ndjson'
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.{extension}"'
+    return response
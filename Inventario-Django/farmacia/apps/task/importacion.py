@@ -0,0 +1,190 @@
+"""Importacion masiva de productos y entradas de stock desde CSV o JSON Lines.
+
+Columnas / claves de cada fila:
+
+    nombre, precio, categoria, proveedor, cantidad
+
+`categoria` y `proveedor` son nombres (se resuelven con un diccionario en
+memoria cargado una vez); `proveedor` puede omitirse si se indica uno para
+todo el archivo. `cantidad` (opcional) es una entrada de stock.
+
+El archivo se lee linea a linea y se procesa por lotes, cada uno en su
+transaccion:
+
+- un producto se identifica por (nombre, proveedor): los existentes se
+  actualizan con bulk_update y los nuevos se insertan con bulk_create. Cada
+  lote bloquea antes sus proveedores (SELECT ... FOR UPDATE), asi dos
+  importaciones simultaneas del mismo proveedor no crean el producto dos veces;
+- las entradas se registran como Movimiento con bulk_create (sin señales) y
+  el stock se suma con un solo UPDATE por lote (stock.aumentar_stock_en_bloque),
+  que tambien escribe el kardex.
+
+Las filas invalidas se informan con su numero y no detienen el lote. Si el
+archivo deja de poder leerse (codificacion, CSV mal formado) se lanza
+ValueError; los lotes anteriores ya quedaron confirmados.
+"""
+
+import codecs
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import autocompletado, cache_catalogo
+from .models import Categoria, Movimiento, Producto, Proveedor
+from .stock import aumentar_stock_en_bloque
+
+FORMATOS = ('csv', 'jsonl')
+TAMANO_LOTE = 1000
+MAX_ERRORES_INFORMADOS = 1000
+PRECIO_MAXIMO = Decimal('1e8')  # Producto.precio: max_digits=10, decimal_places=2
+LARGO_NOMBRE = Producto._meta.get_field('nombre').max_length
+
+
+def _lineas(binario):
+    """Decodifica un archivo binario linea a linea (acepta BOM de Excel)."""
+    return codecs.iterdecode(iter(binario.readline, b''), 'utf-8-sig')
+
+
+def leer_filas(binario, formato):
+    """Genera (numero de fila, dict o None si la linea no se pudo leer)."""
+    if formato == 'csv':
+        try:
+            for numero, fila in enumerate(csv.DictReader(_lineas(binario)), start=2):  # La 1 es el encabezado
+                yield numero, fila
+        except csv.Error as e:
+            raise ValueError(f"CSV mal formado: {e}") from e
+        return
+    for numero, linea in enumerate(_lineas(binario), start=1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError:
+            fila = None
+        yield numero, fila if isinstance(fila, dict) else None
+
+
+class _Catalogos:
+    """Categorias y proveedores por nombre, cargados una vez por importacion."""
+
+    def __init__(self, proveedor_defecto=None):
+        self.categorias = dict(Categoria.objects.values_list('nombre', 'id'))
+        self.proveedores = dict(Proveedor.objects.values_list('nombre', 'id'))
+        self.proveedor_defecto = proveedor_defecto
+
+    def validar(self, fila):
+        """Devuelve (datos limpios, errores) de una fila."""
+        if fila is None:
+            return None, ["La linea no es un objeto JSON valido."]
+        errores = []
+        nombre = str(fila.get('nombre') or '').strip()
+        if not nombre:
+            errores.append("'nombre' es obligatorio.")
+        elif len(nombre) > LARGO_NOMBRE:
+            errores.append(f"'nombre' admite hasta {LARGO_NOMBRE} caracteres.")
+        try:
+            precio = Decimal(str(fila.get('precio', '')).strip())
+            if not 0 <= precio < PRECIO_MAXIMO or precio.as_tuple().exponent < -2:
+                raise InvalidOperation
+        except (InvalidOperation, ValueError):
+            errores.append("'precio' debe ser un numero positivo con hasta 2 decimales.")
+            precio = None
+        try:
+            cantidad = int(str(fila.get('cantidad') or 0).strip())
+            if cantidad < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            errores.append("'cantidad' debe ser un entero no negativo.")
+            cantidad = 0
+        categoria = self.categorias.get(str(fila.get('categoria') or '').strip())
+        if categoria is None:
+            errores.append(f"Categoria desconocida: {fila.get('categoria')!r}.")
+        nombre_proveedor = str(fila.get('proveedor') or '').strip()
+        proveedor = self.proveedores.get(nombre_proveedor) if nombre_proveedor else self.proveedor_defecto
+        if proveedor is None:
+            errores.append(f"Proveedor desconocido: {fila.get('proveedor')!r}.")
+        if errores:
+            return None, errores
+        return {'nombre': nombre, 'precio': precio, 'cantidad': cantidad,
+                'id_categoria_id': categoria, 'id_proveedor_id': proveedor}, []
+
+
+def _aplicar_lote(lote, resumen):
+    """Inserta/actualiza los productos del lote y suma sus entradas de stock."""
+    # Filas repetidas del mismo producto: la ultima define precio/categoria, las cantidades se suman
+    por_clave, cantidades_por_clave = {}, {}
+    for datos in lote:
+        clave = (datos['nombre'], datos['id_proveedor_id'])
+        por_clave[clave] = datos
+        cantidades_por_clave[clave] = cantidades_por_clave.get(clave, 0) + datos['cantidad']
+
+    proveedores = sorted({p for _, p in por_clave})  # Mismo orden en todos los lotes: sin deadlocks
+    with transaction.atomic():
+        # Otra importacion de estos proveedores espera aqui hasta que este lote confirme sus altas
+        list(Proveedor.objects.select_for_update().filter(pk__in=proveedores).order_by('pk').values_list('pk'))
+        existentes = {}
+        for pk, nombre, proveedor in (
+            Producto.objects.filter(nombre__in={n for n, _ in por_clave}, id_proveedor_id__in=proveedores)
+            .order_by('-pk').values_list('pk', 'nombre', 'id_proveedor_id')
+        ):
+            existentes[(nombre, proveedor)] = pk  # Con duplicados gana el de menor id
+
+        ahora = timezone.now()
+        nuevos, actualizados = [], []
+        for clave, datos in por_clave.items():
+            producto = Producto(nombre=datos['nombre'], precio=datos['precio'], modified=ahora,
+                                id_categoria_id=datos['id_categoria_id'], id_proveedor_id=datos['id_proveedor_id'])
+            if clave in existentes:
+                producto.pk = existentes[clave]
+                actualizados.append(producto)
+            else:
+                nuevos.append(producto)
+
+        Producto.objects.bulk_create(nuevos)
+        Producto.objects.bulk_update(actualizados, ['precio', 'id_categoria', 'modified'])
+        ids = {(p.nombre, p.id_proveedor_id): p.pk for p in nuevos + actualizados}
+
+        entradas = [
+            Movimiento(tipo='entrada', cantidad=cantidad, id_producto_id=ids[clave], id_proveedor_id=clave[1])
+            for clave, cantidad in cantidades_por_clave.items() if cantidad
+        ]
+        Movimiento.objects.bulk_create(entradas)
+        aumentar_stock_en_bloque({ids[clave]: cantidad for clave, cantidad in cantidades_por_clave.items()})
+        if nuevos:  # bulk_create no dispara señales
+            transaction.on_commit(autocompletado.invalidar)
+        cache_catalogo.invalidar('producto')
+
+    resumen['creados'] += len(nuevos)
+    resumen['actualizados'] += len(actualizados)
+    resumen['entradas'] += len(entradas)
+
+
+def importar_inventario(binario, formato='csv', proveedor=None, tamano_lote=TAMANO_LOTE):
+    """
+    Importa un archivo binario (CSV o JSON Lines) y devuelve un resumen:
+    filas leidas, productos creados/actualizados, entradas de stock y errores por fila.
+    `proveedor` (id) se usa en las filas que no traen la columna proveedor.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}. Use uno de {FORMATOS}.")
+    catalogos = _Catalogos(proveedor)
+    resumen = {'filas': 0, 'creados': 0, 'actualizados': 0, 'entradas': 0, 'errores_total': 0, 'errores': []}
+    lote = []
+    for numero, fila in leer_filas(binario, formato):
+        resumen['filas'] += 1
+        datos, errores = catalogos.validar(fila)
+        if errores:
+            resumen['errores_total'] += 1
+            if len(resumen['errores']) < MAX_ERRORES_INFORMADOS:
+                resumen['errores'].append({'fila': numero, 'errores': errores})
+            continue
+        lote.append(datos)
+        if len(lote) >= tamano_lote:
+            _aplicar_lote(lote, resumen)
+            lote = []
+    if lote:
+        _aplicar_lote(lote, resumen)
+    return resumen
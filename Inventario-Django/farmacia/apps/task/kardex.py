@@ -0,0 +1,88 @@
+"""Kardex: historial de stock por producto con saldo acumulado.
+
+Cada funcion de stock.py inserta, en la misma transaccion que el UPDATE de
+Producto.stock, una fila con el cambio y el saldo resultante. Asi el stock de
+un producto en cualquier momento es una sola busqueda por el indice
+(producto, -fecha, -id), sin repetir los movimientos y ventas.
+
+`cortar()` (manage.py cortar_kardex, pensado para correr a diario) agrega una
+fila 'corte' por producto con el stock real: los graficos de historial leen
+solo esos cierres, y si el stock cambio por fuera de stock.py (un UPDATE
+masivo, el admin) la diferencia queda registrada en el corte.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Kardex, Producto
+
+
+def registrar(cambios, origen, referencia=None):
+    """
+    Anota en el kardex los cambios ya aplicados ({producto_id: cantidad con signo}).
+    Debe llamarse dentro de la transaccion del UPDATE: lee el saldo que acaba de escribirse.
+    """
+    if not cambios:
+        return
+    saldos = dict(Producto.objects.filter(pk__in=list(cambios)).values_list('pk', 'stock'))
+    ahora = timezone.now()
+    Kardex.objects.bulk_create([
+        Kardex(producto_id=pk, fecha=ahora, cantidad=cantidad, saldo=saldos[pk],
+               origen=origen, referencia=referencia)
+        for pk, cantidad in cambios.items() if pk in saldos
+    ])
+
+
+def stock_en(producto_id, momento):
+    """Stock del producto en `momento`, o None si el kardex no tiene datos anteriores."""
+    return (
+        Kardex.objects.filter(producto_id=producto_id, fecha__lte=momento)
+        .order_by('-fecha', '-id')
+        .values_list('saldo', flat=True)
+        .first()
+    )
+
+
+def historial(producto_id, desde, hasta):
+    """
+    Saldo de cierre de cada dia entre dos datetimes: [(fecha, saldo), ...].
+    Cada dia usa su ultimo corte; si ese dia no tuvo corte, el stock al final del dia
+    (su ultima fila o, si no tuvo filas, el saldo que arrastra de dias anteriores).
+    Los dias anteriores al primer dato del kardex se omiten.
+    """
+    cortes = {}
+    filas = Kardex.objects.filter(producto_id=producto_id, origen='corte', fecha__range=(desde, hasta))
+    for fecha, saldo in filas.order_by('fecha', 'id').values_list('fecha', 'saldo'):
+        cortes[timezone.localdate(fecha)] = saldo
+    por_dia = []
+    dia, ultimo = timezone.localdate(desde), timezone.localdate(hasta)
+    while dia <= ultimo:
+        saldo = cortes.get(dia)
+        if saldo is None:  # Una busqueda por el indice (producto, -fecha, -id) por dia
+            saldo = stock_en(producto_id, min(_fin_del_dia(dia), hasta))
+        if saldo is not None:
+            por_dia.append((dia, saldo))
+        dia += timedelta(days=1)
+    return por_dia
+
+
+def _fin_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.max))
+
+
+def cortar():
+    """Escribe una fila 'corte' por producto con su stock actual. Devuelve cuantas escribio."""
+    ultimo_saldo = Kardex.objects.filter(producto=OuterRef('pk')).order_by('-fecha', '-id').values('saldo')[:1]
+    with transaction.atomic():
+        productos = Producto.objects.select_for_update().annotate(saldo_kardex=Subquery(ultimo_saldo))
+        ahora = timezone.now()
+        cortes = [
+            Kardex(producto_id=p.pk, fecha=ahora, saldo=p.stock, origen='corte',
+                   cantidad=p.stock - (p.saldo_kardex or 0))
+            for p in productos.only('pk', 'stock')
+        ]
+        Kardex.objects.bulk_create(cortes, batch_size=1000)
+    return len(cortes)
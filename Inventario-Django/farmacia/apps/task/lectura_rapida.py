@@ -0,0 +1,118 @@
+"""Camino rapido de lectura para los listados.
+
+Un ModelSerializer arma una instancia del modelo por fila y recorre sus campos
+con get_attribute/to_representation. Para un listado de solo lectura eso es
+casi todo sobrecosto. LectorRapido compila una vez, a partir del propio
+serializer, la lista de columnas que necesita (values() con los JOIN de cada
+`source='relacion.campo'`) y un conversor por campo; cada fila se convierte en
+dict sin crear modelos ni campos.
+
+El resultado es el mismo que `serializer_class(many=True).data`:
+
+- mismo orden de claves y mismos formatos (Decimal, fechas y el resto de
+  conversiones usan el to_representation del campo del serializer);
+- None se devuelve como None, igual que DRF;
+- si una relacion intermedia es nula la clave se omite, como hace DRF con un
+  campo de solo lectura cuyo `source` no se puede resolver;
+- las propiedades del modelo (p. ej. Producto.low_stock) se calculan con la
+  misma propiedad sobre un objeto con las columnas declaradas en `calculados`.
+"""
+
+import copy
+from types import SimpleNamespace
+
+from rest_framework import serializers
+
+# Campos cuyo to_representation devuelve el valor de values() sin cambios
+_SIN_CONVERSION = (
+    serializers.IntegerField, serializers.CharField, serializers.BooleanField, serializers.ReadOnlyField,
+)
+
+
+def _conversor(campo):
+    """Funcion valor -> representacion del campo; None si el valor ya sirve tal cual."""
+    if isinstance(campo, _SIN_CONVERSION):
+        return None
+    if isinstance(campo, serializers.PrimaryKeyRelatedField):
+        return campo.pk_field.to_representation if campo.pk_field is not None else None
+    return campo.to_representation
+
+
+def _con_zona_fija(campo):
+    """to_representation de un DateTimeField con la zona actual ya resuelta (DRF la busca en cada valor)."""
+    if hasattr(campo, 'timezone'):
+        return campo.to_representation
+    copia = copy.copy(campo)
+    copia.timezone = campo.default_timezone()
+    return copia.to_representation
+
+
+class LectorRapido:
+    """Convierte filas de values() en los mismos dicts que `serializer_class(many=True).data`."""
+
+    def __init__(self, serializer_class, calculados=None):
+        self.serializer_class = serializer_class
+        self.calculados = calculados or {}  # {campo: columnas que lee la propiedad del modelo}
+        self._compilado = None
+
+    def _compilar(self):
+        serializer = self.serializer_class()
+        modelo = serializer.Meta.model
+        columnas, accesores, fechas = [], [], []
+
+        def columna(lookup):
+            if lookup not in columnas:
+                columnas.append(lookup)
+            return lookup
+
+        for campo in serializer.fields.values():
+            if campo.write_only:
+                continue
+            if isinstance(campo, (serializers.BaseSerializer, serializers.ManyRelatedField)):
+                raise TypeError(f"{self.serializer_class.__name__}.{campo.field_name}: campo anidado no soportado.")
+            if campo.field_name in self.calculados:
+                propiedad = getattr(modelo, campo.source).fget
+                dependencias = tuple(columna(c) for c in self.calculados[campo.field_name])
+                accesores.append((campo.field_name, None, None, (propiedad, dependencias)))
+                continue
+            partes = campo.source.split('.')
+            if len(partes) > 2:
+                raise TypeError(f"{self.serializer_class.__name__}.{campo.field_name}: source demasiado profundo.")
+            relacion = columna(partes[0]) if len(partes) == 2 else None  # FK: None si la relacion es nula
+            if isinstance(campo, serializers.DateTimeField):
+                fechas.append((len(accesores), campo))
+            accesores.append((campo.field_name, columna('__'.join(partes)), _conversor(campo), relacion))
+        return columnas, accesores, fechas
+
+    def _compilacion(self):
+        if self._compilado is None:  # Perezoso: el serializer se instancia con las apps ya cargadas
+            self._compilado = self._compilar()
+        return self._compilado
+
+    def valores(self, queryset):
+        """El queryset como values() con solo las columnas que se muestran."""
+        columnas, _, _ = self._compilacion()
+        return queryset.select_related(None).prefetch_related(None).values(*columnas)
+
+    def representar(self, filas):
+        """Lista de dicts (en el formato del serializer) a partir de filas de `valores()`."""
+        _, accesores, fechas = self._compilacion()
+        if fechas:  # La zona actual depende de la peticion: se resuelve una vez por listado
+            accesores = list(accesores)
+            for indice, campo in fechas:
+                nombre, lookup, _, extra = accesores[indice]
+                accesores[indice] = (nombre, lookup, _con_zona_fija(campo), extra)
+        resultado = []
+        for fila in filas:
+            datos = {}
+            for nombre, lookup, conversor, extra in accesores:
+                if lookup is None:  # Propiedad del modelo
+                    propiedad, dependencias = extra
+                    datos[nombre] = propiedad(SimpleNamespace(**{c: fila[c] for c in dependencias}))
+                    continue
+                if extra is not None and fila[extra] is None:
+                    continue  # Relacion nula: DRF omite la clave
+                valor = fila[lookup]
+                datos[nombre] = valor if valor is None or conversor is None else conversor(valor)
+            resultado.append(datos)
+        return resultado
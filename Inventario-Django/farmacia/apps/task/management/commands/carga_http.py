@@ -0,0 +1,65 @@
+"""Escenario de carga HTTP contra un servidor en marcha (ver apps/task/carga.py)."""
+
+import json
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.task.carga import MEZCLA, ejecutar_carga, guardar_resultados, ids_desde_api
+
+
+def _enviador(base, token=None, perfil=False, timeout=30):
+    """Funcion enviar(metodo, ruta, cuerpo) -> (estado, cabeceras, cuerpo) sobre urllib."""
+    def enviar(metodo, ruta, cuerpo):
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+        peticion = urllib.request.Request(base + ruta, data=datos, method=metodo)
+        peticion.add_header('Content-Type', 'application/json')
+        if token:
+            peticion.add_header('Authorization', f'Bearer {token}')
+        if perfil:
+            peticion.add_header('X-Perfil-SQL', '1')
+        try:
+            with urllib.request.urlopen(peticion, timeout=timeout) as respuesta:
+                return respuesta.status, dict(respuesta.headers), respuesta.read()
+        except urllib.error.HTTPError as e:
+            return e.code, dict(e.headers), e.read()
+    return enviar
+
+
+class Command(BaseCommand):
+    help = "Mezcla lecturas, ventas y movimientos contra la API y guarda throughput y p50/p95/p99 en JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--usuario', required=True, help="Usuario administrador (pide su token en /api/token/).")
+        parser.add_argument('--clave', required=True)
+        parser.add_argument('--duracion', type=float, default=30, help="Segundos.")
+        parser.add_argument('--concurrencia', type=int, default=8)
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--perfil', action='store_true',
+                            help="Envia X-Perfil-SQL para contar consultas (el servidor debe permitirlo).")
+        parser.add_argument('--salida', help="Archivo JSON donde acumular los resultados.")
+        parser.add_argument('--nombre', default='carga_http', help="Clave de esta corrida en el JSON.")
+
+    def handle(self, *args, **options):
+        base = options['url'].rstrip('/')
+        estado, _, cuerpo = _enviador(base)(
+            'POST', '/api/token/', {'username': options['usuario'], 'password': options['clave']})
+        if estado != 200:
+            raise CommandError(f"No se pudo obtener el token ({estado}): {cuerpo[:200]!r}")
+        enviar = _enviador(base, json.loads(cuerpo)['access'], options['perfil'])
+
+        ids = ids_desde_api(enviar)
+        if not ids['productos']:
+            raise CommandError("El servidor no tiene productos; ejecute antes manage.py sembrar_datos.")
+        resumen = ejecutar_carga(enviar, ids, duracion=options['duracion'],
+                                 concurrencia=options['concurrencia'], semilla=options['semilla'])
+
+        for operacion in list(MEZCLA) + ['total']:
+            if operacion in resumen:
+                valores = ', '.join(f'{k}={v}' for k, v in resumen[operacion].items())
+                self.stdout.write(f'{operacion}: {valores}')
+        if options['salida']:
+            guardar_resultados(options['salida'], options['nombre'], {'url': base, **resumen})
+            self.stdout.write(f"Resultados en {options['salida']}")
@@ -0,0 +1,12 @@
+"""Escribe el saldo de cierre de cada producto en el kardex (correr a diario, p. ej. con cron)."""
+
+from django.core.management.base import BaseCommand
+
+from apps.task import kardex
+
+
+class Command(BaseCommand):
+    help = "Agrega una fila 'corte' por producto con su stock actual."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{kardex.cortar()} corte(s) escritos en el kardex.")
@@ -0,0 +1,39 @@
+"""Importa productos y entradas de stock desde un archivo CSV o JSON Lines (ver apps/task/importacion.py)."""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.task.importacion import FORMATOS, TAMANO_LOTE, importar_inventario
+from apps.task.models import Proveedor
+
+
+class Command(BaseCommand):
+    help = "Importa el catalogo de un proveedor: crea/actualiza productos y suma las entradas de stock."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo .csv o .jsonl")
+        parser.add_argument('--formato', choices=FORMATOS, help="Por defecto se deduce de la extension.")
+        parser.add_argument('--proveedor', help="Nombre del proveedor para las filas que no lo indiquen.")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Filas por transaccion.")
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or ('csv' if options['archivo'].lower().endswith('.csv') else 'jsonl')
+        proveedor = None
+        if options['proveedor']:
+            proveedor = Proveedor.objects.filter(nombre=options['proveedor']).values_list('pk', flat=True).first()
+            if proveedor is None:
+                raise CommandError(f"No existe el proveedor {options['proveedor']!r}.")
+
+        inicio = time.perf_counter()
+        with open(options['archivo'], 'rb') as archivo:
+            resumen = importar_inventario(archivo, formato, proveedor, options['lote'])
+        segundos = time.perf_counter() - inicio
+
+        for error in resumen['errores']:
+            self.stderr.write(f"Fila {error['fila']}: {' '.join(error['errores'])}")
+        self.stdout.write(
+            f"{resumen['filas']} filas en {segundos:.1f} s: {resumen['creados']} productos creados, "
+            f"{resumen['actualizados']} actualizados, {resumen['entradas']} entradas de stock, "
+            f"{resumen['errores_total']} filas con errores."
+        )
@@ -0,0 +1,31 @@
+"""Atiende la cola de reportes guardada en base de datos (REPORTES_COLA='db')."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.task import cola_reportes
+from apps.task.models import ReporteJob
+
+
+class Command(BaseCommand):
+    help = "Genera los reportes PDF pendientes de la tabla ReporteJob."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help="Procesa los pendientes actuales y termina.")
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help="Segundos de espera entre revisiones de la cola.")
+
+    def handle(self, *args, **options):
+        almacen = cola_reportes.AlmacenBaseDatos()
+        while True:
+            cola_reportes.purgar_expirados(almacen)
+            cola_reportes.recuperar_atascados(almacen)  # Trabajos de procesos caidos vuelven a 'pendiente'
+            pendientes = ReporteJob.objects.filter(estado='pendiente').order_by('created').values_list('pk', flat=True)
+            procesados = sum(cola_reportes.procesar(pk, almacen) for pk in list(pendientes))
+            if procesados:
+                self.stdout.write(f"{procesados} reporte(s) generado(s).")
+            if options['una_vez']:
+                return
+            time.sleep(options['intervalo'])
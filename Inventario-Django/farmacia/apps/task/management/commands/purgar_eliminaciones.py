@@ -0,0 +1,12 @@
+"""Borra las marcas de borrado de la sincronizacion mas viejas que la retencion (correr a diario, p. ej. con cron)."""
+
+from django.core.management.base import BaseCommand
+
+from apps.task import sincronizacion
+
+
+class Command(BaseCommand):
+    help = "Elimina las filas de Eliminacion anteriores a SINCRONIZACION_RETENCION_DIAS."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{sincronizacion.purgar()} marca(s) de borrado eliminadas.")
@@ -0,0 +1,21 @@
+"""Repara FacturaVenta.total con la suma real de sus detalles."""
+
+from django.core.management.base import BaseCommand
+
+from apps.task.ventas import recalcular_totales_facturas
+
+
+class Command(BaseCommand):
+    help = "Recalcula los totales de las facturas por lotes (una consulta de agregacion por lote)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help="Facturas por lote.")
+        parser.add_argument('--simular', action='store_true',
+                            help="Solo informa las facturas descuadradas, sin corregirlas.")
+
+    def handle(self, *args, **options):
+        descuadradas = recalcular_totales_facturas(options['lote'], corregir=not options['simular'])
+        for pk, total, suma in descuadradas:
+            self.stdout.write(f"Factura {pk}: total {total} -> {suma}")
+        accion = "encontradas" if options['simular'] else "corregidas"
+        self.stdout.write(f"{len(descuadradas)} factura(s) {accion}.")
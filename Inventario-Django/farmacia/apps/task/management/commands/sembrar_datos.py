@@ -0,0 +1,36 @@
+"""Llena la base con un inventario sintetico para benchmarks y pruebas de carga (ver apps/task/carga.py)."""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.task.carga import sembrar_datos
+from apps.task.models import Producto
+
+
+class Command(BaseCommand):
+    help = "Crea productos, clientes, facturas y movimientos de prueba con una semilla fija."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', required=True, help="Usuario dueño de clientes/proveedores/empleado.")
+        parser.add_argument('--productos', type=int, default=2000)
+        parser.add_argument('--clientes', type=int, default=50)
+        parser.add_argument('--facturas', type=int, default=500)
+        parser.add_argument('--movimientos', type=int, default=5000)
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--forzar', action='store_true', help="Sembrar aunque ya haya productos.")
+
+    def handle(self, *args, **options):
+        usuario = get_user_model().objects.filter(username=options['usuario']).first()
+        if usuario is None:
+            raise CommandError(f"No existe el usuario {options['usuario']!r}.")
+        if Producto.objects.exists() and not options['forzar']:
+            raise CommandError("La base ya tiene productos; use --forzar para sembrar de todos modos.")
+
+        with transaction.atomic():
+            ids = sembrar_datos(usuario, options['productos'], options['clientes'], options['facturas'],
+                                options['movimientos'], options['semilla'])
+        self.stdout.write(
+            f"{len(ids['productos'])} productos, {len(ids['clientes'])} clientes, "
+            f"{options['facturas']} facturas y {options['movimientos']} movimientos creados."
+        )
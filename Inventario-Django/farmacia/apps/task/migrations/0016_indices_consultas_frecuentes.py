@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0015_reportejob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__lt', 10)), fields=['stock'], name='producto_stock_bajo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facturaventa',
+            index=models.Index(fields=['id_cliente', 'fecha'], name='factura_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facturaventa',
+            index=models.Index(fields=['fecha'], name='factura_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facturaventa',
+            index=models.Index(fields=['-created', '-id'], name='factura_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detalleventa',
+            index=models.Index(fields=['-created', '-id'], name='detalle_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['id_producto', 'fecha', 'tipo'], name='movimiento_prod_fecha_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['fecha', 'tipo'], name='movimiento_fecha_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['-created', '-id'], name='movimiento_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def saldos_iniciales(apps, schema_editor):
+    """El kardex arranca con el stock actual de cada producto."""
+    Producto = apps.get_model('task', 'Producto')
+    Kardex = apps.get_model('task', 'Kardex')
+    ahora = django.utils.timezone.now()
+    Kardex.objects.bulk_create(
+        (Kardex(producto_id=pk, fecha=ahora, cantidad=stock, saldo=stock, origen='inicial')
+         for pk, stock in Producto.objects.values_list('pk', 'stock').iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0016_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Kardex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cantidad', models.IntegerField()),
+                ('saldo', models.IntegerField()),
+                ('origen', models.CharField(choices=[('inicial', 'Inicial'), ('movimiento', 'Movimiento'), ('venta', 'Venta'), ('reversion', 'Reversion'), ('ajuste', 'Ajuste'), ('corte', 'Corte')], max_length=12)),
+                ('referencia', models.PositiveIntegerField(blank=True, null=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kardex', to='task.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', '-fecha', '-id'], name='kardex_producto_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(saldos_iniciales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0017_kardex'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['modified'], name='producto_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facturaventa',
+            index=models.Index(fields=['modified'], name='factura_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detalleventa',
+            index=models.Index(fields=['modified'], name='detalle_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['modified'], name='movimiento_modified_idx'),
+        ),
+    ]
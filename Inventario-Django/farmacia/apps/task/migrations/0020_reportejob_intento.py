@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0019_eliminacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportejob',
+            name='intento',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -1,9 +1,11 @@
-from django.db import models
+import uuid
+from django.db import models, transaction
 from model_utils.models import TimeStampedModel
 from ..usuario.models import Usuario
 from django.db.models.signals import pre_save, post_save
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 class Categoria(TimeStampedModel):
     nombre = models.CharField(max_length=200, unique=True)
@@ -34,6 +36,17 @@ class Producto(TimeStampedModel):
     def low_stock(self):
         return self.stock < 10 
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():  # El cambio de stock y su fila de kardex se guardan juntos
+            super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            # Indice parcial (SQLite/PostgreSQL): solo los productos con stock bajo, igual que low_stock
+            models.Index(fields=['stock'], name='producto_stock_bajo_idx', condition=models.Q(stock__lt=10)),
+            models.Index(fields=['modified'], name='producto_modified_idx'),  # ETag: max(modified)
+        ]
+
     def __str__(self):
         return f"{self.nombre} ({self.id_categoria})"
 
@@ -61,6 +74,14 @@ class FacturaVenta(TimeStampedModel):
     id_cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name="facturas")
     id_empleado = models.ForeignKey(Empleado, on_delete=models.CASCADE, related_name="facturas")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['id_cliente', 'fecha'], name='factura_cliente_fecha_idx'),  # mis_facturas
+            models.Index(fields=['fecha'], name='factura_fecha_idx'),  # Dashboard por rango de fechas
+            models.Index(fields=['-created', '-id'], name='factura_created_id_idx'),  # PaginacionCursor
+            models.Index(fields=['modified'], name='factura_modified_idx'),  # ETag: max(modified)
+        ]
+
     def __str__(self):
         return f"Factura {self.id}"
 
@@ -70,14 +91,21 @@ class DetalleVenta(TimeStampedModel):
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     id_factura = models.ForeignKey(FacturaVenta, on_delete=models.CASCADE, related_name="detalles")
     id_producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="detalles")
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created', '-id'], name='detalle_created_id_idx'),  # PaginacionCursor
+            models.Index(fields=['modified'], name='detalle_modified_idx'),  # ETag: max(modified)
+        ]
+
     def save(self, *args, **kwargs):
         if self.id_producto:
             self.precio_unitario = self.id_producto.precio  # Automatización: Toma precio actual del producto
         if self.precio_unitario is None:
             raise ValidationError("precio_unitario no puede ser nulo; asegúrese de que id_producto esté definido.")
         self.subtotal = self.cantidad * self.precio_unitario  # Cálculo automático
-        super().save(*args, **kwargs)  # Ahora inserta con valores válidos
+        with transaction.atomic():  # Si la señal de stock falla, se revierte la inserción
+            super().save(*args, **kwargs)  # Ahora inserta con valores válidos
 
     def __str__(self):
         return f"Detalle {self.id} (Factura {self.id_factura})"
@@ -92,5 +120,82 @@ class Movimiento(TimeStampedModel):
     id_proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE, related_name="movimiento", null=True, blank=True)  # Adaptado: Para entradas
     responsable = models.ForeignKey(Empleado, on_delete=models.SET_NULL, null=True, related_name="movimientos")  # Adaptado: Responsable
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['id_producto', 'fecha', 'tipo'], name='movimiento_prod_fecha_tipo_idx'),  # Historial por producto
+            models.Index(fields=['fecha', 'tipo'], name='movimiento_fecha_tipo_idx'),  # Dashboard por rango de fechas
+            models.Index(fields=['-created', '-id'], name='movimiento_created_id_idx'),  # PaginacionCursor
+            models.Index(fields=['modified'], name='movimiento_modified_idx'),  # ETag: max(modified)
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():  # El movimiento y su ajuste de stock se guardan juntos
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Movimiento {self.id} ({self.tipo})"
+
+
+class Kardex(models.Model):
+    """
+    Libro de stock de solo insercion: una fila por cada cambio de Producto.stock,
+    escrita en la misma transaccion, con el saldo resultante (ver kardex.py).
+    """
+    ORIGENES = [
+        ('inicial', 'Inicial'),
+        ('movimiento', 'Movimiento'),
+        ('venta', 'Venta'),
+        ('reversion', 'Reversion'),
+        ('ajuste', 'Ajuste'),
+        ('corte', 'Corte'),  # Saldo de cierre periodico (manage.py cortar_kardex)
+    ]
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="kardex")
+    fecha = models.DateTimeField(default=timezone.now)
+    cantidad = models.IntegerField()  # Positiva: entra stock; negativa: sale
+    saldo = models.IntegerField()  # Stock del producto despues de este cambio
+    origen = models.CharField(max_length=12, choices=ORIGENES)
+    referencia = models.PositiveIntegerField(null=True, blank=True)  # id del Movimiento o de la FacturaVenta
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', '-fecha', '-id'], name='kardex_producto_fecha_idx'),  # Stock en una fecha
+        ]
+
+    def __str__(self):
+        return f"Kardex {self.producto_id} {self.fecha:%Y-%m-%d} {self.cantidad:+d} = {self.saldo}"
+
+
+class Eliminacion(models.Model):
+    """
+    Marca de borrado (tombstone) para la sincronizacion incremental: una fila
+    por objeto eliminado, escrita por post_delete (ver sincronizacion.py).
+    """
+    recurso = models.CharField(max_length=20)  # Nombre del recurso en la API: 'productos', 'clientes'...
+    objeto_id = models.PositiveIntegerField()
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recurso', 'fecha'], name='eliminacion_recurso_fecha_idx'),  # Borrados desde un cursor
+        ]
+
+    def __str__(self):
+        return f"Eliminacion {self.recurso} {self.objeto_id}"
+
+
+class ReporteJob(TimeStampedModel):
+    """Trabajo de generacion de un reporte PDF en segundo plano (ver cola_reportes.py)."""
+    ESTADOS = [('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('listo', 'Listo'), ('error', 'Error')]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="reportes")
+    estado = models.CharField(max_length=12, choices=ESTADOS, default='pendiente')
+    nombre_archivo = models.CharField(max_length=150)
+    contenido = models.BinaryField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    intento = models.PositiveSmallIntegerField(default=0)  # Cuantas veces se tomo; identifica la ejecucion actual
+
+    def __str__(self):
+        return f"Reporte {self.tipo} ({self.estado})"
+
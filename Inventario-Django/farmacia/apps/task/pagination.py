@@ -0,0 +1,76 @@
+"""Paginacion de los listados de la API.
+
+La paginacion es opcional: solo se aplica si la peticion trae ?page_size=,
+?page= o ?cursor=. Sin ellos el listado completo sale como antes, asi que
+las pantallas del frontend que leen la lista entera no se cortan.
+
+El cuerpo de la respuesta sigue siendo una lista JSON; los enlaces a la
+pagina siguiente/anterior viajan en la cabecera `Link` (rel="next" /
+rel="prev") y el total, cuando se conoce, en `X-Total-Count`.
+"""
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+class EnlacesEnCabeceraMixin:
+    """Devuelve la pagina como lista y pone la navegacion en la cabecera Link."""
+
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return settings.PAGINACION_MAX_PAGE_SIZE
+
+    def solicitada(self, request):
+        """True si el cliente pidio paginar (?page_size=, ?page= o ?cursor=)."""
+        parametros = (self.page_size_query_param, getattr(self, 'page_query_param', None),
+                      getattr(self, 'cursor_query_param', None))
+        return any(parametro in request.query_params for parametro in parametros if parametro)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.solicitada(request):
+            return None  # Lista completa, sin cabeceras de paginacion
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = Response(data)
+        siguiente, anterior = self.get_next_link(), self.get_previous_link()
+        enlaces = []
+        if siguiente:
+            enlaces.append(f'<{siguiente}>; rel="next"')
+        if anterior:
+            enlaces.append(f'<{anterior}>; rel="prev"')
+        if enlaces:
+            response['Link'] = ', '.join(enlaces)
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        return schema
+
+
+class PaginacionPorPagina(EnlacesEnCabeceraMixin, PageNumberPagination):
+    """Paginacion ?page=N para catalogos pequeños (productos, clientes, usuarios...)."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not queryset.ordered:  # Paginas estables entre peticiones
+            queryset = queryset.order_by('pk')
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response['X-Total-Count'] = self.page.paginator.count
+        return response
+
+
+class PaginacionCursor(EnlacesEnCabeceraMixin, CursorPagination):
+    """
+    Paginacion por cursor (keyset) para tablas que solo crecen: movimientos,
+    facturas y detalles de venta. No usa OFFSET ni COUNT, asi que el costo por
+    pagina no depende del tamaño del historial.
+
+    El orden es (created, id) descendente: la primera pagina trae lo mas
+    reciente, que es lo que muestra un cliente que pide solo esa pagina.
+    """
+    ordering = ('-created', '-id')
@@ -1,11 +1,222 @@
 # pdf.py
 
+import zlib
+from array import array
 from reportlab.pdfgen import canvas
 from io import BytesIO
+from itertools import islice
+from tempfile import SpooledTemporaryFile
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.platypus import Table, TableStyle
+from django.http import StreamingHttpResponse
+
+# ==================== MOTOR DE REPORTES PAGINADOS ====================
+
+CHUNK_FILAS = 2000           # Filas que se leen de la base de datos por consulta
+ALTO_FILA = 16               # Alto fijo de fila: permite calcular cuantas caben por pagina
+BLOQUE_RESPUESTA = 64 * 1024  # Bytes por bloque al transmitir el PDF
+MAX_PDF_EN_MEMORIA = 1024 * 1024  # Por encima de esto el PDF se escribe a disco
+
+# Mismo estilo que las tablas de los PDFs individuales
+COLOR_ENCABEZADO = colors.grey
+COLOR_TEXTO_ENCABEZADO = colors.whitesmoke
+COLOR_FILAS = colors.beige
+TAMANO_LETRA = 8
+MARGEN_CELDA = 6
+
+
+def iterar_en_bloques(filas):
+    """Recorre un queryset por bloques (iterator) para no cargarlo completo en memoria."""
+    if hasattr(filas, 'iterator'):
+        return filas.iterator(chunk_size=CHUNK_FILAS)
+    return iter(filas)
+
+
+def _cadena(texto):
+    """Cadena literal de PDF en WinAnsi, la codificacion de Helvetica."""
+    crudo = str(texto).encode('cp1252', 'replace')
+    return b'(' + crudo.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _rgb(color):
+    return '%.3f %.3f %.3f' % color.rgb()
+
+
+class EscritorPDF:
+    """
+    PDF escrito objeto por objeto: cada pagina sale a `salida` apenas se
+    termina. Solo se recuerda el desplazamiento de cada objeto (8 bytes, para
+    la tabla xref del final), asi que la memoria no depende del tamaño del PDF.
+
+    Objetos fijos: 1 catalogo, 2 arbol de paginas, 3 info, 4-5 fuentes; luego
+    cada pagina ocupa dos: su flujo de contenido y la pagina.
+    """
+
+    FUENTES = (('F1', 'Helvetica'), ('F2', 'Helvetica-Bold'))
+    PRIMERA_PAGINA = 4 + len(FUENTES)
+
+    def __init__(self, salida, pagesize, titulo):
+        self.salida = salida
+        self.pagesize = pagesize
+        self.posicion = 0
+        self.desplazamientos = array('Q', bytes(8 * self.PRIMERA_PAGINA))  # Indice: numero de objeto
+        self.paginas = 0
+        self._escribir(b'%PDF-1.4\n%\x93\x8c\x8b\x9e\n')
+        self._objeto(3, b'<< /Title ' + _cadena(titulo) + b' >>')
+        for numero, (_, fuente) in enumerate(self.FUENTES, start=4):
+            self._objeto(numero, f'<< /Type /Font /Subtype /Type1 /BaseFont /{fuente} '
+                                 f'/Encoding /WinAnsiEncoding >>'.encode())
+        fuentes = ' '.join(f'/{recurso} {numero} 0 R' for numero, (recurso, _) in enumerate(self.FUENTES, start=4))
+        ancho, alto = pagesize
+        self.recursos = (f'/Parent 2 0 R /MediaBox [0 0 {ancho:g} {alto:g}] '
+                         f'/Resources << /Font << {fuentes} >> >>').encode()
+
+    def _escribir(self, datos):
+        self.salida.write(datos)
+        self.posicion += len(datos)
+
+    def _objeto(self, numero, cuerpo):
+        if numero < len(self.desplazamientos):
+            self.desplazamientos[numero] = self.posicion
+        else:  # Las paginas se numeran en el orden en que se escriben
+            self.desplazamientos.append(self.posicion)
+        self._escribir(b'%d 0 obj\n' % numero + cuerpo + b'\nendobj\n')
+
+    def _numero_pagina(self, indice):
+        return self.PRIMERA_PAGINA + 2 * indice + 1
+
+    def pagina(self, operadores):
+        """Escribe una pagina con el flujo de operadores de dibujo `operadores` (bytes)."""
+        datos = zlib.compress(operadores)
+        flujo = self.PRIMERA_PAGINA + 2 * self.paginas
+        self._objeto(flujo, b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(datos)
+                     + datos + b'\nendstream')
+        self._objeto(flujo + 1, b'<< /Type /Page ' + self.recursos + b' /Contents %d 0 R >>' % flujo)
+        self.paginas += 1
+
+    def cerrar(self):
+        """Escribe el arbol de paginas, el catalogo y la tabla xref (por partes, sin armarlos en memoria)."""
+        self.desplazamientos[2] = self.posicion
+        self._escribir(b'2 0 obj\n<< /Type /Pages /Count %d /Kids [' % self.paginas)
+        for inicio in range(0, self.paginas, 1000):
+            fin = min(inicio + 1000, self.paginas)
+            self._escribir(b''.join(b'%d 0 R ' % self._numero_pagina(i) for i in range(inicio, fin)))
+        self._escribir(b'] >>\nendobj\n')
+        self._objeto(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+        inicio_xref, total = self.posicion, len(self.desplazamientos)
+        self._escribir(b'xref\n0 %d\n0000000000 65535 f \n' % total)
+        for inicio in range(1, total, 1000):
+            self._escribir(b''.join(b'%010d 00000 n \n' % self.desplazamientos[numero]
+                                    for numero in range(inicio, min(inicio + 1000, total))))
+        self._escribir(b'trailer\n<< /Size %d /Root 1 0 R /Info 3 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                       % (total, inicio_xref))
+
+
+class ReportePaginado:
+    """
+    Dibuja una tabla de cualquier tamaño repartida en paginas, repitiendo el
+    encabezado en cada una. Las filas se consumen de un iterador pagina a
+    pagina y cada pagina se escribe en `salida` apenas se completa
+    (EscritorPDF): ni el queryset ni el PDF se guardan enteros en memoria
+    (ver PDFBenchmark.test_memoria_segun_filas).
+
+    El canvas de reportlab no sirve aqui: guarda todas las paginas hasta
+    save(). La tabla se dibuja con operadores PDF y el mismo estilo que las
+    tablas de reportlab de los PDFs individuales.
+    """
+
+    def __init__(self, titulo, encabezados, anchos, x=30, pagesize=letter):
+        self.titulo = titulo
+        self.encabezados = encabezados
+        self.anchos = anchos
+        self.x = x
+        self.pagesize = pagesize
+        width, height = pagesize
+        self.tope = height - 50
+        self.filas_por_pagina = int((self.tope - 40) // ALTO_FILA) - 1  # -1: encabezado
+
+    def _texto(self, x, y, fuente, tamano, texto):
+        return b'BT /%s %d Tf %.2f %.2f Td %s Tj ET\n' % (fuente.encode(), tamano, x, y, _cadena(texto))
+
+    def _dibujar_pagina(self, numero, bloque):
+        """Operadores PDF de una pagina: titulo, numero de pagina y la tabla."""
+        width, height = self.pagesize
+        etiqueta = f"Página {numero}"
+        ops = [
+            b'0 g\n',
+            self._texto(50, height - 30, 'F1', 12, self.titulo),
+            self._texto(width - 30 - stringWidth(etiqueta, 'Helvetica', 8), 20, 'F1', 8, etiqueta),
+        ]
+
+        filas = [self.encabezados] + bloque
+        ancho = sum(self.anchos)
+        arriba, abajo = self.tope, self.tope - ALTO_FILA * len(filas)
+        ops.append(('%s rg %.2f %.2f %.2f %d re f\n' % (
+            _rgb(COLOR_ENCABEZADO), self.x, arriba - ALTO_FILA, ancho, ALTO_FILA)).encode())
+        if bloque:
+            ops.append(('%s rg %.2f %.2f %.2f %d re f\n' % (
+                _rgb(COLOR_FILAS), self.x, abajo, ancho, arriba - ALTO_FILA - abajo)).encode())
+
+        for indice, fila in enumerate(filas):
+            base = arriba - ALTO_FILA * (indice + 1) + (ALTO_FILA - TAMANO_LETRA) / 2 + 1.5
+            if indice == 0:
+                ops.append(('%s rg\n' % _rgb(COLOR_TEXTO_ENCABEZADO)).encode())
+                fuente = 'F2'
+            elif indice == 1:
+                ops.append(b'0 g\n')
+                fuente = 'F1'
+            x = self.x
+            for valor, ancho_columna in zip(fila, self.anchos):
+                ops.append(self._texto(x + MARGEN_CELDA, base, fuente, TAMANO_LETRA, valor))
+                x += ancho_columna
+
+        ops.append(b'0 G 1 w\n')  # Grilla negra
+        for indice in range(len(filas) + 1):
+            y = arriba - ALTO_FILA * indice
+            ops.append(b'%.2f %.2f m %.2f %.2f l S\n' % (self.x, y, self.x + ancho, y))
+        x = self.x
+        for ancho_columna in (0, *self.anchos):
+            x += ancho_columna
+            ops.append(b'%.2f %.2f m %.2f %.2f l S\n' % (x, arriba, x, abajo))
+        return b''.join(ops)
+
+    def escribir(self, salida, filas):
+        """Escribe el PDF en `salida` (archivo o buffer) a partir del iterable `filas`."""
+        pdf = EscritorPDF(salida, self.pagesize, self.titulo)
+        filas = iter(filas)
+        numero = 1
+        bloque = list(islice(filas, self.filas_por_pagina))
+        while True:
+            pdf.pagina(self._dibujar_pagina(numero, bloque))
+            bloque = list(islice(filas, self.filas_por_pagina))
+            if not bloque:
+                break
+            numero += 1
+        pdf.cerrar()
+        return salida
+
+
+def construir_pdf(escribir, datos):
+    """Genera el PDF en memoria y lo devuelve como BytesIO posicionado al inicio."""
+    buf = BytesIO()
+    escribir(datos, buf)
+    buf.seek(0)
+    return buf
+
+
+def transmitir_pdf(archivo):
+    """
+    Devuelve un StreamingHttpResponse que envia `archivo` (ya generado y
+    posicionado) por bloques y lo cierra al final.
+    """
+    def bloques():
+        with archivo:
+            yield from iter(lambda: archivo.read(BLOQUE_RESPUESTA), b'')
 
+    return StreamingHttpResponse(bloques(), content_type='application/pdf')
 
 
 def build_movimiento_id_pdf(movimiento):
@@ -95,25 +306,14 @@ def build_movimiento_id_pdf(movimiento):
     buf.seek(0)
     return buf
 
-def build_todos_movimientos_pdf(movimientos):
-    """Genera un PDF con todos los movimientos de inventario en formato tabular."""
-    buf = BytesIO()
-    page = canvas.Canvas(buf, pagesize=letter)
-    width, height = letter
-
-    page.setTitle('Todos los Movimientos de Inventario')
-    page.drawString(50, height - 30, "Todos los Movimientos de Inventario")
-
-    # Encabezado con ambos campos
-    data = [["ID", "Tipo", "Fecha", "Producto", "Cantidad", "Proveedor", "Cliente", "Responsable"]]
-
-    for movimiento in movimientos:
+def _filas_movimientos(movimientos):
+    for movimiento in iterar_en_bloques(movimientos):
         # Manejar campos que pueden ser None
         cliente_nombre = movimiento.id_cliente.nombre if movimiento.id_cliente else "N/A"
         proveedor_nombre = movimiento.id_proveedor.nombre if movimiento.id_proveedor else "N/A"
         responsable_nombre = movimiento.responsable.nombre if movimiento.responsable else "Sistema"
 
-        data.append([ 
+        yield [
             str(movimiento.id),
             movimiento.tipo,
             str(movimiento.fecha),
@@ -122,29 +322,23 @@ def build_todos_movimientos_pdf(movimientos):
             proveedor_nombre,
             cliente_nombre,
             responsable_nombre,
-        ])
+        ]
 
-    # Ajustar anchos de columnas
-    table = Table(data, colWidths=[30, 50, 70, 90, 50, 80, 80, 80])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 8),  # Reducir tamaño de fuente
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
 
-    table.wrapOn(page, width, height)
-    table.drawOn(page, 20, height - 100)  # Ajustar posición
+def escribir_todos_movimientos_pdf(movimientos, salida):
+    """Escribe en `salida` el PDF paginado de todos los movimientos de inventario."""
+    reporte = ReportePaginado(
+        'Todos los Movimientos de Inventario',
+        ["ID", "Tipo", "Fecha", "Producto", "Cantidad", "Proveedor", "Cliente", "Responsable"],
+        [30, 50, 70, 90, 50, 80, 80, 80],
+        x=20,
+    )
+    return reporte.escribir(salida, _filas_movimientos(movimientos))
 
-    page.showPage()
-    page.save()
 
-    buf.seek(0)
-    return buf
+def build_todos_movimientos_pdf(movimientos):
+    """Genera un PDF con todos los movimientos de inventario en formato tabular."""
+    return construir_pdf(escribir_todos_movimientos_pdf, movimientos)
 
 def build_producto_id_pdf(producto):
     """Crea PDF para un producto individual, enfocándose en detalles como precio y stock con un formato de tabla."""
@@ -183,46 +377,31 @@ def build_producto_id_pdf(producto):
     buf.seek(0)
     return buf
 
-def build_todos_productos_pdf(productos):
-    """Produce PDF con tabla de todos los productos, """
-    buf = BytesIO()
-    page = canvas.Canvas(buf, pagesize=letter)
-    width, height = letter
-
-    page.setTitle('Todos los Productos')
-    page.drawString(50, height - 30, "Todos los Productos")
-
-    data = [["ID", "Nombre", "Precio", "Stock", "Categoría", "Proveedor"]]
-
-    for producto in productos:
-        data.append([
+def _filas_productos(productos):
+    for producto in iterar_en_bloques(productos):
+        yield [
             str(producto.id),
             producto.nombre,
             str(producto.precio),
             str(producto.stock),
             producto.id_categoria.nombre,
             producto.id_proveedor.nombre,
-        ])
+        ]
 
-    table = Table(data, colWidths=[40, 100, 60, 60, 100, 100])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
 
-    table.wrapOn(page, width, height)
-    table.drawOn(page, 30, height - 100)
+def escribir_todos_productos_pdf(productos, salida):
+    """Escribe en `salida` el PDF paginado de todos los productos."""
+    reporte = ReportePaginado(
+        'Todos los Productos',
+        ["ID", "Nombre", "Precio", "Stock", "Categoría", "Proveedor"],
+        [40, 100, 60, 60, 100, 100],
+    )
+    return reporte.escribir(salida, _filas_productos(productos))
 
-    page.showPage()
-    page.save()
 
-    buf.seek(0)
-    return buf
+def build_todos_productos_pdf(productos):
+    """Produce PDF con tabla de todos los productos, """
+    return construir_pdf(escribir_todos_productos_pdf, productos)
 
 
 def build_detalle_venta_id_pdf(detalle_venta):
@@ -262,52 +441,34 @@ def build_detalle_venta_id_pdf(detalle_venta):
     buf.seek(0)
     return buf
 
-def build_todos_detalles_venta_pdf(detalles_venta):
-    """Genera un PDF con el detalle de las ventas, mostrando subtotales por fila para facilitar revisiones rápidas."""
-
-    buf = BytesIO()
-    page = canvas.Canvas(buf, pagesize=letter)
-    width, height = letter
-
-    page.setTitle('Todos los Detalles de Venta')
-    page.drawString(50, height - 30, "Todos los Detalles de Venta")
-
-    data = [["Fecha","ID", "Factura", "Producto", "Cantidad", "Precio Unitario", "Subtotal"]]
-    
+def _filas_detalles_venta(detalles_venta):
     total_general = 0
-    for detalle in detalles_venta:
-        data.append([
+    for detalle in iterar_en_bloques(detalles_venta):
+        subtotal = detalle.cantidad * detalle.precio_unitario
+        yield [
             str(detalle.id_factura.fecha),
             str(detalle.id),
             str(detalle.id_factura.id),
             detalle.id_producto.nombre,
             str(detalle.cantidad),
             str(detalle.precio_unitario),
-            str(detalle.cantidad * detalle.precio_unitario),
-        ])
-        total_general += detalle.cantidad * detalle.precio_unitario
-    
-    data.append(["", "", "", "","", "Total General:", str(total_general)])
-    
-       
-    
-
-    table = Table(data, colWidths=[95,40, 60, 100, 60, 80, 80, 100])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
+            str(subtotal),
+        ]
+        total_general += subtotal
 
-    table.wrapOn(page, width, height)
-    table.drawOn(page, 30, height - 100)
+    yield ["", "", "", "", "", "Total General:", str(total_general)]
 
-    page.showPage()
-    page.save()
 
-    buf.seek(0)
-    return buf
\ No newline at end of file
+def escribir_todos_detalles_venta_pdf(detalles_venta, salida):
+    """Escribe en `salida` el PDF paginado de los detalles de venta, con el total general al final."""
+    reporte = ReportePaginado(
+        'Todos los Detalles de Venta',
+        ["Fecha", "ID", "Factura", "Producto", "Cantidad", "Precio Unitario", "Subtotal"],
+        [95, 40, 60, 100, 60, 80, 80],
+    )
+    return reporte.escribir(salida, _filas_detalles_venta(detalles_venta))
+
+
+def build_todos_detalles_venta_pdf(detalles_venta):
+    """Genera un PDF con el detalle de las ventas, mostrando subtotales por fila para facilitar revisiones rápidas."""
+    return construir_pdf(escribir_todos_detalles_venta_pdf, detalles_venta)
@@ -1,31 +1,35 @@
-
 from rest_framework.permissions import BasePermission
+from ..usuario.roles import rol_de
 """Permisos personalizados para restringir acceso basado en roles de usuario."""
 
-class IsAdmin(BasePermission):
-    """Permite acceso solo a usuarios con rol 'administrador'."""
-    message = 'Acceso denegado: Requiere rol de administrador.'
+class RolRequerido(BasePermission):
+    """Base: permite acceso a usuarios autenticados cuyo rol es `rol`.
+
+    El rol se resuelve con usuario.roles.rol_de (claim del JWT, o el Rol que
+    queda cargado en request.user), asi que combinar permisos
+    (IsClient | IsEmployee | IsAdmin) consulta Rol a lo sumo una vez.
+    """
+    rol = None
 
     def has_permission(self, request, view):
-        return bool(request.user and request.user.is_authenticated and request.user.rol and request.user.rol.name == 'administrador')
+        return bool(request.user and request.user.is_authenticated and rol_de(request) == self.rol)
+
+class IsAdmin(RolRequerido):
+    """Permite acceso solo a usuarios con rol 'administrador'."""
+    message = 'Acceso denegado: Requiere rol de administrador.'
+    rol = 'administrador'
 
-class IsEmployee(BasePermission):
+class IsEmployee(RolRequerido):
     """Permite acceso solo a usuarios con rol 'empleado'."""
     message = 'Acceso denegado: Requiere rol de empleado.'
+    rol = 'empleado'
 
-    def has_permission(self, request, view):
-        return bool(request.user and request.user.is_authenticated and request.user.rol and request.user.rol.name == 'empleado')
-
-class IsClient(BasePermission):
+class IsClient(RolRequerido):
     """Permite acceso solo a usuarios con rol 'cliente'."""
     message = 'Acceso denegado: Requiere rol de cliente.'
+    rol = 'cliente'
 
-    def has_permission(self, request, view):
-        return bool(request.user and request.user.is_authenticated and request.user.rol and request.user.rol.name == 'cliente')
-
-class IsProvider(BasePermission):
+class IsProvider(RolRequerido):
     """Permite acceso solo a usuarios con rol 'proveedor'."""
     message = 'Acceso denegado: Requiere rol de proveedor.'
-
-    def has_permission(self, request, view):
-        return bool(request.user and request.user.is_authenticated and request.user.rol and request.user.rol.name == 'proveedor')
\ No newline at end of file
+    rol = 'proveedor'
@@ -0,0 +1,80 @@
+"""Cache de reportes PDF con GET condicional.
+
+Cada reporte se identifica por una huella de los datos que imprime: la ultima
+fecha `modified` y el numero de filas del queryset (y de las tablas
+relacionadas cuyos nombres aparecen en el PDF). Mientras la huella no cambie:
+
+- si el cliente ya tiene el PDF (If-None-Match) se responde 304 sin
+  generar nada;
+- si no, se sirven los bytes guardados en la cache `REPORTES_CACHE_ALIAS`.
+
+Los PDFs mas grandes que REPORTES_CACHE_MAX_BYTES no se guardan y se
+transmiten directamente desde el archivo temporal.
+
+No se envia Last-Modified ni se atiende If-Modified-Since: esa fecha va en
+segundos y no cambia al borrar filas, asi que un 304 por fecha podria
+devolver un PDF viejo. Solo el ETag (que incluye el conteo) valida.
+"""
+
+import hashlib
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .pdf import MAX_PDF_EN_MEMORIA, transmitir_pdf
+
+
+def huella(queryset, relaciones=()):
+    """Devuelve (ultima modificacion, filas) del queryset y de sus relaciones impresas."""
+    agregados = {'filas': Count('pk'), 'ultimo': Max('modified')}
+    for i, relacion in enumerate(relaciones):
+        agregados[f'relacion_{i}'] = Max(f'{relacion}__modified')
+    datos = queryset.order_by().aggregate(**agregados)
+    filas = datos.pop('filas')
+    fechas = [fecha for fecha in datos.values() if fecha]
+    return (max(fechas) if fechas else None), filas
+
+
+def _cache():
+    return caches[settings.REPORTES_CACHE_ALIAS]
+
+
+def respuesta_pdf_cacheada(request, queryset, escribir, nombre_archivo, relaciones=()):
+    """
+    Responde un PDF generado por `escribir(queryset, salida)` usando ETag
+    y la cache de reportes.
+    """
+    ultimo, filas = huella(queryset, relaciones)
+    clave = f'{nombre_archivo}|{queryset.query}|{ultimo.isoformat() if ultimo else ""}|{filas}'
+    etag = quote_etag(hashlib.sha256(clave.encode()).hexdigest()[:32])
+
+    no_modificado = get_conditional_response(request, etag=etag)
+    if no_modificado is not None:
+        return no_modificado
+
+    cache_key = f'reporte-pdf:{etag}'
+    contenido = _cache().get(cache_key)
+    if contenido is not None:
+        response = HttpResponse(contenido, content_type='application/pdf')
+    else:
+        archivo = SpooledTemporaryFile(max_size=MAX_PDF_EN_MEMORIA)
+        escribir(queryset, archivo)
+        cacheable = archivo.tell() <= settings.REPORTES_CACHE_MAX_BYTES
+        archivo.seek(0)
+        if cacheable:
+            with archivo:
+                contenido = archivo.read()
+            _cache().set(cache_key, contenido, settings.REPORTES_CACHE_TIMEOUT)
+            response = HttpResponse(contenido, content_type='application/pdf')
+        else:
+            response = transmitir_pdf(archivo)
+
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'  # Siempre revalidar: el PDF depende del usuario
+    return response
@@ -1,7 +1,25 @@
 from rest_framework import serializers
+from django.core.exceptions import ValidationError as DjangoValidationError
 from .models import *
+from .ventas import registrar_venta
+from .cola_reportes import TIPOS_REPORTE
+from .importacion import FORMATOS as FORMATOS_IMPORTACION
+from .exportacion import FORMATOS as FORMATOS_EXPORTACION
+from .autocompletado import LIMITE_MAXIMO as LIMITE_AUTOCOMPLETADO
+from .sincronizacion import RECURSOS as RECURSOS_SINCRONIZACION, leer_cursor
+from rest_framework.reverse import reverse
 from ..usuario.models import Usuario, Rol
 
+
+class ValidacionModeloMixin:
+    """Convierte los ValidationError de modelos/señales (p. ej. stock insuficiente) en respuestas 400."""
+
+    def create(self, validated_data):
+        try:
+            return super().create(validated_data)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
+
 # -----------------------------
 # CATEGORÍA
 # -----------------------------
@@ -24,6 +42,18 @@ class ProductoSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class AutocompletadoSerializer(serializers.Serializer):
+    """?q= y ?limite= de /productos/autocomplete/."""
+    q = serializers.CharField(max_length=150)
+    limite = serializers.IntegerField(min_value=1, max_value=LIMITE_AUTOCOMPLETADO, default=10)
+
+
+class ProductoAutocompletadoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Producto
+        fields = ['id', 'nombre', 'precio', 'stock']
+
+
 # -----------------------------
 # PROVEEDOR
 # -----------------------------
@@ -55,7 +85,7 @@ class EmpleadoSerializer(serializers.ModelSerializer):
 # -----------------------------
 # DETALLE VENTA
 # -----------------------------
-class DetalleVentaSerializer(serializers.ModelSerializer):
+class DetalleVentaSerializer(ValidacionModeloMixin, serializers.ModelSerializer):
     producto_nombre = serializers.CharField(
         source='id_producto.nombre', read_only=True)
     factura_fecha = serializers.DateField(
@@ -69,8 +99,15 @@ class DetalleVentaSerializer(serializers.ModelSerializer):
 # -----------------------------
 # FACTURA VENTA
 # -----------------------------
+class DetalleFacturaSerializer(DetalleVentaSerializer):
+    """Linea anidada dentro de una factura: la factura la asigna el motor de ventas."""
+
+    class Meta(DetalleVentaSerializer.Meta):
+        read_only_fields = ['id_factura', 'precio_unitario', 'subtotal']
+
+
 class FacturaVentaSerializer(serializers.ModelSerializer):
-    detalles = DetalleVentaSerializer(many=True)
+    detalles = DetalleFacturaSerializer(many=True)
 
     class Meta:
         model = FacturaVenta
@@ -80,24 +117,16 @@ class FacturaVentaSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         detalles_data = validated_data.pop('detalles')
-        factura = FacturaVenta.objects.create(**validated_data)
-
-        total_factura = 0
-
-        for item in detalles_data:
-            detalle = DetalleVenta.objects.create(id_factura=factura, **item)
-            total_factura += detalle.subtotal
-
-        factura.total = total_factura
-        factura.save()
-
-        return factura
+        try:
+            return registrar_venta(detalles_data, **validated_data)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'detalles': e.messages})
 
 
 # -----------------------------
 # MOVIMIENTO
 # -----------------------------
-class MovimientoSerializer(serializers.ModelSerializer):
+class MovimientoSerializer(ValidacionModeloMixin, serializers.ModelSerializer):
     producto_nombre = serializers.CharField(
         source='id_producto.nombre', read_only=True)
     proveedor_nombre = serializers.CharField(
@@ -124,3 +153,88 @@ class MovimientoSerializer(serializers.ModelSerializer):
             )
 
         return data
+
+
+# -----------------------------
+# DASHBOARD
+# -----------------------------
+class DashboardFiltroSerializer(serializers.Serializer):
+    """Rango de fechas opcional para los indicadores del dashboard."""
+    desde = serializers.DateField(required=False)
+    hasta = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if data.get('desde') and data.get('hasta') and data['desde'] > data['hasta']:
+            raise serializers.ValidationError("'desde' no puede ser posterior a 'hasta'.")
+        return data
+
+
+
+# -----------------------------
+# EXPORTACION (CSV / NDJSON)
+# -----------------------------
+class ExportacionSerializer(serializers.Serializer):
+    """?formato= de las acciones export (ademas de ?search=)."""
+    formato = serializers.ChoiceField(choices=list(FORMATOS_EXPORTACION), default='csv')
+
+# -----------------------------
+# IMPORTACION MASIVA
+# -----------------------------
+class ImportacionSerializer(serializers.Serializer):
+    """Opciones de la importacion de inventario (en la query string)."""
+    formato = serializers.ChoiceField(choices=FORMATOS_IMPORTACION, required=False)
+    proveedor = serializers.PrimaryKeyRelatedField(queryset=Proveedor.objects.all(), required=False)
+
+    def validate_proveedor(self, proveedor):
+        return proveedor.pk
+
+# -----------------------------
+# KARDEX (STOCK EN EL TIEMPO)
+# -----------------------------
+class StockEnFechaSerializer(serializers.Serializer):
+    """Dia cuyo stock de cierre se consulta (por defecto, hoy)."""
+    fecha = serializers.DateField(required=False)
+
+
+class HistorialStockFiltroSerializer(DashboardFiltroSerializer):
+    """Rango del historial de stock; por defecto los ultimos 30 dias."""
+
+# -----------------------------
+# REPORTES EN SEGUNDO PLANO
+# -----------------------------
+class ReporteSolicitudSerializer(serializers.Serializer):
+    tipo = serializers.ChoiceField(choices=sorted(TIPOS_REPORTE))
+
+
+class ReporteJobSerializer(serializers.ModelSerializer):
+    descarga = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReporteJob
+        fields = ['id', 'tipo', 'estado', 'error', 'created', 'modified', 'descarga']
+
+    def get_descarga(self, obj):
+        if obj.estado != 'listo':
+            return None
+        return reverse('reporte-descargar', args=[obj.pk], request=self.context.get('request'))
+
+# -----------------------------
+# SINCRONIZACION INCREMENTAL
+# -----------------------------
+class SincronizacionSerializer(serializers.Serializer):
+    """?since= (el `hasta` de la llamada anterior) y ?recursos= separados por comas (por defecto, todos)."""
+    since = serializers.CharField(required=False)
+    recursos = serializers.CharField(required=False)
+
+    def validate_since(self, valor):
+        try:
+            return leer_cursor(valor)
+        except ValueError:
+            raise serializers.ValidationError("Cursor invalido: use el `hasta` de la sincronizacion anterior.")
+
+    def validate_recursos(self, valor):
+        recursos = list(dict.fromkeys(r.strip() for r in valor.split(',') if r.strip()))
+        desconocidos = [r for r in recursos if r not in RECURSOS_SINCRONIZACION]
+        if desconocidos:
+            raise serializers.ValidationError(f"Recursos desconocidos: {', '.join(desconocidos)}.")
+        return recursos
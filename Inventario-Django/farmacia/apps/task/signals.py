@@ -1,50 +1,71 @@
 
 from django.db.models.signals import pre_save, post_save, post_delete
+from django.db import transaction
+from django.db.models import F
 from django.dispatch import receiver
+from django.utils import timezone
 from django.core.exceptions import ValidationError
-from .models import DetalleVenta, Movimiento, FacturaVenta
+from .models import Categoria, DetalleVenta, Movimiento, FacturaVenta, Producto, Proveedor
+from .stock import aumentar_stock, descontar_stock
+from . import autocompletado, cache_catalogo, kardex, sincronizacion
 
 # ==================== SEÑALES PARA DETALLE VENTA ====================
 
+# El precio unitario y el subtotal los calcula DetalleVenta.save antes de insertar.
+
+CAMPOS_DEL_TOTAL = {'subtotal', 'id_factura'}
+
+def _afecta_total(update_fields):
+    return update_fields is None or bool(CAMPOS_DEL_TOTAL & set(update_fields))
+
+def _sumar_al_total(factura_id, delta):
+    """Ajusta el total de la factura con un UPDATE total = total + delta (sin leer sus detalles)."""
+    if delta:
+        FacturaVenta.objects.filter(pk=factura_id).update(total=F('total') + delta, modified=timezone.now())
+
 @receiver(pre_save, sender=DetalleVenta)
-def validar_stock_detalle(sender, instance, **kwargs):
+def recordar_subtotal_anterior(sender, instance, update_fields=None, **kwargs):
     """
-    Valida que haya stock suficiente antes de guardar un detalle de venta
+    En una edicion guarda el subtotal y la factura previos, para aplicar solo la diferencia.
     """
-    if instance.id_producto.stock < instance.cantidad:
-        raise ValidationError(
-            f"Stock insuficiente para {instance.id_producto.nombre}. "
-            f"Disponible: {instance.id_producto.stock}, Solicitado: {instance.cantidad}"
-        )
+    instance._anterior = None
+    if not instance._state.adding and _afecta_total(update_fields):
+        instance._anterior = DetalleVenta.objects.filter(pk=instance.pk).values('subtotal', 'id_factura_id').first()
 
 @receiver(post_save, sender=DetalleVenta)
-def calcular_subtotal_detalle(sender, instance, created, **kwargs):
-    """
-    Calcula automáticamente el subtotal después de guardar un detalle
-    """
-    if created:
-        instance.precio_unitario = instance.id_producto.precio
-        instance.subtotal = instance.cantidad * instance.precio_unitario
-        instance.save(update_fields=['precio_unitario', 'subtotal'])
+def actualizar_total_factura(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Mantiene FacturaVenta.total de forma incremental: suma el subtotal del detalle
+    nuevo, o la diferencia si se edito (moviendolo si cambio de factura).
+    """
+    if not created and not _afecta_total(update_fields):
+        return
+    anterior = getattr(instance, '_anterior', None)
+    subtotal = DetalleVenta._meta.get_field('subtotal').to_python(instance.subtotal)  # Puede venir como float
+    if created or anterior is None:
+        _sumar_al_total(instance.id_factura_id, subtotal)
+    elif anterior['id_factura_id'] != instance.id_factura_id:
+        _sumar_al_total(anterior['id_factura_id'], -anterior['subtotal'])
+        _sumar_al_total(instance.id_factura_id, subtotal)
+    else:
+        _sumar_al_total(instance.id_factura_id, subtotal - anterior['subtotal'])
 
-@receiver(post_save, sender=DetalleVenta)
-def actualizar_total_factura(sender, instance, **kwargs):
+@receiver(post_delete, sender=DetalleVenta)
+def restar_detalle_eliminado(sender, instance, **kwargs):
     """
-    Actualiza el total de la factura cuando se modifica un detalle
+    Descuenta del total de la factura el subtotal del detalle eliminado.
     """
-    factura = instance.id_factura
-    factura.total = sum(detalle.subtotal for detalle in factura.detalles.all())
-    factura.save(update_fields=["total"])
+    _sumar_al_total(instance.id_factura_id, -DetalleVenta._meta.get_field('subtotal').to_python(instance.subtotal))
 
 @receiver(post_save, sender=DetalleVenta)
 def actualizar_stock_venta(sender, instance, created, **kwargs):
     """
-    Actualiza el stock del producto cuando se crea un detalle de venta
+    Descuenta el stock del producto cuando se crea un detalle de venta.
+    El UPDATE condicional valida y descuenta en un solo paso; si no hay stock
+    lanza StockInsuficienteError y DetalleVenta.save revierte la insercion.
     """
     if created:
-        producto = instance.id_producto
-        producto.stock -= instance.cantidad
-        producto.save()
+        descontar_stock(instance.id_producto_id, instance.cantidad, 'venta', instance.id_factura_id)
 
 # ==================== SEÑALES PARA MOVIMIENTOS ====================
 
@@ -53,13 +74,6 @@ def validar_movimiento(sender, instance, **kwargs):
     """
     Valida reglas de negocio antes de guardar un movimiento
     """
-    # Validar stock para salidas
-    if instance.tipo == 'salida' and instance.id_producto.stock < instance.cantidad:
-        raise ValidationError(
-            f"Stock insuficiente para salida de {instance.id_producto.nombre}. "
-            f"Disponible: {instance.id_producto.stock}, Solicitado: {instance.cantidad}"
-        )
-    
     # Validar proveedor para entradas
     if instance.tipo == 'entrada' and not instance.id_proveedor:
         raise ValidationError("Para entradas, debe especificar un proveedor.")
@@ -71,27 +85,94 @@ def validar_movimiento(sender, instance, **kwargs):
 @receiver(post_save, sender=Movimiento)
 def actualizar_stock_movimiento(sender, instance, created, **kwargs):
     """
-    Actualiza el stock del producto cuando se crea un movimiento
+    Actualiza el stock del producto cuando se crea un movimiento.
+    Las salidas solo se aplican si hay stock suficiente (StockInsuficienteError).
     """
     if created:
-        producto = instance.id_producto
         if instance.tipo == 'entrada':
-            producto.stock += instance.cantidad
+            aumentar_stock(instance.id_producto_id, instance.cantidad, 'movimiento', instance.pk)
         elif instance.tipo == 'salida':
-            producto.stock -= instance.cantidad
-        producto.save()
+            descontar_stock(instance.id_producto_id, instance.cantidad, 'movimiento', instance.pk)
 
 @receiver(post_delete, sender=Movimiento)
 def revertir_stock_movimiento(sender, instance, **kwargs):
     """
     Revierte el stock si se elimina un movimiento
     """
-    producto = instance.id_producto
     if instance.tipo == 'entrada':
-        producto.stock -= instance.cantidad
+        descontar_stock(instance.id_producto_id, instance.cantidad, 'reversion', instance.pk)
     elif instance.tipo == 'salida':
-        producto.stock += instance.cantidad
-    producto.save()
+        aumentar_stock(instance.id_producto_id, instance.cantidad, 'reversion', instance.pk)
+
+# ==================== SEÑALES PARA PRODUCTO (KARDEX) ====================
+
+@receiver(pre_save, sender=Producto)
+def recordar_valores_anteriores(sender, instance, update_fields=None, **kwargs):
+    """
+    Guarda el stock y el nombre previos cuando el producto se edita directamente
+    (API, admin), para anotar el ajuste en el kardex y saber si cambio el nombre.
+    """
+    instance._stock_anterior = instance._nombre_anterior = None
+    campos = [campo for campo in ('stock', 'nombre') if update_fields is None or campo in update_fields]
+    if instance.pk is not None and campos:
+        anterior = Producto.objects.filter(pk=instance.pk).values(*campos).first() or {}
+        instance._stock_anterior = anterior.get('stock')
+        instance._nombre_anterior = anterior.get('nombre')
+
+@receiver(post_save, sender=Producto)
+def anotar_stock_en_kardex(sender, instance, created, **kwargs):
+    """
+    Registra el stock inicial de un producto nuevo y los ajustes manuales de stock.
+    Producto.save envuelve el guardado y esta señal en la misma transaccion.
+    """
+    if created:
+        kardex.registrar({instance.pk: instance.stock}, 'inicial')
+    elif instance._stock_anterior is not None and instance._stock_anterior != instance.stock:
+        kardex.registrar({instance.pk: instance.stock - instance._stock_anterior}, 'ajuste')
+
+# ==================== SEÑALES PARA PRODUCTO (AUTOCOMPLETADO) ====================
+
+@receiver(post_save, sender=Producto)
+def invalidar_autocompletado(sender, instance, created, update_fields=None, **kwargs):
+    """
+    El indice de autocompletado guarda los nombres: se invalida al confirmar
+    la transaccion si el producto es nuevo o su nombre cambio.
+    """
+    if created or (instance._nombre_anterior is not None and instance._nombre_anterior != instance.nombre):
+        transaction.on_commit(autocompletado.invalidar)
+
+@receiver(post_delete, sender=Producto)
+def invalidar_autocompletado_eliminado(sender, instance, **kwargs):
+    transaction.on_commit(autocompletado.invalidar)
+
+# ==================== SEÑALES PARA CATALOGO (CACHE DE LISTADOS) ====================
+
+RECURSOS_CATALOGO = {Categoria: 'categoria', Proveedor: 'proveedor', Producto: 'producto'}
+
+def invalidar_cache_catalogo(sender, **kwargs):
+    """
+    Sube la version del listado cacheado del modelo guardado o borrado.
+    Los cambios de stock invalidan desde stock.py.
+    """
+    cache_catalogo.invalidar(RECURSOS_CATALOGO[sender])
+
+# Con sender: un receptor sin sender desactiva el borrado rapido de todos los modelos
+for modelo in RECURSOS_CATALOGO:
+    post_save.connect(invalidar_cache_catalogo, sender=modelo)
+    post_delete.connect(invalidar_cache_catalogo, sender=modelo)
+
+# ==================== SEÑALES PARA SINCRONIZACION (BORRADOS) ====================
+
+def registrar_eliminacion(sender, instance, **kwargs):
+    """
+    Anota el id de cada objeto sincronizado que se borra (tambien en cascada),
+    para que /sync/ lo informe a los clientes fuera de linea.
+    """
+    sincronizacion.registrar_eliminacion(sender, instance.pk)
+
+# Solo los modelos sincronizados: asi Eliminacion, Kardex, etc. se purgan con un DELETE directo
+for modelo in sincronizacion.RECURSOS.values():
+    post_delete.connect(registrar_eliminacion, sender=modelo)
 
 # ==================== SEÑALES PARA FACTURA ====================
 
@@ -0,0 +1,173 @@
+"""Sincronizacion incremental para clientes fuera de linea.
+
+Un cliente movil guarda su copia de los listados y, para refrescarla, pide
+solo lo que cambio desde su ultimo cursor:
+
+    GET /farmacia/sync/?since=2026-10-18T14:03:22.512004Z
+
+- `cambios`: por recurso, las filas creadas o editadas desde el cursor
+  (modified >= since), en el mismo formato que su listado. Todos los modelos
+  heredan TimeStampedModel y los UPDATE masivos (stock, total de la factura,
+  importacion) tambien escriben `modified`.
+- `eliminados`: por recurso, los ids borrados desde el cursor. Los registra
+  post_delete en la tabla Eliminacion (tambien los borrados en cascada).
+- `hasta`: el cursor para la proxima llamada.
+
+El cliente aplica las filas como upsert por id, asi que recibir dos veces una
+fila no hace daño. Por eso el cursor se devuelve unos segundos antes del
+inicio de la consulta (SINCRONIZACION_MARGEN_SEGUNDOS): una transaccion que
+escribio `modified` antes de ese momento pero confirmo despues entra en la
+siguiente llamada en lugar de perderse.
+
+Cada recurso devuelve como mucho SINCRONIZACION_MAX_FILAS filas por llamada;
+si alguno queda cortado, `completo` es false y `hasta` apunta a la ultima
+fila entregada: el cliente repite con ese cursor hasta que `completo` sea
+true. Ese cursor es compuesto, (fecha, id) del ultimo entregado por cada
+recurso cortado en esa fecha, p. ej. `2026-10-18T14:03:22.512004Z|productos:812`:
+con solo la fecha, mas de SINCRONIZACION_MAX_FILAS filas con el mismo
+`modified` (un UPDATE masivo) devolverian siempre el mismo lote. El cliente
+lo trata como texto opaco. Sin ?since= se entrega todo (primera
+sincronizacion). Las marcas de borrado se guardan SINCRONIZACION_RETENCION_DIAS
+(manage.py purgar_eliminaciones); un cursor mas viejo debe sincronizar de cero.
+"""
+
+from datetime import timedelta, timezone as zona
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Categoria, Cliente, DetalleVenta, Eliminacion, Empleado, FacturaVenta, Movimiento, Producto, Proveedor
+
+# Mismos nombres que las rutas de la API
+RECURSOS = {
+    'categorias': Categoria,
+    'proveedores': Proveedor,
+    'productos': Producto,
+    'clientes': Cliente,
+    'empleados': Empleado,
+    'facturasventa': FacturaVenta,
+    'detallesventa': DetalleVenta,
+    'movimientos': Movimiento,
+}
+RECURSO_POR_MODELO = {modelo: recurso for recurso, modelo in RECURSOS.items()}
+
+
+def registrar_eliminacion(modelo, pk):
+    """Anota el borrado de `pk` de un modelo de RECURSOS."""
+    Eliminacion.objects.create(recurso=RECURSO_POR_MODELO[modelo], objeto_id=pk)
+
+
+def limite_retencion():
+    return timezone.now() - timedelta(days=settings.SINCRONIZACION_RETENCION_DIAS)
+
+
+def vencido(desde):
+    """True si las marcas de borrado posteriores a `desde` ya pudieron purgarse."""
+    return desde is not None and desde < limite_retencion()
+
+
+def purgar():
+    """Borra las marcas de borrado mas viejas que la retencion; devuelve cuantas."""
+    borradas, _ = Eliminacion.objects.filter(fecha__lt=limite_retencion()).delete()
+    return borradas
+
+
+def formatear_cursor(fecha, posiciones=None):
+    """
+    ISO 8601 en UTC con microsegundos y 'Z' (sin '+', que en una URL se lee como espacio),
+    seguido de '|clave:id,...' con el ultimo id entregado en esa fecha de cada recurso cortado.
+    """
+    texto = fecha.astimezone(zona.utc).isoformat().replace('+00:00', 'Z')
+    if posiciones:
+        texto += '|' + ','.join(f'{clave}:{pk}' for clave, pk in sorted(posiciones.items()))
+    return texto
+
+
+def leer_cursor(texto):
+    """(fecha, {clave: id}) de un cursor de formatear_cursor; ValueError si no es valido."""
+    fecha_texto, _, resto = texto.partition('|')
+    fecha = parse_datetime(fecha_texto.strip())
+    if fecha is None:
+        raise ValueError(texto)
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    posiciones = {}
+    for parte in filter(None, resto.split(',')):
+        clave, _, pk = parte.rpartition(':')
+        posiciones[clave] = int(pk)
+    return fecha, posiciones
+
+
+def _posterior(campo, desde, ultimo_pk):
+    """Filas despues del cursor: (campo, pk) > (desde, ultimo_pk), o campo >= desde sin id."""
+    if ultimo_pk is None:
+        return Q(**{f'{campo}__gte': desde})
+    return Q(**{f'{campo}__gt': desde}) | Q(**{campo: desde, 'pk__gt': ultimo_pk})
+
+
+def _lote(consulta, limite):
+    """(primeros `limite` elementos, el ultimo de ellos si quedaron mas) de una consulta."""
+    marcas = list(consulta[:limite + 1])
+    if len(marcas) <= limite:
+        return marcas, None
+    marcas = marcas[:limite]
+    return marcas, marcas[-1]
+
+
+def _filas(vista, queryset, limite):
+    """Las primeras `limite` filas en el formato del listado de `vista` (camino rapido si lo tiene)."""
+    if settings.LECTURA_RAPIDA and getattr(vista, 'lector_rapido', None) is not None:
+        return vista.lector_rapido.representar(vista.lector_rapido.valores(queryset)[:limite])
+    return vista.get_serializer(queryset[:limite], many=True).data
+
+
+def cambios(vistas, desde=None, limite=None, posiciones=None):
+    """
+    Filas cambiadas y ids borrados desde el cursor (`desde`, `posiciones`) para cada
+    {recurso: vista}. Las vistas ya vienen con la peticion asignada (ver SincronizacionViewSet).
+    """
+    limite = limite or settings.SINCRONIZACION_MAX_FILAS
+    posiciones = posiciones or {}
+    inicio = timezone.now()
+    hasta = inicio - timedelta(seconds=settings.SINCRONIZACION_MARGEN_SEGUNDOS)
+    siguientes = {}
+    if desde is not None and hasta <= desde:
+        hasta, siguientes = desde, posiciones  # El cursor nunca retrocede
+    cortes = []  # (fecha, id, clave) del ultimo entregado de cada lote cortado
+    resultado = {'cambios': {}, 'eliminados': {}}
+
+    for recurso, vista in vistas.items():
+        queryset = vista.get_queryset()
+        if desde is not None:
+            queryset = queryset.filter(_posterior('modified', desde, posiciones.get(recurso)))
+        queryset = queryset.order_by('modified', 'pk')
+        # Primero solo (modified, pk), con el indice de modified, para saber si el lote queda cortado
+        marcas, corte = _lote(queryset.values_list('modified', 'pk'), limite)
+        resultado['cambios'][recurso] = _filas(vista, queryset, limite) if marcas else []
+        if corte is not None:
+            cortes.append((*corte, recurso))
+
+        borrados = []
+        if desde is not None:  # La primera sincronizacion no necesita borrados
+            clave = f'{recurso}.eliminados'
+            borrados, corte = _lote(
+                Eliminacion.objects.filter(_posterior('fecha', desde, posiciones.get(clave)), recurso=recurso)
+                .order_by('fecha', 'pk').values_list('fecha', 'pk', 'objeto_id'),
+                limite,
+            )
+            if corte is not None:
+                cortes.append((*corte[:2], clave))
+        resultado['eliminados'][recurso] = [objeto_id for _, _, objeto_id in borrados]
+
+    if cortes:
+        # Lo que sigue al corte llega en la proxima llamada; en la fecha del corte, despues de su id
+        hasta = min(fecha for fecha, _, _ in cortes)
+        siguientes = {clave: pk for fecha, pk, clave in cortes if fecha == hasta}
+    return {
+        'desde': formatear_cursor(desde, posiciones) if desde is not None else None,
+        'hasta': formatear_cursor(hasta, siguientes),
+        'completo': not cortes,
+        **resultado,
+    }
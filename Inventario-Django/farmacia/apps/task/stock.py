@@ -0,0 +1,105 @@
+"""Operaciones atomicas sobre Producto.stock.
+
+Todas las mutaciones de stock se hacen con un UPDATE condicional sobre una
+expresion F(), de modo que la validacion (stock >= cantidad) y la escritura
+ocurren en un solo paso en la base de datos y no se pierden ventas concurrentes.
+Cada cambio se anota en el kardex (kardex.py) dentro de la misma transaccion;
+`origen` y `referencia` indican que lo produjo. Tambien invalida el listado
+de productos cacheado (cache_catalogo.py), que muestra el stock.
+"""
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from . import cache_catalogo, kardex
+from .models import Producto
+
+
+class StockInsuficienteError(ValidationError):
+    """No hay stock suficiente para descontar la cantidad solicitada."""
+
+    def __init__(self, producto_id, cantidad):
+        self.producto_id = producto_id
+        self.cantidad = cantidad
+        producto = Producto.objects.filter(pk=producto_id).values('nombre', 'stock').first()
+        if producto:
+            mensaje = (
+                f"Stock insuficiente para {producto['nombre']}. "
+                f"Disponible: {producto['stock']}, Solicitado: {cantidad}"
+            )
+        else:
+            mensaje = f"El producto {producto_id} no existe."
+        super().__init__(mensaje, code='stock_insuficiente')
+
+
+def descontar_stock(producto_id, cantidad, origen='ajuste', referencia=None):
+    """Descuenta `cantidad` del producto solo si hay stock suficiente."""
+    with transaction.atomic():
+        actualizados = Producto.objects.filter(pk=producto_id, stock__gte=cantidad).update(
+            stock=F('stock') - cantidad,
+            modified=timezone.now(),
+        )
+        if not actualizados:
+            raise StockInsuficienteError(producto_id, cantidad)
+        kardex.registrar({producto_id: -cantidad}, origen, referencia)
+        cache_catalogo.invalidar('producto')
+
+
+def aumentar_stock(producto_id, cantidad, origen='ajuste', referencia=None):
+    """Suma `cantidad` al stock del producto."""
+    with transaction.atomic():
+        actualizados = Producto.objects.filter(pk=producto_id).update(
+            stock=F('stock') + cantidad,
+            modified=timezone.now(),
+        )
+        if actualizados:
+            kardex.registrar({producto_id: cantidad}, origen, referencia)
+            cache_catalogo.invalidar('producto')
+
+
+def aumentar_stock_en_bloque(cantidades, origen='movimiento', referencia=None):
+    """Suma varias cantidades ({producto_id: cantidad}) con un solo UPDATE."""
+    cantidades = {pk: cantidad for pk, cantidad in cantidades.items() if cantidad}
+    if not cantidades:
+        return
+    with transaction.atomic():
+        Producto.objects.filter(pk__in=list(cantidades)).update(
+            stock=Case(*[When(pk=pk, then=F('stock') + cantidad) for pk, cantidad in cantidades.items()]),
+            modified=timezone.now(),
+        )
+        kardex.registrar(cantidades, origen, referencia)
+        cache_catalogo.invalidar('producto')
+
+
+def descontar_stock_en_bloque(cantidades, origen='venta', referencia=None):
+    """
+    Descuenta varias cantidades ({producto_id: cantidad}) con un solo UPDATE.
+    Si algun producto no tiene stock suficiente no se descuenta ninguno.
+    """
+    if not cantidades:
+        return
+    condicion = Q()
+    for pk, cantidad in cantidades.items():
+        condicion |= Q(pk=pk, stock__gte=cantidad)
+    with transaction.atomic():
+        actualizados = Producto.objects.filter(condicion).update(
+            stock=Case(*[When(pk=pk, then=F('stock') - cantidad) for pk, cantidad in cantidades.items()]),
+            modified=timezone.now(),
+        )
+        if actualizados != len(cantidades):
+            transaction.set_rollback(True)
+        else:
+            kardex.registrar({pk: -cantidad for pk, cantidad in cantidades.items()}, origen, referencia)
+            cache_catalogo.invalidar('producto')
+
+    if actualizados != len(cantidades):
+        disponibles = dict(
+            Producto.objects.filter(pk__in=list(cantidades)).values_list('pk', 'stock')
+        )
+        producto_id = next(
+            (pk for pk, cantidad in cantidades.items() if disponibles.get(pk, 0) < cantidad),
+            next(iter(cantidades)),
+        )
+        raise StockInsuficienteError(producto_id, cantidades[producto_id])
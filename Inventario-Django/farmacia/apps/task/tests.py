@@ -4,9 +4,46 @@ from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth import get_user_model
 from .models import *
 from .pdf import *
-from io import BytesIO
+from io import BytesIO, StringIO
 from rest_framework_simplejwt.tokens import RefreshToken
 from ..usuario.models import Rol  
+from .stock import StockInsuficienteError, descontar_stock
+from .ventas import registrar_venta
+from django.utils import timezone
+from datetime import date, datetime, timedelta, timezone as tz
+from decimal import Decimal
+from django.test import TransactionTestCase, override_settings
+from unittest import skipUnless
+from django.db import connection, OperationalError
+from django.test.utils import CaptureQueriesContext
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+import zlib
+from unittest import mock
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.utils.http import http_date
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from farmacia.middleware.metrics import registro
+from farmacia.middleware.perfil_sql import forma_sql
+from . import autocompletado, cache_catalogo, cola_reportes, kardex, renderers, sincronizacion
+from .benchmarks import consultas_frecuentes, recorridos_completos
+from .busqueda import BusquedaPostgres, BusquedaSQLite, motor
+from .carga import ejecutar_carga, guardar_resultados, sembrar_datos
+from .importacion import importar_inventario
+from .lectura_rapida import LectorRapido
+from .pagination import PaginacionCursor, PaginacionPorPagina
+from .pdf import ReportePaginado
+from .renderers import JSONRapidoParser, JSONRapidoRenderer
+from .serializers import FacturaVentaSerializer
+from .views import MovimientoViewset, ProductoViewset
 
 User = get_user_model()
 
@@ -363,6 +400,18 @@ class MovimientoCRUDTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Movimiento.objects.filter(id=self.movimiento.id).exists())
 
+    def test_eliminar_entrada_ya_vendida(self):
+        """Borrar una entrada cuyo stock ya salio responde 400 y no cambia nada"""
+        entrada = Movimiento.objects.create(
+            tipo='entrada', cantidad=10, id_producto=self.producto, id_proveedor=self.proveedor
+        )
+        descontar_stock(self.producto.id, 105)  # Sale todo el stock, incluida la entrada
+        response = self.client.delete(reverse('movimiento-detail', args=[entrada.id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Movimiento.objects.filter(id=entrada.id).exists())
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 0)
+
 class DetalleVentaCRUDTestCase(APITestCase):
     """Pruebas CRUD completas para el modelo DetalleVenta"""
 
@@ -724,4 +773,1520 @@ class IntegrationTestCase(APITestCase):
         url = reverse('movimiento-pdf', args=[movimiento_id])
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response['Content-Type'], 'application/pdf')
\ No newline at end of file
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+class VentaEnBloqueTestCase(APITestCase):
+    """Pruebas del motor de ventas en bloque usado por FacturaVentaSerializer.create"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.rol_admin = Rol.objects.create(name='administrador')
+        self.rol_employee = Rol.objects.create(name='empleado')
+        self.rol_client = Rol.objects.create(name='cliente')
+
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            password='adminpass123',
+            email='admin@example.com',
+            rol=self.rol_admin
+        )
+        self.employee_user = User.objects.create_user(
+            username='employee',
+            password='employeepass123',
+            email='employee@example.com',
+            rol=self.rol_employee
+        )
+        self.client_user = User.objects.create_user(
+            username='client',
+            password='clientpass123',
+            email='client@example.com',
+            rol=self.rol_client
+        )
+
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+
+        self.categoria = Categoria.objects.create(nombre='Medicamentos')
+        self.proveedor = Proveedor.objects.create(
+            nombre='Proveedor Test',
+            contacto='test@proveedor.com',
+            usuario=self.admin_user
+        )
+        self.cliente = Cliente.objects.create(
+            nombre='Cliente Test',
+            correo='cliente@test.com',
+            telefono='3101234567',
+            usuario=self.client_user
+        )
+        self.empleado = Empleado.objects.create(
+            nombre='Empleado Test',
+            telefono='3111111111',
+            usuario=self.employee_user
+        )
+        self.productos = [
+            Producto.objects.create(
+                nombre=f'Producto {i}',
+                precio=10,
+                stock=100,
+                id_categoria=self.categoria,
+                id_proveedor=self.proveedor
+            )
+            for i in range(30)
+        ]
+
+    def _factura_data(self, productos, cantidad=2):
+        return {
+            'id_cliente': self.cliente.id,
+            'id_empleado': self.empleado.id,
+            'detalles': [{'id_producto': p.id, 'cantidad': cantidad} for p in productos],
+        }
+
+    def test_crear_factura_con_detalles(self):
+        """Crea la factura, sus lineas, descuenta stock y calcula el total"""
+        url = reverse('facturaventa-list')
+        response = self.client.post(url, self._factura_data(self.productos[:3]), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['detalles']), 3)
+        self.assertEqual(float(response.data['total']), 60.0)
+
+        factura = FacturaVenta.objects.get(id=response.data['id'])
+        self.assertEqual(factura.detalles.count(), 3)
+        for producto in self.productos[:3]:
+            producto.refresh_from_db()
+            self.assertEqual(producto.stock, 98)
+
+    def test_stock_insuficiente_no_crea_nada(self):
+        """Si una linea no tiene stock, no se crea la factura ni se toca el inventario"""
+        url = reverse('facturaventa-list')
+        response = self.client.post(url, self._factura_data(self.productos[:2], cantidad=101), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(FacturaVenta.objects.count(), 0)
+        self.assertEqual(DetalleVenta.objects.count(), 0)
+        self.productos[0].refresh_from_db()
+        self.assertEqual(self.productos[0].stock, 100)
+
+    def test_lineas_repetidas_suman_cantidades(self):
+        """Dos lineas del mismo producto se validan contra el stock sumado"""
+        producto = self.productos[0]
+        producto.stock = 3
+        producto.save()
+        url = reverse('facturaventa-list')
+        response = self.client.post(url, self._factura_data([producto, producto]), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 3)
+
+    def test_consultas_constantes_por_factura(self):
+        """El motor de ventas usa las mismas consultas para 3 o 30 lineas"""
+
+        def consultas(productos):
+            detalles = [{'id_producto': p.id, 'cantidad': 1} for p in productos]
+            with CaptureQueriesContext(connection) as ctx:
+                registrar_venta(detalles, id_cliente=self.cliente, id_empleado=self.empleado)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(consultas(self.productos[:3]), consultas(self.productos))
+
+
+class StockAtomicoTestCase(TransactionTestCase):
+    """Pruebas de estres: descuentos concurrentes de stock sobre el mismo producto"""
+
+    TRABAJADORES = 50
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            password='adminpass123',
+            email='admin@example.com'
+        )
+        self.categoria = Categoria.objects.create(nombre='Medicamentos')
+        self.proveedor = Proveedor.objects.create(
+            nombre='Proveedor Test',
+            contacto='test@proveedor.com',
+            usuario=self.admin_user
+        )
+
+    def _crear_producto(self, stock):
+        return Producto.objects.create(
+            nombre='Paracetamol',
+            precio=10.50,
+            stock=stock,
+            id_categoria=self.categoria,
+            id_proveedor=self.proveedor
+        )
+
+    def _vender(self, producto_id):
+        """Un trabajador: intenta vender una unidad. Reintenta si la base esta bloqueada."""
+        try:
+            for _ in range(200):
+                try:
+                    descontar_stock(producto_id, 1)
+                    return True
+                except StockInsuficienteError:
+                    return False
+                except OperationalError:  # SQLite: 'database table is locked'
+                    time.sleep(0.005)
+            raise AssertionError("La base de datos siguio bloqueada")
+        finally:
+            connection.close()
+
+    def _vender_en_paralelo(self, producto):
+        with ThreadPoolExecutor(max_workers=self.TRABAJADORES) as pool:
+            return list(pool.map(self._vender, [producto.id] * self.TRABAJADORES))
+
+    def test_no_se_pierden_ventas_concurrentes(self):
+        """50 trabajadores venden el mismo producto: el stock refleja todas las ventas"""
+        producto = self._crear_producto(stock=100)
+        resultados = self._vender_en_paralelo(producto)
+        producto.refresh_from_db()
+        self.assertTrue(all(resultados))
+        self.assertEqual(producto.stock, 100 - self.TRABAJADORES)
+
+    def test_no_se_sobrevende(self):
+        """Con menos stock que trabajadores, solo se aceptan tantas ventas como unidades"""
+        producto = self._crear_producto(stock=30)
+        resultados = self._vender_en_paralelo(producto)
+        producto.refresh_from_db()
+        self.assertEqual(resultados.count(True), 30)
+        self.assertEqual(producto.stock, 0)
+
+    def test_error_tipado_stock_insuficiente(self):
+        """Sin stock suficiente se lanza StockInsuficienteError y no se modifica el producto"""
+        producto = self._crear_producto(stock=2)
+        with self.assertRaises(StockInsuficienteError):
+            descontar_stock(producto.id, 3)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 2)
+
+
+class ConsultasConstantesMixin:
+    """Helper: verifica que un listado no haga consultas por fila (N+1)."""
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def assertConsultasConstantes(self, url, crear_fila, filas=10):
+        """Lista `url` con una fila y con `filas` filas; ambas deben costar las mismas consultas."""
+        crear_fila()
+        self.contar_consultas(url)  # Calienta las caches por proceso (rol del usuario)
+        pocas = self.contar_consultas(url)
+        for _ in range(filas - 1):
+            crear_fila()
+        muchas = self.contar_consultas(url)
+        self.assertEqual(pocas, muchas, f"{url}: {pocas} consultas con 1 fila, {muchas} con {filas}")
+
+
+class DatosVentasTestCase(APITestCase):
+    """Datos base (roles, usuarios, cliente, empleado) para pruebas de listados y ventas"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.rol_admin = Rol.objects.create(name='administrador')
+        self.rol_employee = Rol.objects.create(name='empleado')
+        self.rol_client = Rol.objects.create(name='cliente')
+
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            password='adminpass123',
+            email='admin@example.com',
+            rol=self.rol_admin
+        )
+        self.employee_user = User.objects.create_user(
+            username='employee',
+            password='employeepass123',
+            email='employee@example.com',
+            rol=self.rol_employee
+        )
+        self.client_user = User.objects.create_user(
+            username='client',
+            password='clientpass123',
+            email='client@example.com',
+            rol=self.rol_client
+        )
+
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+
+        self.categoria = Categoria.objects.create(nombre='Medicamentos')
+        self.proveedor = Proveedor.objects.create(
+            nombre='Proveedor Test',
+            contacto='test@proveedor.com',
+            usuario=self.admin_user
+        )
+        self.cliente = Cliente.objects.create(
+            nombre='Cliente Test',
+            correo='cliente@test.com',
+            telefono='3101234567',
+            usuario=self.client_user
+        )
+        self.empleado = Empleado.objects.create(
+            nombre='Empleado Test',
+            telefono='3111111111',
+            usuario=self.employee_user
+        )
+
+    def _crear_producto(self):
+        return Producto.objects.create(
+            nombre='Paracetamol',
+            precio=10.50,
+            stock=100,
+            id_categoria=self.categoria,
+            id_proveedor=self.proveedor
+        )
+
+    def _crear_factura(self):
+        factura = FacturaVenta.objects.create(id_cliente=self.cliente, id_empleado=self.empleado)
+        DetalleVenta.objects.create(cantidad=1, id_factura=factura, id_producto=self._crear_producto())
+        DetalleVenta.objects.create(cantidad=2, id_factura=factura, id_producto=self._crear_producto())
+        return factura
+
+    def _crear_movimiento(self):
+        return Movimiento.objects.create(
+            tipo='salida',
+            cantidad=1,
+            id_producto=self._crear_producto(),
+            id_cliente=self.cliente,
+            responsable=self.empleado
+        )
+
+
+@override_settings(CATALOGO_CACHE_ACTIVO=False)  # Se miden las consultas del listado, no la cache
+class ConsultasListadoTestCase(ConsultasConstantesMixin, DatosVentasTestCase):
+    """Los listados usan un numero de consultas independiente del numero de filas"""
+
+    def test_listado_productos(self):
+        self.assertConsultasConstantes(reverse('producto-list'), self._crear_producto)
+
+    def test_listado_movimientos(self):
+        self.assertConsultasConstantes(reverse('movimiento-list'), self._crear_movimiento)
+
+    def test_listado_detalles_venta(self):
+        self.assertConsultasConstantes(reverse('detalleventa-list'), self._crear_factura)
+
+    def test_listado_facturas(self):
+        self.assertConsultasConstantes(reverse('facturaventa-list'), self._crear_factura)
+
+    def test_mis_facturas(self):
+        refresh = RefreshToken.for_user(self.client_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+        self.assertConsultasConstantes(reverse('facturaventa-mis-facturas'), self._crear_factura)
+
+
+class PaginacionTestCase(DatosVentasTestCase):
+    """Paginacion por pagina (catalogos) y por cursor (movimientos, facturas, detalles)"""
+
+    def _siguiente(self, response):
+        """Extrae la URL rel="next" de la cabecera Link, o None."""
+        for enlace in response.get('Link', '').split(','):
+            if 'rel="next"' in enlace:
+                return enlace.split(';')[0].strip().strip('<>')
+        return None
+
+    def test_paginacion_por_pagina(self):
+        for _ in range(5):
+            self._crear_producto()
+        response = self.client.get(reverse('producto-list'), {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(response['X-Total-Count'], '5')
+        self.assertIsNotNone(self._siguiente(response))
+
+    def test_paginacion_cursor_recorre_todo_sin_repetir(self):
+        creados = [self._crear_movimiento().id for _ in range(5)]
+        url, vistos = f"{reverse('movimiento-list')}?page_size=2", []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            vistos += [m['id'] for m in response.data]
+            url = self._siguiente(response)
+        self.assertEqual(vistos, list(reversed(creados)))
+
+    @override_settings(PAGINACION_MAX_PAGE_SIZE=3)
+    def test_tope_de_page_size(self):
+        for _ in range(5):
+            self._crear_factura()
+        response = self.client.get(reverse('facturaventa-list'), {'page_size': 1000})
+        self.assertEqual(len(response.data), 3)
+
+    @mock.patch.object(PaginacionPorPagina, 'page_size', 2)
+    @mock.patch.object(PaginacionCursor, 'page_size', 2)
+    def test_sin_parametros_lista_completa(self):
+        for _ in range(3):
+            self._crear_movimiento()  # Crea tambien un producto
+        for nombre in ('producto-list', 'movimiento-list'):
+            response = self.client.get(reverse(nombre))
+            self.assertEqual(len(response.data), 3)  # Las pantallas que leen la lista entera no se cortan
+            self.assertNotIn('Link', response)
+        self.assertEqual(len(self.client.get(reverse('producto-list'), {'page': 1}).data), 2)
+        self.assertEqual(len(self.client.get(reverse('movimiento-list'), {'cursor': ''}).data), 2)
+
+
+class DashboardTestCase(DatosVentasTestCase):
+    """Indicadores agregados de /farmacia/dashboard/"""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('dashboard-list')
+        self.productos = []
+        for stock in (0, 5, 50):
+            producto = self._crear_producto()
+            producto.stock = stock
+            producto.save()
+            self.productos.append(producto)
+
+    def test_indicadores_inventario(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        inventario = response.data['inventario']
+        self.assertEqual(inventario['total_productos'], 3)
+        self.assertEqual(inventario['stock_bajo'], 2)
+        self.assertEqual(inventario['sin_stock'], 1)
+        self.assertEqual(inventario['unidades_en_stock'], 55)
+        self.assertEqual(float(inventario['valor_total_stock']), 55 * 10.50)
+
+    def test_indicadores_movimientos_y_ventas(self):
+        producto = self.productos[2]
+        Movimiento.objects.create(tipo='entrada', cantidad=4, id_producto=producto, id_proveedor=self.proveedor)
+        Movimiento.objects.create(tipo='salida', cantidad=3, id_producto=producto, id_cliente=self.cliente)
+        self._crear_factura()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        movimientos = response.data['movimientos']
+        self.assertEqual(movimientos['entradas'], 1)
+        self.assertEqual(movimientos['salidas'], 1)
+        self.assertEqual(movimientos['unidades_entrada'], 4)
+        self.assertEqual(float(movimientos['valor_salidas']), 3 * 10.50)
+        self.assertEqual(response.data['ventas']['total_ventas'], 1)
+        self.assertEqual(float(response.data['ventas']['monto_ventas']), 3 * 10.50)
+        agregaciones = [q for q in ctx.captured_queries if 'task_' in q['sql']]
+        self.assertEqual(len(agregaciones), 3)
+
+    def test_rango_de_fechas(self):
+        self._crear_factura()
+        response = self.client.get(self.url, {'desde': '2000-01-01', 'hasta': '2000-12-31'})
+        self.assertEqual(response.data['ventas']['total_ventas'], 0)
+        self.assertEqual(response.data['inventario']['total_productos'], 5)
+
+    def test_rango_invalido(self):
+        response = self.client.get(self.url, {'desde': '2025-02-01', 'hasta': '2025-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cliente_sin_acceso(self):
+        refresh = RefreshToken.for_user(self.client_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ReportePaginadoTestCase(DatosVentasTestCase):
+    """Motor de PDFs paginados: varias paginas, encabezado repetido y respuesta en streaming"""
+
+    def _paginas(self, pdf_bytes):
+        return int(re.search(rb'/Count (\d+)', pdf_bytes).group(1))
+
+    def test_reporte_grande_ocupa_varias_paginas(self):
+        """Las filas se reparten en paginas de filas_por_pagina filas"""
+        reporte = ReportePaginado('Prueba', ["ID", "Nombre"], [40, 100])
+        filas = ([str(i), f'Producto {i}'] for i in range(reporte.filas_por_pagina * 3 + 1))
+        pdf = reporte.escribir(BytesIO(), filas).getvalue()
+        self.assertEqual(self._paginas(pdf), 4)
+
+    def test_tabla_xref_apunta_a_cada_objeto(self):
+        """El PDF se escribe por partes: cada desplazamiento de la xref debe caer en su objeto"""
+        reporte = ReportePaginado('Acentos (ñ)', ["ID", "Nombre"], [40, 100])
+        pdf = reporte.escribir(BytesIO(), ([str(i), 'Acetaminofén'] for i in range(200))).getvalue()
+        inicio = int(re.search(rb'startxref\n(\d+)', pdf).group(1))
+        total = int(re.match(rb'xref\n0 (\d+)\n', pdf[inicio:]).group(1))
+        desplazamientos = re.findall(rb'(\d{10}) 00000 n ', pdf[inicio:])
+        self.assertEqual(len(desplazamientos), total - 1)
+        for numero, desplazamiento in enumerate(desplazamientos, start=1):
+            self.assertTrue(pdf[int(desplazamiento):].startswith(b'%d 0 obj' % numero))
+        self.assertIn('Acetaminofén'.encode('cp1252'), zlib.decompress(
+            re.search(rb'stream\n(.*?)\nendstream', pdf, re.S).group(1)))
+
+    def test_reporte_vacio_tiene_una_pagina(self):
+        pdf_file = build_todos_productos_pdf(Producto.objects.none())
+        self.assertEqual(self._paginas(pdf_file.getvalue()), 1)
+
+    @override_settings(REPORTES_CACHE_MAX_BYTES=0)
+    def test_endpoint_transmite_pdf(self):
+        for _ in range(60):
+            self._crear_movimiento()
+        response = self.client.get(reverse('movimiento-all-pdf'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        contenido = b''.join(response.streaming_content)
+        self.assertTrue(contenido.startswith(b'%PDF'))
+
+
+class ReporteCacheadoTestCase(DatosVentasTestCase):
+    """PDFs con ETag, respuestas 304 y cache por huella de datos"""
+
+    def setUp(self):
+        super().setUp()
+        caches['reportes'].clear()
+        self.producto = self._crear_producto()
+        self.url = reverse('producto-all-pdf')
+
+    def test_etag_y_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_if_modified_since_no_valida(self):
+        # Un borrado no cambia max(modified): solo el ETag (con el conteo) puede dar 304
+        otro = self._crear_producto()
+        self.client.get(self.url)
+        otro.delete()
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cambio_de_datos_invalida_el_reporte(self):
+        etag = self.client.get(self.url)['ETag']
+        self.producto.nombre = 'Ibuprofeno'
+        self.producto.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cambio_en_relacion_impresa_invalida_el_reporte(self):
+        etag = self.client.get(self.url)['ETag']
+        self.categoria.nombre = 'Analgesicos'
+        self.categoria.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_segunda_descarga_sale_de_cache(self):
+        primera = self.client.get(self.url)
+        with mock.patch('apps.task.views.escribir_todos_productos_pdf') as escribir:
+            segunda = self.client.get(self.url)
+        escribir.assert_not_called()
+        self.assertEqual(primera.content, segunda.content)
+
+    def test_pdf_individual_condicional(self):
+        url = reverse('producto-pdf', args=[self.producto.id])
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+@override_settings(REPORTES_EJECUCION_INMEDIATA=True)
+class ReporteEnSegundoPlanoTestCase(DatosVentasTestCase):
+    """Cola de reportes: POST devuelve el id del trabajo, luego se consulta el estado y se descarga"""
+
+    def setUp(self):
+        super().setUp()
+        self.cola = cola_reportes
+        self.cola._almacenes['memoria']._trabajos.clear()
+        self._crear_producto()
+
+    def _solicitar(self, tipo='productos'):
+        return self.client.post(reverse('reporte-list'), {'tipo': tipo}, format='json')
+
+    def _flujo_completo(self):
+        response = self._solicitar()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        trabajo_id = response.data['id']
+
+        response = self.client.get(reverse('reporte-detail', args=[trabajo_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['estado'], 'listo')
+        self.assertTrue(response.data['descarga'].endswith(reverse('reporte-descargar', args=[trabajo_id])))
+
+        response = self.client.get(reverse('reporte-descargar', args=[trabajo_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_flujo_completo_en_memoria(self):
+        self._flujo_completo()
+
+    @override_settings(REPORTES_COLA='db')
+    def test_flujo_completo_en_base_de_datos(self):
+        self._flujo_completo()
+        self.assertEqual(ReporteJob.objects.filter(estado='listo').count(), 1)
+
+    def test_cliente_no_puede_pedir_reportes_de_inventario(self):
+        refresh = RefreshToken.for_user(self.client_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+        self.assertEqual(self._solicitar().status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self._solicitar('mis_detalles_venta').status_code, status.HTTP_202_ACCEPTED)
+
+    def test_solo_el_dueno_ve_el_trabajo(self):
+        trabajo_id = self._solicitar().data['id']
+        refresh = RefreshToken.for_user(self.employee_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+        response = self.client.get(reverse('reporte-detail', args=[trabajo_id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(REPORTES_COLA='db', REPORTES_EJECUCION_INMEDIATA=False, REPORTES_MAX_PENDIENTES_POR_USUARIO=1)
+    def test_limite_de_pendientes_y_comando(self):
+        trabajo_id = self._solicitar().data['id']  # on_commit no se ejecuta dentro de TestCase
+        response = self.client.get(reverse('reporte-descargar', args=[trabajo_id]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self._solicitar().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        call_command('procesar_reportes', una_vez=True, stdout=StringIO())
+        response = self.client.get(reverse('reporte-descargar', args=[trabajo_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(REPORTES_COLA='db', REPORTES_EJECUCION_INMEDIATA=False, REPORTES_MAX_PENDIENTES_POR_USUARIO=1)
+    def test_trabajos_atascados_se_reclaman(self):
+        trabajo_id = self._solicitar().data['id']
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        atascado = ReporteJob.objects.filter(pk=trabajo_id)
+        atascado.update(estado='procesando', intento=1, modified=hace_una_hora)  # Su proceso murio
+
+        call_command('procesar_reportes', una_vez=True, stdout=StringIO())
+        trabajo = atascado.get()
+        self.assertEqual((trabajo.estado, trabajo.error), ('listo', ''))
+
+        self.assertEqual(trabajo.intento, 2)
+
+        # Atascado por segunda vez: expira y deja de contar para el limite
+        atascado.update(estado='procesando', modified=hace_una_hora)
+        self.assertEqual(self._solicitar().status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(atascado.get().estado, 'error')
+
+    def test_atascado_en_memoria_se_reintenta(self):
+        trabajo = self.cola.ReporteJob(tipo='productos', usuario=self.admin_user, nombre_archivo='p.pdf',
+                                       estado='procesando', modified=timezone.now() - timedelta(hours=1))
+        self.cola.almacen().crear(trabajo)
+        self._solicitar()  # Encolar reclama y vuelve a procesar (ejecucion inmediata)
+        self.assertEqual(self.cola.obtener(trabajo.pk).estado, 'listo')
+
+    @override_settings(REPORTES_COLA='db')
+    def test_error_generico_y_detalle_en_el_log(self):
+        falla = self.cola.TIPOS_REPORTE['productos']._replace(escribir=mock.Mock(side_effect=RuntimeError('SELECT secreto')))
+        with mock.patch.dict(self.cola.TIPOS_REPORTE, {'productos': falla}):
+            with self.assertLogs('apps.task.cola_reportes', 'ERROR') as log:
+                trabajo_id = self._solicitar().data['id']
+        response = self.client.get(reverse('reporte-detail', args=[trabajo_id]))
+        self.assertEqual((response.data['estado'], response.data['error']), ('error', self.cola.FALLIDO))
+        self.assertIn('SELECT secreto', '\n'.join(log.output))
+
+    @override_settings(REPORTES_MAX_TERMINADOS_MEMORIA=2)
+    def test_memoria_conserva_pocos_terminados(self):
+        ids = [uuid.UUID(self._solicitar().data['id']) for _ in range(3)]
+        self.assertIsNone(self.cola.obtener(ids[0]))
+        self.assertEqual(self.cola.obtener(ids[2]).estado, 'listo')
+
+    @override_settings(REPORTES_COLA='db', REPORTES_EJECUCION_INMEDIATA=False)
+    def test_ejecucion_reclamada_no_guarda_su_resultado(self):
+        almacen = self.cola.almacen()
+        trabajo_id = self._solicitar().data['id']
+        lenta = almacen.tomar(trabajo_id)  # Ejecucion que se vuelve lenta
+        ReporteJob.objects.filter(pk=trabajo_id).update(modified=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.cola.recuperar_atascados(), [lenta.pk])
+        self.assertTrue(self.cola.procesar(trabajo_id))  # La nueva ejecucion termina
+
+        self.assertFalse(almacen.terminar(lenta, lenta.intento, estado='error', error='tarde'))
+        self.assertEqual(ReporteJob.objects.get(pk=trabajo_id).estado, 'listo')
+        # Un trabajo que late no se reclama por viejo que sea
+        otro = almacen.tomar(self._solicitar().data['id'])
+        ReporteJob.objects.filter(pk=otro.pk).update(modified=timezone.now() - timedelta(hours=1))
+        almacen.latir(otro, otro.intento)
+        self.assertEqual(self.cola.recuperar_atascados(), [])
+
+
+@skipUnless(connection.vendor == 'sqlite', "Con pocas filas PostgreSQL prefiere Seq Scan; ver IndicesBenchmark")
+class IndicesTestCase(DatosVentasTestCase):
+    """EXPLAIN de las consultas frecuentes: deben usar los indices de models.py, no recorrer tablas completas"""
+
+    def test_consultas_frecuentes_usan_indices(self):
+        factura = self._crear_factura()
+        movimiento = self._crear_movimiento()
+        consultas = consultas_frecuentes(factura.id_cliente, movimiento.id_producto, factura.fecha)
+        for nombre, queryset in consultas.items():
+            with self.subTest(consulta=nombre):
+                plan = queryset.explain()
+                self.assertEqual(recorridos_completos(plan), [], plan)
+
+    def test_indice_parcial_de_stock_bajo(self):
+        plan = Producto.objects.filter(stock__lt=10).values('id').explain()
+        self.assertIn('producto_stock_bajo_idx', plan)
+
+
+class KardexTestCase(DatosVentasTestCase):
+    """Kardex: una fila por cambio de stock, con saldo, y consultas de stock en una fecha"""
+
+    def setUp(self):
+        super().setUp()
+        self.producto = self._crear_producto()
+
+    def _filas(self):
+        return list(Kardex.objects.filter(producto=self.producto).order_by('fecha', 'id')
+                    .values_list('origen', 'cantidad', 'saldo'))
+
+    def test_cada_cambio_de_stock_queda_en_el_kardex(self):
+        movimiento = Movimiento.objects.create(
+            tipo='salida', cantidad=3, id_producto=self.producto,
+            id_cliente=self.cliente, responsable=self.empleado)
+        registrar_venta([{'id_producto': self.producto.pk, 'cantidad': 2}],
+                        id_cliente=self.cliente, id_empleado=self.empleado)
+        movimiento.delete()
+        self.producto.refresh_from_db()
+        self.producto.stock = 50
+        self.producto.save()
+
+        self.assertEqual(self._filas(), [
+            ('inicial', 100, 100),
+            ('movimiento', -3, 97),
+            ('venta', -2, 95),
+            ('reversion', 3, 98),
+            ('ajuste', -48, 50),
+        ])
+
+    def test_venta_rechazada_no_deja_filas(self):
+        with self.assertRaises(StockInsuficienteError):
+            registrar_venta([{'id_producto': self.producto.pk, 'cantidad': 500}],
+                            id_cliente=self.cliente, id_empleado=self.empleado)
+        self.assertEqual(self._filas(), [('inicial', 100, 100)])
+
+    def test_stock_en_una_fecha_es_una_consulta(self):
+        hace = lambda dias: timezone.now() - timedelta(days=dias)
+        Kardex.objects.filter(producto=self.producto).update(fecha=hace(10))
+        self._crear_movimiento_de(self.producto)
+        Kardex.objects.filter(producto=self.producto, origen='movimiento').update(fecha=hace(5))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(kardex.stock_en(self.producto.pk, hace(7)), 100)
+        self.assertEqual(kardex.stock_en(self.producto.pk, hace(1)), 99)
+        self.assertIsNone(kardex.stock_en(self.producto.pk, hace(20)))
+
+        response = self.client.get(reverse('producto-stock-en', args=[self.producto.pk]),
+                                   {'fecha': hace(7).date().isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['stock'], 100)
+
+    def test_corte_registra_diferencias_hechas_por_fuera(self):
+        Producto.objects.filter(pk=self.producto.pk).update(stock=70)  # No pasa por stock.py
+        call_command('cortar_kardex', stdout=StringIO())
+        self.assertEqual(self._filas()[-1], ('corte', -30, 70))
+
+        response = self.client.get(reverse('producto-historial-stock', args=[self.producto.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([fila['stock'] for fila in response.data], [70])
+
+    def test_historial_usa_la_ultima_fila_de_los_dias_sin_corte(self):
+        hace = lambda dias: timezone.now() - timedelta(days=dias)
+        kardex.cortar()  # Corte de hoy: 100
+        Kardex.objects.filter(producto=self.producto).update(fecha=hace(3))
+        self._crear_movimiento_de(self.producto)  # Dia sin corte: 99
+        Kardex.objects.filter(producto=self.producto, origen='movimiento').update(fecha=hace(2))
+        kardex.cortar()  # Hoy: 99
+        self._crear_movimiento_de(self.producto)  # Despues del corte de hoy, no cambia el cierre
+
+        saldos = [saldo for _, saldo in kardex.historial(self.producto.pk, hace(4), timezone.now())]
+        self.assertEqual(saldos, [100, 99, 99, 99])  # Ayer no tuvo filas: arrastra el 99
+
+    def test_historial_un_dia_por_fecha_con_saldo_previo(self):
+        hace = lambda dias: timezone.now() - timedelta(days=dias)
+        Kardex.objects.filter(producto=self.producto).update(fecha=hace(10))  # Antes del rango: 100
+        self._crear_movimiento_de(self.producto)
+        Kardex.objects.filter(producto=self.producto, origen='movimiento').update(fecha=hace(2))
+
+        dias = kardex.historial(self.producto.pk, hace(4), timezone.now())
+        self.assertEqual([fecha for fecha, _ in dias],
+                         [timezone.localdate(hace(d)) for d in (4, 3, 2, 1, 0)])
+        self.assertEqual([saldo for _, saldo in dias], [100, 100, 99, 99, 99])
+
+    def _crear_movimiento_de(self, producto):
+        return Movimiento.objects.create(
+            tipo='salida', cantidad=1, id_producto=producto,
+            id_cliente=self.cliente, responsable=self.empleado)
+
+
+class TotalFacturaIncrementalTestCase(DatosVentasTestCase):
+    """FacturaVenta.total se ajusta con deltas al crear, editar y borrar detalles"""
+
+    def setUp(self):
+        super().setUp()
+        self.producto = self._crear_producto()  # precio 10.50
+        self.factura = FacturaVenta.objects.create(id_cliente=self.cliente, id_empleado=self.empleado)
+
+    def _total(self, factura=None):
+        return FacturaVenta.objects.get(pk=(factura or self.factura).pk).total
+
+    def _detalle(self, cantidad=1, factura=None):
+        return DetalleVenta.objects.create(cantidad=cantidad, id_factura=factura or self.factura, id_producto=self.producto)
+
+    def test_crear_editar_y_borrar_detalles(self):
+        detalle = self._detalle(2)
+        self._detalle(1)
+        self.assertEqual(self._total(), Decimal('31.50'))
+
+        detalle.cantidad = 4
+        detalle.save()
+        self.assertEqual(self._total(), Decimal('52.50'))
+
+        otra = FacturaVenta.objects.create(id_cliente=self.cliente, id_empleado=self.empleado)
+        detalle.id_factura = otra
+        detalle.save()
+        self.assertEqual(self._total(), Decimal('10.50'))
+        self.assertEqual(self._total(otra), Decimal('42.00'))
+
+        detalle.delete()
+        self.assertEqual(self._total(otra), Decimal('0.00'))
+
+    def test_agregar_detalle_no_depende_de_cuantos_hay(self):
+        def consultas_al_agregar():
+            with CaptureQueriesContext(connection) as ctx:
+                self._detalle()
+            return len(ctx.captured_queries)
+
+        primera = consultas_al_agregar()
+        for _ in range(10):
+            self._detalle()
+        self.assertEqual(consultas_al_agregar(), primera)
+
+    def test_comando_repara_totales(self):
+        self._detalle(2)
+        FacturaVenta.objects.filter(pk=self.factura.pk).update(total=999)
+        salida = StringIO()
+        call_command('recompute_invoice_totals', '--simular', stdout=salida)
+        self.assertIn('1 factura(s) encontradas', salida.getvalue())
+        self.assertEqual(self._total(), Decimal('999.00'))
+
+        call_command('recompute_invoice_totals', '--lote', '1', stdout=StringIO())
+        self.assertEqual(self._total(), Decimal('21.00'))
+
+
+class ImportacionTestCase(DatosVentasTestCase):
+    """Importacion masiva de productos y entradas de stock (CSV / JSON Lines)"""
+
+    CSV = (
+        "nombre,precio,categoria,proveedor,cantidad\n"
+        "Paracetamol,12.00,Medicamentos,Proveedor Test,5\n"
+        "Ibuprofeno,8.25,Medicamentos,Proveedor Test,20\n"
+        "Ibuprofeno,8.50,Medicamentos,Proveedor Test,10\n"
+        ",3.00,Medicamentos,Proveedor Test,1\n"
+        "Aspirina,abc,Vitaminas,Proveedor Test,1\n"
+    )
+
+    def _importar(self, contenido, formato='csv', **kwargs):
+        return importar_inventario(BytesIO(contenido.encode('utf-8')), formato, **kwargs)
+
+    def test_csv_crea_actualiza_y_suma_stock(self):
+        existente = self._crear_producto()
+        resumen = self._importar(self.CSV)
+
+        self.assertEqual(resumen['filas'], 5)
+        self.assertEqual((resumen['creados'], resumen['actualizados']), (1, 1))
+        self.assertEqual(resumen['errores_total'], 2)
+        self.assertEqual([e['fila'] for e in resumen['errores']], [5, 6])
+        self.assertEqual(len(resumen['errores'][1]['errores']), 2)  # precio y categoria
+
+        existente.refresh_from_db()
+        self.assertEqual((existente.precio, existente.stock), (Decimal('12.00'), 105))
+        ibuprofeno = Producto.objects.get(nombre='Ibuprofeno')
+        self.assertEqual((ibuprofeno.precio, ibuprofeno.stock), (Decimal('8.50'), 30))
+        self.assertEqual(Movimiento.objects.filter(tipo='entrada', id_producto=ibuprofeno).count(), 1)
+        self.assertEqual(Kardex.objects.filter(producto=ibuprofeno).latest('id').saldo, 30)
+
+    def test_nombre_demasiado_largo_es_error_de_fila(self):
+        resumen = self._importar(f"nombre,precio,categoria,proveedor\n{'x' * 151},1.00,Medicamentos,Proveedor Test\n")
+        self.assertEqual((resumen['creados'], resumen['errores_total']), (0, 1))
+        self.assertIn('150', resumen['errores'][0]['errores'][0])
+
+    def test_jsonl_con_proveedor_por_defecto(self):
+        contenido = (
+            '{"nombre": "Loratadina", "precio": 4.5, "categoria": "Medicamentos", "cantidad": 7}\n'
+            '\n'
+            'no es json\n'
+        )
+        resumen = self._importar(contenido, 'jsonl', proveedor=self.proveedor.pk)
+        self.assertEqual((resumen['creados'], resumen['errores_total']), (1, 1))
+        self.assertEqual(resumen['errores'][0]['fila'], 3)
+        producto = Producto.objects.get(nombre='Loratadina')
+        self.assertEqual((producto.id_proveedor_id, producto.stock), (self.proveedor.pk, 7))
+
+    def test_endpoint_multipart_y_cuerpo(self):
+        url = reverse('producto-importar')
+        archivo = SimpleUploadedFile('inventario.csv', self.CSV.encode('utf-8'), content_type='text/csv')
+        response = self.client.post(url, {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['creados'], 2)
+
+        cuerpo = '{"nombre": "Ibuprofeno", "precio": "9.00", "categoria": "Medicamentos", "cantidad": 1}\n'
+        response = self.client.post(f'{url}?proveedor={self.proveedor.pk}', cuerpo.encode(),
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['actualizados'], 1)
+        self.assertEqual(Producto.objects.get(nombre='Ibuprofeno').stock, 31)
+
+    def test_endpoint_solo_personal(self):
+        refresh = RefreshToken.for_user(self.client_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+        response = self.client.post(reverse('producto-importar'), b'', content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_comando(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as archivo:
+            archivo.write(self.CSV)
+        self.addCleanup(os.remove, archivo.name)
+        salida, errores = StringIO(), StringIO()
+        call_command('import_inventario', archivo.name, '--lote', '1', stdout=salida, stderr=errores)
+        self.assertIn('2 productos creados', salida.getvalue())
+        self.assertIn('Fila 5:', errores.getvalue())
+
+
+class ExportacionTestCase(DatosVentasTestCase):
+    """Acciones export: CSV/NDJSON transmitidos por bloques"""
+
+    def _descargar(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_productos_con_busqueda(self):
+        self._crear_producto()
+        Producto.objects.create(nombre='=HYPERLINK("x")', precio=1, id_categoria=self.categoria,
+                                id_proveedor=self.proveedor)
+        lineas = self._descargar(reverse('producto-export')).splitlines()
+        self.assertEqual(lineas[0], 'id,nombre,precio,stock,categoria,proveedor,modificado')
+        self.assertEqual(len(lineas), 3)
+        self.assertIn(',"\'=HYPERLINK(""x"")",', lineas[2])  # No se exporta como formula
+
+        lineas = self._descargar(f"{reverse('producto-export')}?search=Parac").splitlines()
+        self.assertEqual(len(lineas), 2)
+        self.assertIn('Paracetamol,10.50,100,Medicamentos,Proveedor Test', lineas[1])
+
+    def test_ndjson_de_los_cuatro_recursos(self):
+        self._crear_factura()
+        self._crear_movimiento()
+        esperados = {'producto-export': 3, 'facturaventa-export': 1,
+                     'detalleventa-export': 2, 'movimiento-export': 1}
+        for nombre, filas in esperados.items():
+            contenido = self._descargar(f'{reverse(nombre)}?formato=ndjson')
+            registros = [json.loads(linea) for linea in contenido.splitlines()]
+            self.assertEqual(len(registros), filas, nombre)
+        self.assertEqual(registros[0]['cliente'], 'Cliente Test')
+        self.assertEqual(registros[0]['responsable'], 'Empleado Test')
+
+    def test_formato_invalido_y_permisos(self):
+        response = self.client.get(f"{reverse('producto-export')}?formato=xlsx")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        refresh = RefreshToken.for_user(self.client_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+        response = self.client.get(reverse('movimiento-export'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MetricasTestCase(DatosVentasTestCase):
+    """MetricsMiddleware: series por nombre de ruta y endpoint /metrics"""
+
+    def setUp(self):
+        super().setUp()
+        self.registro = registro
+        registro.limpiar()
+
+    def test_series_por_ruta_resuelta(self):
+        producto = self._crear_producto()
+        self.client.get(reverse('producto-list'))
+        self.client.get(reverse('producto-list'))
+        self.client.get(reverse('producto-detail', args=[producto.pk]))
+        self.client.get('/farmacia/no-existe/')
+
+        listado = self.registro.serie('GET', 'producto-list', 200)
+        self.assertEqual(listado.latencia.total, 2)
+        self.assertGreater(listado.consultas.suma, 0)
+        self.assertGreater(listado.bytes_respuesta, 0)
+        self.assertEqual(self.registro.serie('GET', 'producto-detail', 200).latencia.total, 1)
+        self.assertEqual(self.registro.serie('GET', 'sin_ruta', 404).latencia.total, 1)
+
+    def test_metodos_no_estandar_comparten_serie(self):
+        for metodo in ('PROPFIND', 'XYZ1', 'XYZ2'):
+            self.client.generic(metodo, reverse('producto-list'))
+
+        self.assertEqual(self.registro.serie('other', 'producto-list', 405).latencia.total, 3)
+        self.assertNotIn('XYZ1', self.client.get('/metrics').content.decode())
+
+    def test_endpoint_metrics(self):
+        self.client.get(reverse('producto-list'))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        texto = response.content.decode()
+        self.assertIn('# TYPE farmacia_http_request_duration_seconds histogram', texto)
+        self.assertIn('farmacia_http_request_duration_seconds_count{method="GET",route="producto-list",status="200"} 1',
+                      texto)
+        self.assertIn('farmacia_http_request_db_queries_bucket{method="GET",route="producto-list",status="200",le="+Inf"} 1',
+                      texto)
+
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.8')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_endpoint_metrics_con_token(self):
+        # Detras del proxy la IP no sirve: con token, ni siquiera 127.0.0.1 entra sin la cabecera
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)  # Bearer del JWT
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer secreto')
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.8')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(PERFIL_SQL_CABECERA=True, PERFIL_SQL_UMBRAL_N1=5)
+class PerfilSQLTestCase(DatosVentasTestCase):
+    """Perfilado SQL opcional por cabecera X-Perfil-SQL con deteccion de N+1"""
+
+    def test_forma_normalizada(self):
+        self.assertEqual(
+            forma_sql('SELECT * FROM "t"  WHERE "id" IN (%s, %s, %s) AND "x" = \'a\' LIMIT 21'),
+            'SELECT * FROM "t" WHERE "id" IN (...) AND "x" = ? LIMIT ?',
+        )
+
+    def test_sin_cabecera_no_perfila(self):
+        response = self.client.get(reverse('movimiento-list'))
+        self.assertNotIn('X-Perfil-SQL', response)
+
+    @override_settings(LECTURA_RAPIDA=False)  # El N+1 se provoca en el serializer, no en values()
+    def test_detecta_n_mas_1_y_guarda_informe(self):
+        for _ in range(6):
+            self._crear_movimiento()
+        url = reverse('movimiento-list')
+
+        response = self.client.get(url, HTTP_X_PERFIL_SQL='1')
+        self.assertIn('n+1=0', response['X-Perfil-SQL'])
+
+        # Sin select_related cada *_nombre del serializer consulta una fila
+        with mock.patch.object(MovimientoViewset, 'queryset', Movimiento.objects.all()):
+            response = self.client.get(url, HTTP_X_PERFIL_SQL='1')
+        self.assertIn('n+1=3', response['X-Perfil-SQL'])
+
+        informe = self.client.get(reverse('perfil-sql', args=[response['X-Perfil-SQL-Id']])).json()
+        repetidas = [forma for forma in informe['formas'] if forma['n_mas_1']]
+        self.assertEqual(len(repetidas), 3)
+        self.assertEqual(repetidas[0]['veces'], 6)
+        self.assertIn("MovimientoSerializer.", repetidas[0]['campo'])
+        self.assertTrue(repetidas[0]['pila'])
+
+        response = self.client.get(reverse('perfil-sql', args=['no-existe']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CargaTestCase(DatosVentasTestCase):
+    """Generador de datos y escenario de carga de apps/task/carga.py"""
+
+    def enviar(self, metodo, ruta, cuerpo):
+        if metodo == 'GET':
+            response = self.client.get(ruta)
+        else:
+            response = self.client.post(ruta, cuerpo, format='json')
+        return response.status_code, dict(response.headers), response.content
+
+    def test_sembrar_y_escenario_mixto(self):
+        ids = sembrar_datos(self.admin_user, productos=30, clientes=3, facturas=10, movimientos=20)
+        self.assertEqual(len(ids['productos']), 30)
+        self.assertEqual(FacturaVenta.objects.filter(total__gt=0).count(), 10)
+
+        resumen = ejecutar_carga(self.enviar, ids, operaciones=40, concurrencia=1)
+        self.assertEqual(resumen['total']['peticiones'], 40)
+        self.assertEqual(resumen['total']['errores'], 0)
+        self.assertLessEqual(resumen['total']['p50_ms'], resumen['total']['p99_ms'])
+
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, 'resultados.json')
+            guardar_resultados(ruta, 'a', {'p50_ms': 1})
+            guardar_resultados(ruta, 'b', resumen['total'])
+            with open(ruta) as archivo:
+                datos = json.load(archivo)
+        self.assertEqual(set(datos['resultados']), {'a', 'b'})
+        self.assertIn('commit', datos)
+
+    def test_sembrar_dos_veces(self):
+        argumentos = ['--usuario', self.admin_user.username, '--productos', '5', '--clientes', '2',
+                      '--facturas', '2', '--movimientos', '2']
+        call_command('sembrar_datos', *argumentos, stdout=StringIO())
+        call_command('sembrar_datos', *argumentos, '--forzar', stdout=StringIO())
+        self.assertEqual(Producto.objects.count(), 10)
+        self.assertEqual(Cliente.objects.filter(correo__startswith='bench').count(), 4)
+
+
+class JSONRapidoTestCase(DatosVentasTestCase):
+    """JSONRapidoRenderer/Parser: misma salida que el JSON de DRF"""
+
+    def _datos(self):
+        return {
+            'precio': Decimal('10.50'),
+            'creado': datetime(2025, 3, 1, 8, 30, 15, 123456, tzinfo=tz.utc),
+            'fecha': date(2025, 3, 1),
+            'duracion': timedelta(seconds=90),
+            'nombre': 'Jarabe niños\u2028',
+            'detalles': [{'id': 1, 'subtotal': '21.00'}, {'id': 2, 'subtotal': None}],
+            3: 'clave entera',
+        }
+
+    def test_misma_salida_que_drf(self):
+        esperado = JSONRenderer().render(self._datos())
+        self.assertIn(b'"2025-03-01T08:30:15.123456Z"', esperado)
+        self.assertEqual(renderers.JSONRapidoRenderer().render(self._datos()), esperado)
+        with mock.patch.object(renderers, 'orjson', None):  # Sin orjson: renderer de DRF
+            self.assertEqual(renderers.JSONRapidoRenderer().render(self._datos()), esperado)
+
+    def test_indentado_y_enteros_grandes_usan_drf(self):
+        renderer = JSONRapidoRenderer()
+        self.assertIn(b'\n    "a"', renderer.render({'a': 1}, 'application/json; indent=4'))
+        self.assertEqual(renderer.render({'a': 2 ** 70}), b'{"a":1180591620717411303424}')
+        self.assertEqual(renderer.render(None), b'')
+
+    def test_parser(self):
+        parser = JSONRapidoParser()
+        self.assertEqual(parser.parse(BytesIO('{"nombre": "Acetaminofén"}'.encode())), {'nombre': 'Acetaminofén'})
+        with self.assertRaises(ParseError):
+            parser.parse(BytesIO(b'{"nombre": '))
+
+    def test_api_usa_el_renderer(self):
+        self._crear_producto()
+        response = self.client.get(reverse('producto-list'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()[0]['precio'], '10.50')
+        response = self.client.post(reverse('categoria-list'), {'nombre': 'Vitaminas'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+class LecturaRapidaTestCase(DatosVentasTestCase):
+    """Listados con values(): mismo JSON que el serializer completo"""
+
+    def _comparar(self, url, **params):
+        rapido = self.client.get(url, params)
+        with override_settings(LECTURA_RAPIDA=False):
+            completo = self.client.get(url, params)
+        self.assertEqual(rapido.status_code, status.HTTP_200_OK)
+        self.assertEqual(rapido.content, completo.content)
+        self.assertEqual(rapido.get('Link'), completo.get('Link'))
+        return rapido.json()
+
+    def test_productos(self):
+        producto = self._crear_producto()
+        Producto.objects.create(nombre='Ibuprofeno', precio=Decimal('7.25'), stock=3,
+                                id_categoria=self.categoria, id_proveedor=self.proveedor)
+        filas = self._comparar(reverse('producto-list'))
+        self.assertEqual(filas[0]['id'], producto.id)
+        self.assertEqual([fila['low_stock'] for fila in filas], [False, True])
+        self._comparar(reverse('producto-list'), search='Ibup')
+        self._comparar(reverse('producto-list'), page_size=1, page=2)
+
+    def test_movimientos_con_relacion_nula(self):
+        self._crear_movimiento()
+        Movimiento.objects.create(tipo='entrada', cantidad=5, id_producto=self._crear_producto(),
+                                  id_proveedor=self.proveedor)
+        salida, entrada = sorted(self._comparar(reverse('movimiento-list')), key=lambda fila: fila['id'])
+        self.assertNotIn('cliente_nombre', entrada)  # Entrada sin cliente: DRF omite la clave
+        self.assertEqual(salida['cliente_nombre'], 'Cliente Test')
+        self._comparar(reverse('movimiento-list'), page_size=1)
+        with timezone.override('America/Bogota'):  # La zona se resuelve en cada listado
+            self.assertTrue(self._comparar(reverse('movimiento-list'))[0]['created'].endswith('-05:00'))
+
+    def test_detalles_venta(self):
+        self._crear_factura()
+        filas = self._comparar(reverse('detalleventa-list'))
+        self.assertEqual(filas[0]['producto_nombre'], 'Paracetamol')
+
+    def test_serializer_anidado_no_soportado(self):
+        with self.assertRaises(TypeError):
+            LectorRapido(FacturaVentaSerializer).valores(FacturaVenta.objects.all())
+
+
+class BusquedaProductosTestCase(DatosVentasTestCase):
+    """?search= de productos con el indice de texto (FTS5 en SQLite)"""
+
+    def setUp(self):
+        super().setUp()
+        self.vitaminas = Categoria.objects.create(nombre='Vitaminas')
+        for nombre, categoria in (('Acetaminofén 500 mg', self.categoria), ('Ibuprofeno 400 mg', self.categoria),
+                                  ('Vitamina C', self.vitaminas), ('Jarabe de vitaminas', self.categoria)):
+            Producto.objects.create(nombre=nombre, precio=5, stock=20, id_categoria=categoria,
+                                    id_proveedor=self.proveedor)
+
+    def buscar(self, texto):
+        response = self.client.get(reverse('producto-list'), {'search': texto})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [fila['nombre'] for fila in response.json()]
+
+    def test_usa_el_indice(self):
+        self.assertIsInstance(motor(connection), BusquedaSQLite)
+        with CaptureQueriesContext(connection) as consultas:
+            self.buscar('ibup')
+        self.assertTrue(any('MATCH' in c['sql'] for c in consultas.captured_queries))
+
+    def test_sin_acentos_y_por_prefijo(self):
+        self.assertEqual(self.buscar('acetaminofen'), ['Acetaminofén 500 mg'])
+        self.assertEqual(self.buscar('ACETAMINÓ'), ['Acetaminofén 500 mg'])
+        self.assertEqual(self.buscar('ibup 400'), ['Ibuprofeno 400 mg'])
+        self.assertEqual(self.buscar('ibup 500'), [])
+        with override_settings(LECTURA_RAPIDA=False):
+            self.assertEqual(self.buscar('acetaminofen'), ['Acetaminofén 500 mg'])
+
+    def test_categoria_y_orden(self):
+        self.assertEqual(len(self.buscar('medicamentos')), 3)
+        Producto.objects.create(nombre='Botiquin de medicamentos', precio=5, stock=20,
+                                id_categoria=self.vitaminas, id_proveedor=self.proveedor)
+        # Una coincidencia en el nombre pesa mas que en la categoria
+        self.assertEqual(self.buscar('medicamentos')[0], 'Botiquin de medicamentos')
+
+    def test_sincronizado_con_los_cambios(self):
+        producto = Producto.objects.get(nombre='Vitamina C')
+        producto.nombre = 'Vitamina D3'
+        producto.save()
+        self.assertEqual(self.buscar('d3'), ['Vitamina D3'])
+        self.vitaminas.nombre = 'Suplementos'
+        self.vitaminas.save()
+        self.assertEqual(self.buscar('suplem'), ['Vitamina D3'])
+        producto.delete()
+        self.assertEqual(self.buscar('d3'), [])
+        Producto.objects.bulk_create([Producto(nombre='Loratadina', precio=3, stock=5,
+                                               id_categoria=self.categoria, id_proveedor=self.proveedor)])
+        self.assertEqual(self.buscar('lorat'), ['Loratadina'])
+
+    def test_sin_indice_usa_like(self):
+        with mock.patch('apps.task.busqueda.motor', return_value=None):
+            self.assertEqual(self.buscar('Ibupro'), ['Ibuprofeno 400 mg'])
+
+
+@skipUnless(connection.vendor == 'postgresql', "Requiere PostgreSQL con pg_trgm y unaccent")
+class BusquedaPostgresTestCase(DatosVentasTestCase):
+    """?search= con los indices de trigramas de PostgreSQL"""
+
+    def setUp(self):
+        super().setUp()
+        self.vitaminas = Categoria.objects.create(nombre='Vitaminas')
+        for nombre, categoria in (('Acetaminofén 500 mg', self.categoria), ('Vitamina C', self.vitaminas),
+                                  ('Complejo B', self.vitaminas)):
+            Producto.objects.create(nombre=nombre, precio=5, stock=20, id_categoria=categoria,
+                                    id_proveedor=self.proveedor)
+
+    def test_nombre_o_categoria(self):
+        buscador = motor(connection)
+        self.assertIsInstance(buscador, BusquedaPostgres)
+        buscar = lambda *palabras: [p.nombre for p in buscador.filtrar(Producto.objects.all(), palabras)]
+        self.assertEqual(buscar('acetaminofen'), ['Acetaminofén 500 mg'])
+        self.assertEqual(sorted(buscar('vitamin')), ['Complejo B', 'Vitamina C'])  # Por categoria
+        self.assertEqual(buscar('vitamin', 'c'), ['Vitamina C'])
+
+    def test_cada_rama_usa_su_indice(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")  # Tablas chicas: forzar el plan con indices
+        plan = motor(connection).filtrar(Producto.objects.all(), ['vitamin']).explain()
+        self.assertIn(BusquedaPostgres.INDICE, plan)
+        self.assertIn(BusquedaPostgres.INDICE_CATEGORIA, plan)
+
+
+class AutocompletadoTestCase(DatosVentasTestCase):
+    """/productos/autocomplete/: indice de prefijos en memoria"""
+
+    def setUp(self):
+        super().setUp()
+        autocompletado.invalidar()  # Los productos de otras pruebas se revirtieron sin señal
+        for nombre, stock in (('Ibuprofeno 400 mg', 30), ('Acetaminofén 500 mg', 5), ('Advil ibuprofeno', 12)):
+            with self.captureOnCommitCallbacks(execute=True):
+                Producto.objects.create(nombre=nombre, precio=Decimal('7.50'), stock=stock,
+                                        id_categoria=self.categoria, id_proveedor=self.proveedor)
+
+    def autocompletar(self, q, **params):
+        response = self.client.get(reverse('producto-autocomplete'), {'q': q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_prefijo_de_nombre_y_de_palabra(self):
+        filas = self.autocompletar('IBU')
+        # Primero los nombres que empiezan por q, despues las palabras internas
+        self.assertEqual([fila['nombre'] for fila in filas], ['Ibuprofeno 400 mg', 'Advil ibuprofeno'])
+        self.assertEqual(set(filas[0]), {'id', 'nombre', 'precio', 'stock'})
+        self.assertEqual(filas[0]['precio'], '7.50')
+        self.assertEqual([fila['nombre'] for fila in self.autocompletar('acetaminofen 5')], ['Acetaminofén 500 mg'])
+        self.assertEqual(len(self.autocompletar('ibu', limite=1)), 1)
+        self.assertEqual(self.autocompletar('zzz'), [])
+
+    def test_stock_al_dia_e_invalidacion(self):
+        producto = Producto.objects.get(nombre='Ibuprofeno 400 mg')
+        descontar_stock(producto.pk, 10, 'venta')  # UPDATE sin señales: el stock se lee de la base
+        self.assertEqual(self.autocompletar('ibuprofeno 4')[0]['stock'], 20)
+
+        producto.nombre = 'Naproxeno 250 mg'
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.save()
+        self.assertEqual([fila['nombre'] for fila in self.autocompletar('ibu')], ['Advil ibuprofeno'])
+        self.assertEqual(self.autocompletar('napro')[0]['id'], producto.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.delete()
+        self.assertEqual(self.autocompletar('napro'), [])
+
+    def test_solo_un_cambio_de_nombre_invalida(self):
+        producto = Producto.objects.get(nombre='Ibuprofeno 400 mg')
+        with mock.patch.object(autocompletado, 'invalidar') as invalidar:
+            with self.captureOnCommitCallbacks(execute=True):
+                producto.precio = Decimal('9.00')
+                producto.save()
+                producto.save(update_fields=['stock'])
+            invalidar.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                producto.nombre = 'Ibuprofeno 600 mg'
+                producto.save()
+            invalidar.assert_called_once()
+
+    def test_con_cache_local_el_indice_vence(self):
+        self.autocompletar('ibu')
+        Producto.objects.filter(nombre='Advil ibuprofeno').update(nombre='Advil')  # Como otro worker sin version
+        self.assertEqual(len(self.autocompletar('ibu')), 2)  # Indice de este proceso todavia vigente
+        with override_settings(AUTOCOMPLETADO_SEGUNDOS_LOCAL=0):
+            self.assertEqual([fila['nombre'] for fila in self.autocompletar('ibu')], ['Ibuprofeno 400 mg'])
+
+    def test_validacion(self):
+        response = self.client.get(reverse('producto-autocomplete'), {'q': '  '})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('producto-autocomplete'), {'q': 'ibu', 'limite': 500})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CacheCatalogoTestCase(DatosVentasTestCase):
+    """Cache de listados de catalogo con claves versionadas"""
+
+    def listar(self, nombre, **params):
+        response = self.client.get(reverse(nombre), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_acierto_sin_consultas_al_catalogo(self):
+        self._crear_producto()
+        antes = cache_catalogo.estadisticas()['producto']
+        primera = self.listar('producto-list', page_size=10)
+        with CaptureQueriesContext(connection) as consultas:
+            segunda = self.listar('producto-list', page_size=10)
+        self.assertEqual((primera['X-Cache'], segunda['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(primera.content, segunda.content)
+        self.assertEqual(primera['X-Total-Count'], segunda['X-Total-Count'])
+        # Solo las agregaciones del ETag (condicional.py) leen la tabla; las filas salen de la cache
+        lecturas = [c['sql'] for c in consultas.captured_queries if 'task_producto' in c['sql']]
+        self.assertTrue(lecturas)
+        self.assertTrue(all('COUNT(' in sql or 'MAX(' in sql for sql in lecturas))
+        self.assertEqual(self.listar('producto-list', page_size=1)['X-Cache'], 'MISS')  # Otra URL, otra clave
+        despues = cache_catalogo.estadisticas()['producto']
+        self.assertEqual((despues['hit'] - antes['hit'], despues['miss'] - antes['miss']), (1, 2))
+        self.assertIn(b'farmacia_cache_catalogo_total{recurso="producto",resultado="hit"}',
+                      self.client.get(reverse('metricas')).content)
+
+    def test_invalidacion_por_señales_y_stock(self):
+        producto = self._crear_producto()
+        self.listar('producto-list')
+        producto.precio = Decimal('12.00')
+        producto.save()
+        response = self.listar('producto-list')
+        self.assertEqual((response['X-Cache'], response.json()[0]['precio']), ('MISS', '12.00'))
+
+        descontar_stock(producto.pk, 5, 'venta')  # UPDATE sin señal de Producto
+        self.assertEqual(self.listar('producto-list').json()[0]['stock'], 95)
+
+        self.listar('producto-list', search='medicamentos')
+        self.categoria.nombre = 'Analgesicos'
+        self.categoria.save()  # La busqueda por categoria depende de su nombre
+        self.assertEqual(self.listar('producto-list', search='medicamentos').json(), [])
+
+        self.listar('proveedor-list')
+        self.proveedor.delete()
+        self.assertEqual(self.listar('proveedor-list').json(), [])
+
+    def test_version_se_sube_otra_vez_al_confirmar(self):
+        inicial = cache_catalogo.versiones(['categoria'])['categoria']
+        with self.captureOnCommitCallbacks(execute=True):
+            Categoria.objects.create(nombre='Vitaminas')
+        self.assertEqual(cache_catalogo.versiones(['categoria'])['categoria'], inicial + 2)
+
+    @override_settings(CATALOGO_CACHE_SEGUNDOS=300, CATALOGO_CACHE_SEGUNDOS_LOCAL=3)
+    def test_memoria_local_expira_pronto(self):
+        # Otro worker con LocMem no ve las invalidaciones de este: el listado dura poco
+        self.assertFalse(cache_catalogo.cache_compartida())
+        with mock.patch.object(cache_catalogo._cache(), 'set') as guardar:
+            self.listar('categoria-list')
+        self.assertEqual(guardar.call_args.args[2], 3)
+        with mock.patch.object(cache_catalogo, 'cache_compartida', return_value=True):
+            self.assertEqual(cache_catalogo._segundos(), 300)
+
+    @override_settings(CATALOGO_CACHE_ACTIVO=False)
+    def test_desactivada(self):
+        self.assertNotIn('X-Cache', self.listar('categoria-list'))
+
+
+class ConsultaCondicionalTestCase(DatosVentasTestCase):
+    """ETag / Last-Modified y respuestas 304 en listados y detalles"""
+
+    def test_listado_304_sin_serializar(self):
+        self._crear_producto()
+        url = reverse('producto-list')
+        primera = self.client.get(url)
+        self.assertEqual(primera.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Last-Modified', primera)  # Una baja no mueve max(modified): solo ETag
+        # Responde antes de la cache de catalogo y del serializer
+        with mock.patch('apps.task.cache_catalogo.listado_cacheado') as listado:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], primera['ETag'])
+        self.assertFalse(listado.called)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)).status_code,
+                         status.HTTP_200_OK)
+        # Otra pagina u otro filtro: otra firma
+        self.assertNotEqual(self.client.get(url, {'search': 'para'})['ETag'], primera['ETag'])
+
+    def test_etag_cambia_con_altas_ediciones_y_bajas(self):
+        url = reverse('facturaventa-list')
+        factura = self._crear_factura()
+        etags = [self.client.get(url)['ETag']]
+        DetalleVenta.objects.create(cantidad=1, id_factura=factura, id_producto=self._crear_producto())
+        etags.append(self.client.get(url)['ETag'])  # El total (UPDATE) actualiza modified
+        factura.detalles.first().delete()
+        etags.append(self.client.get(url)['ETag'])
+        FacturaVenta.objects.create(id_cliente=self.cliente, id_empleado=self.empleado)
+        etags.append(self.client.get(url)['ETag'])
+        self.assertEqual(len(set(etags)), 4)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_facturas_dependen_de_sus_detalles(self):
+        url = reverse('facturaventa-list')
+        factura = self._crear_factura()
+        antes = self.client.get(url)['ETag']
+        # Editar un detalle sin tocar la factura (UPDATE directo) tambien cambia el listado
+        DetalleVenta.objects.filter(id_factura=factura).update(cantidad=5, modified=timezone.now())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=antes).status_code, status.HTTP_200_OK)
+
+    def test_dependencias_y_detalle(self):
+        movimiento = self._crear_movimiento()
+        listado, detalle = reverse('movimiento-list'), reverse('movimiento-detail', args=[movimiento.pk])
+        antes = (self.client.get(listado)['ETag'], self.client.get(detalle)['ETag'])
+        self.assertEqual(self.client.get(detalle, HTTP_IF_NONE_MATCH=antes[1]).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+        self.cliente.nombre = 'Cliente Renombrado'  # cliente_nombre se muestra en el movimiento
+        self.cliente.save()
+        despues = self.client.get(detalle, HTTP_IF_NONE_MATCH=antes[1])
+        self.assertEqual(despues.status_code, status.HTTP_200_OK)
+        self.assertEqual(despues.json()['cliente_nombre'], 'Cliente Renombrado')
+        self.assertNotEqual(self.client.get(listado)['ETag'], antes[0])
+
+    def test_detalle_lee_el_objeto_una_vez(self):
+        url = reverse('producto-detail', args=[self._crear_producto().pk])
+        with mock.patch.object(ProductoViewset, 'get_object', autospec=True,
+                               side_effect=ProductoViewset.get_object) as get_object:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', response)
+        self.assertEqual(get_object.call_count, 1)
+
+
+@override_settings(SINCRONIZACION_MARGEN_SEGUNDOS=0, CATALOGO_CACHE_ACTIVO=False)
+class SincronizacionTestCase(DatosVentasTestCase):
+    """Sincronizacion incremental /sync/?since= con marcas de borrado"""
+
+    def _sincronizar(self, **params):
+        response = self.client.get(reverse('sync-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_solo_los_cambios_desde_el_cursor(self):
+        viejo, editado = self._crear_producto(), self._crear_producto()
+        primera = self._sincronizar()
+        self.assertIsNone(primera['desde'])
+        self.assertTrue(primera['completo'])
+        self.assertEqual({p['id'] for p in primera['cambios']['productos']}, {viejo.pk, editado.pk})
+        self.assertEqual(primera['cambios']['clientes'][0]['id'], self.cliente.pk)
+
+        editado.precio = Decimal('12.00')
+        editado.save()
+        nuevo = self._crear_producto()
+        delta = self._sincronizar(since=primera['hasta'])
+        self.assertEqual([p['id'] for p in delta['cambios']['productos']], [editado.pk, nuevo.pk])
+        self.assertEqual(delta['cambios']['productos'][0], self.client.get(
+            reverse('producto-detail', args=[editado.pk])).json())  # Mismo formato que la API
+        self.assertEqual(delta['cambios']['clientes'], [])
+        # Un cambio de stock por UPDATE tambien cuenta
+        descontar_stock(viejo.pk, 1)
+        ultimo = self._sincronizar(since=delta['hasta'])
+        self.assertEqual([p['id'] for p in ultimo['cambios']['productos']], [viejo.pk])
+        self.assertEqual(ultimo['cambios']['productos'][0]['stock'], 99)
+
+    def test_borrados_en_cascada(self):
+        factura = self._crear_factura()
+        detalles = sorted(factura.detalles.values_list('pk', flat=True))
+        cursor = self._sincronizar()['hasta']
+        factura_id = factura.pk
+        factura.delete()
+        delta = self._sincronizar(since=cursor, recursos='facturasventa,detallesventa')
+        self.assertEqual(set(delta['eliminados']), {'facturasventa', 'detallesventa'})
+        self.assertEqual(delta['eliminados']['facturasventa'], [factura_id])
+        self.assertEqual(sorted(delta['eliminados']['detallesventa']), detalles)
+        self.assertEqual(delta['cambios']['facturasventa'], [])
+        # Las marcas ya entregadas no se repiten
+        self.assertEqual(self._sincronizar(since=delta['hasta'])['eliminados']['facturasventa'], [])
+
+    @override_settings(SINCRONIZACION_MAX_FILAS=2)
+    def test_lotes_cortados(self):
+        productos = [self._crear_producto().pk for _ in range(3)]
+        primera = self._sincronizar(recursos='productos')
+        self.assertFalse(primera['completo'])
+        self.assertEqual([p['id'] for p in primera['cambios']['productos']], productos[:2])
+        self.assertEqual(primera['hasta'].split('|')[1], f'productos:{productos[1]}')
+        segunda = self._sincronizar(recursos='productos', since=primera['hasta'])
+        self.assertTrue(segunda['completo'])
+        self.assertEqual([p['id'] for p in segunda['cambios']['productos']], productos[2:])  # Sigue tras el ultimo id
+
+    @override_settings(SINCRONIZACION_MAX_FILAS=2)
+    def test_lote_cortado_con_la_misma_fecha(self):
+        productos = [self._crear_producto().pk for _ in range(3)]
+        borrados = [self._crear_producto().pk for _ in range(3)]
+        cursor = self._sincronizar(recursos='productos', since=timezone.now().isoformat())['hasta']
+        Producto.objects.filter(pk__in=borrados).delete()
+        # Mas filas que el limite con el mismo modified (UPDATE masivo) y marcas de borrado con la misma fecha
+        momento = timezone.now()
+        Producto.objects.filter(pk__in=productos).update(modified=momento)
+        Eliminacion.objects.update(fecha=momento)
+
+        recibidos, eliminados = [], []
+        for _ in range(4):
+            datos = self._sincronizar(recursos='productos', since=cursor)
+            recibidos += [p['id'] for p in datos['cambios']['productos']]
+            eliminados += datos['eliminados']['productos']
+            cursor = datos['hasta']
+            if datos['completo']:
+                break
+        self.assertTrue(datos['completo'])
+        self.assertEqual(recibidos, productos)
+        self.assertEqual(sorted(eliminados), borrados)
+
+    def test_permisos_y_cursores_invalidos(self):
+        refresh = RefreshToken.for_user(self.employee_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(refresh.access_token)}')
+        datos = self._sincronizar()
+        self.assertNotIn('categorias', datos['cambios'])  # Solo administradores
+        self.assertIn('productos', datos['cambios'])
+        url = reverse('sync-list')
+        self.assertEqual(self.client.get(url, {'recursos': 'categorias'}).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(url, {'recursos': 'recetas'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'since': 'ayer'}).status_code, status.HTTP_400_BAD_REQUEST)
+        viejo = (timezone.now() - timedelta(days=365)).isoformat()
+        self.assertEqual(self.client.get(url, {'since': viejo}).status_code, status.HTTP_410_GONE)
+
+    def test_purgar_marcas_viejas(self):
+        self._crear_producto().delete()
+        Eliminacion.objects.create(recurso='productos', objeto_id=999,
+                                   fecha=timezone.now() - timedelta(days=365))
+        salida = StringIO()
+        call_command('purgar_eliminaciones', stdout=salida)
+        self.assertIn('1 marca(s)', salida.getvalue())
+        self.assertEqual(Eliminacion.objects.count(), 1)
+
+    def test_purga_sin_cargar_las_marcas(self):
+        Eliminacion.objects.bulk_create(
+            Eliminacion(recurso='productos', objeto_id=pk, fecha=timezone.now() - timedelta(days=365))
+            for pk in range(50))
+        # Sin receptores de post_delete para Eliminacion: un solo DELETE, sin leer las filas
+        with self.assertNumQueries(1):
+            self.assertEqual(sincronizacion.purgar(), 50)
@@ -13,5 +13,8 @@ router.register(r'empleados', EmpleadoViewset, basename='empleado')
 router.register(r'facturasventa', FacturaVentaViewset, basename='facturaventa')
 router.register(r'detallesventa', DetalleVentaViewset, basename='detalleventa')
 router.register(r'movimientos', MovimientoViewset, basename='movimiento')
+router.register(r'dashboard', DashboardViewSet, basename='dashboard')
+router.register(r'reportes', ReporteViewSet, basename='reporte')
+router.register(r'sync', SincronizacionViewSet, basename='sync')
 
 urlpatterns = router.urls
@@ -0,0 +1,93 @@
+"""Motor de ventas en bloque: registra una factura con todas sus lineas
+en un numero fijo de consultas, sin importar cuantas lineas tenga."""
+
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import DecimalField, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import DetalleVenta, FacturaVenta, Producto
+from .stock import StockInsuficienteError, descontar_stock_en_bloque
+
+
+def _producto_pk(producto):
+    """Acepta una instancia de Producto o directamente su id."""
+    return getattr(producto, 'pk', producto)
+
+
+def registrar_venta(detalles_data, **datos_factura):
+    """
+    Crea una FacturaVenta y sus DetalleVenta en una sola transaccion.
+
+    - Carga todos los productos referenciados en una consulta (bloqueados para escritura).
+    - Valida el stock en memoria, sumando las cantidades de lineas repetidas.
+    - Inserta las lineas con bulk_create (no dispara las señales por linea).
+    - Descuenta el stock con un solo UPDATE condicional (ver stock.py).
+    - Escribe el total de la factura una sola vez.
+    """
+    cantidades = defaultdict(int)
+    for item in detalles_data:
+        cantidades[_producto_pk(item['id_producto'])] += item.get('cantidad', 1)
+
+    with transaction.atomic():
+        productos = Producto.objects.select_for_update().in_bulk(list(cantidades))
+
+        faltantes = [pk for pk in cantidades if pk not in productos]
+        if faltantes:
+            raise ValidationError(f"Productos inexistentes: {faltantes}")
+
+        for pk, cantidad in cantidades.items():
+            if productos[pk].stock < cantidad:
+                raise StockInsuficienteError(pk, cantidad)
+
+        detalles = []
+        total = 0
+        for item in detalles_data:
+            producto = productos[_producto_pk(item['id_producto'])]
+            cantidad = item.get('cantidad', 1)
+            subtotal = cantidad * producto.precio
+            total += subtotal
+            detalles.append(DetalleVenta(
+                cantidad=cantidad,
+                precio_unitario=producto.precio,
+                subtotal=subtotal,
+                id_producto=producto,
+            ))
+
+        factura = FacturaVenta.objects.create(total=total, **datos_factura)
+        for detalle in detalles:
+            detalle.id_factura = factura
+        DetalleVenta.objects.bulk_create(detalles)
+
+        descontar_stock_en_bloque(cantidades, origen='venta', referencia=factura.pk)
+
+    return factura
+
+
+def recalcular_totales_facturas(tamano_lote=1000, corregir=True):
+    """
+    Compara FacturaVenta.total con la suma de sus detalles, por lotes de ids:
+    una consulta de agregacion por lote y un bulk_update con las que no cuadran.
+    Devuelve la lista de (id, total guardado, total correcto) encontradas.
+    """
+    suma_detalles = Coalesce(
+        Sum('detalles__subtotal'), 0, output_field=DecimalField(max_digits=10, decimal_places=2))
+    descuadradas = []
+    ultimo_id = 0
+    while True:
+        lote = list(
+            FacturaVenta.objects.filter(pk__gt=ultimo_id).order_by('pk')
+            .annotate(suma=suma_detalles).values_list('pk', 'total', 'suma')[:tamano_lote]
+        )
+        if not lote:
+            return descuadradas
+        ultimo_id = lote[-1][0]
+        errores = [(pk, total, suma) for pk, total, suma in lote if total != suma]
+        if errores and corregir:
+            ahora = timezone.now()
+            FacturaVenta.objects.bulk_update(
+                [FacturaVenta(pk=pk, total=suma, modified=ahora) for pk, _, suma in errores], ['total', 'modified'])
+        descuadradas.extend(errores)
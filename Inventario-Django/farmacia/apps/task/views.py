@@ -7,19 +7,82 @@ from .serializers import *
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.permissions import IsAuthenticated
 from .permissions import *
+from django.conf import settings
 from django.http import HttpResponse
 from .pdf import *
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import status
 from django.db import transaction
 from rest_framework import filters
+from django.db.models import Prefetch
+from .pagination import PaginacionCursor
+from .dashboard import resumen_dashboard
+from .reportes import respuesta_pdf_cacheada
+from . import kardex
+from .importacion import importar_inventario
+from .exportacion import (
+    COLUMNAS_DETALLE_VENTA, COLUMNAS_FACTURA_VENTA, COLUMNAS_MOVIMIENTO, COLUMNAS_PRODUCTO, respuesta_exportacion,
+)
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from . import cola_reportes
+from .lectura_rapida import LectorRapido
+from .busqueda import BusquedaProductoFilter
+from .autocompletado import autocompletar
+from . import cache_catalogo, condicional, sincronizacion
+import uuid
+
+RELACIONES_PDF_PRODUCTO = ('id_categoria', 'id_proveedor')
+RELACIONES_PDF_DETALLE = ('id_producto', 'id_factura')
+RELACIONES_PDF_MOVIMIENTO = ('id_producto', 'id_cliente', 'id_proveedor', 'responsable')
+
+
+class ConsultaCondicionalMixin:
+    """ETag en list() y ETag/Last-Modified en retrieve(); 304 sin serializar si el cliente ya tiene la version."""
+    etag_dependencias = ()  # Modelos de los que el serializer muestra datos
+
+    def _condicional(self, request, etag, ultimo, generar):
+        no_modificado = condicional.no_modificado(request, etag, ultimo)
+        if no_modificado is not None:
+            return no_modificado
+        response = generar()
+        if response.status_code == 200:
+            condicional.poner_cabeceras(response, etag, ultimo)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        etag, ultimo = condicional.firma_listado(
+            request, self.filter_queryset(self.get_queryset()), self.etag_dependencias)
+        return self._condicional(request, etag, ultimo,
+                                 lambda: super(ConsultaCondicionalMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        instancia = self.get_object()  # Una sola lectura (y un solo chequeo de permisos) para firma y cuerpo
+        etag, ultimo = condicional.firma_objeto(request, instancia, self.etag_dependencias)
+        return self._condicional(request, etag, ultimo,
+                                 lambda: Response(self.get_serializer(instancia).data))
+
 
+class CacheCatalogoMixin:
+    """list() cacheado con claves versionadas (ver cache_catalogo.py)."""
+    recurso_cache = None
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        if not settings.CATALOGO_CACHE_ACTIVO or self.recurso_cache is None:
+            return super().list(request, *args, **kwargs)
+        return cache_catalogo.listado_cacheado(
+            self.recurso_cache, request, lambda: super(CacheCatalogoMixin, self).list(request, *args, **kwargs),
+        )
+
+
+class CategoriaViewSet(ConsultaCondicionalMixin, CacheCatalogoMixin, viewsets.ModelViewSet):
     """Gestiona categorÃ­as con permisos especificos y documentaciÃ³n Swagger para list/create."""
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
+    recurso_cache = 'categoria'
     permission_classes = [IsAuthenticated, IsAdmin]
 
     @swagger_auto_schema(
@@ -37,57 +100,186 @@ class CategoriaViewSet(viewsets.ModelViewSet):
         return super().create(request, *args, **kwargs)
 
 
-class ProductoViewset(viewsets.ModelViewSet):
-    queryset = Producto.objects.all()
+class ExportacionMixin:
+    """Accion export: el listado completo (con los filtros de ?search=) en CSV o NDJSON."""
+    columnas_exportacion = ()
+    nombre_exportacion = 'exportacion'
+
+    @swagger_auto_schema(
+        operation_description="Descarga el listado completo en CSV o NDJSON (?formato=csv|ndjson), "
+                              "transmitido por bloques. Respeta ?search=.",
+        query_serializer=ExportacionSerializer,
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        opciones = ExportacionSerializer(data=request.query_params)
+        opciones.is_valid(raise_exception=True)
+        return respuesta_exportacion(
+            self.filter_queryset(self.get_queryset()), self.columnas_exportacion,
+            opciones.validated_data['formato'], self.nombre_exportacion,
+        )
+
+
+class LecturaRapidaMixin:
+    """list() por el camino rapido (ver lectura_rapida.py): mismas filas JSON sin instanciar modelos."""
+    lector_rapido = None
+
+    def list(self, request, *args, **kwargs):
+        if not settings.LECTURA_RAPIDA or self.lector_rapido is None:
+            return super().list(request, *args, **kwargs)
+        filas = self.lector_rapido.valores(self.filter_queryset(self.get_queryset()))
+        pagina = self.paginate_queryset(filas)
+        if pagina is not None:
+            return self.get_paginated_response(self.lector_rapido.representar(pagina))
+        return Response(self.lector_rapido.representar(filas))
+
+
+def _fin_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.max))
+
+
+class ProductoViewset(ConsultaCondicionalMixin, CacheCatalogoMixin, LecturaRapidaMixin, ExportacionMixin, viewsets.ModelViewSet):
+    # Categoria/proveedor se leen en los PDFs y en la busqueda por categoria
+    queryset = Producto.objects.select_related('id_categoria', 'id_proveedor')
     serializer_class = ProductoSerializer
+    lector_rapido = LectorRapido(ProductoSerializer, calculados={'low_stock': ('stock',)})
+    recurso_cache = 'producto'
+    columnas_exportacion = COLUMNAS_PRODUCTO
+    nombre_exportacion = 'productos'
     permission_classes = [IsAuthenticated, IsAdmin | IsEmployee]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['nombre', 'id_categoria__nombre']
+    filter_backends = [BusquedaProductoFilter]
+    search_fields = ['nombre', 'id_categoria__nombre']  # Sin indice de texto (ver busqueda.py)
 
     @action(detail=True, methods=['get'])
     def pdf(self, request, pk=None):
         producto = self.get_object()
-        pdf_file = build_producto_id_pdf(producto)
-
-        response = HttpResponse(pdf_file, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="producto_{producto.nombre}.pdf"'
-        return response
+        return respuesta_pdf_cacheada(
+            request, self.get_queryset().filter(pk=producto.pk),
+            lambda _, salida: salida.write(build_producto_id_pdf(producto).getvalue()),
+            f'producto_{producto.nombre}.pdf', RELACIONES_PDF_PRODUCTO,
+        )
 
     @action(detail=False, methods=['get'])
     def all_pdf(self, request):
         productos = self.get_queryset()
-        pdf_file = build_todos_productos_pdf(productos)
+        return respuesta_pdf_cacheada(
+            request, productos, escribir_todos_productos_pdf, 'todos_productos.pdf', RELACIONES_PDF_PRODUCTO,
+        )
 
-        response = HttpResponse(pdf_file, content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="todos_productos.pdf"'
-        return response
+    @swagger_auto_schema(
+        operation_description="Autocompletado de nombres para la pantalla de ventas: hasta ?limite= "
+                              "productos (id, nombre, precio, stock) cuyo nombre, o una de sus palabras, "
+                              "empieza por ?q= (sin distinguir acentos ni mayusculas).",
+        query_serializer=AutocompletadoSerializer,
+        responses={200: ProductoAutocompletadoSerializer(many=True)},
+    )
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        opciones = AutocompletadoSerializer(data=request.query_params)
+        opciones.is_valid(raise_exception=True)
+        productos = autocompletar(opciones.validated_data['q'], opciones.validated_data['limite'])
+        return Response(ProductoAutocompletadoSerializer(productos, many=True).data)
+
+    @swagger_auto_schema(
+        operation_description="Importa productos y entradas de stock desde CSV o JSON Lines "
+                              "(columnas: nombre, precio, categoria, proveedor, cantidad). "
+                              "Acepta multipart (campo 'archivo') o el archivo como cuerpo "
+                              "(text/csv o application/x-ndjson). ?proveedor=<id> aplica a las filas sin proveedor.",
+        request_body=ImportacionSerializer,
+    )
+    @action(detail=False, methods=['post'])
+    def importar(self, request):
+        opciones = ImportacionSerializer(data=request.query_params)
+        opciones.is_valid(raise_exception=True)
+        tipo = request.content_type or ''
+        if tipo.startswith('multipart/form-data'):
+            archivo = request.FILES.get('archivo')
+            if archivo is None:
+                return Response({"detail": "Falta el campo 'archivo'."}, status=400)
+            nombre = archivo.name
+        else:
+            archivo, nombre = request.stream, ''
+            if archivo is None:
+                return Response({"detail": "El cuerpo de la peticion esta vacio."}, status=400)
+        formato = opciones.validated_data.get('formato') or (
+            'csv' if 'csv' in tipo or nombre.lower().endswith('.csv') else 'jsonl')
+        try:
+            resumen = importar_inventario(archivo, formato, proveedor=opciones.validated_data.get('proveedor'))
+        except ValueError as e:  # Archivo ilegible (codificacion, CSV mal formado)
+            return Response({"detail": str(e)}, status=400)
+        codigo = status.HTTP_200_OK if not resumen['errores_total'] else status.HTTP_207_MULTI_STATUS
+        return Response(resumen, status=codigo)
+
+    @swagger_auto_schema(
+        operation_description="Stock del producto al cierre de ?fecha=AAAA-MM-DD (por defecto hoy), leido del kardex.",
+        query_serializer=StockEnFechaSerializer,
+    )
+    @action(detail=True, methods=['get'])
+    def stock_en(self, request, pk=None):
+        filtro = StockEnFechaSerializer(data=request.query_params)
+        filtro.is_valid(raise_exception=True)
+        producto = self.get_object()
+        fecha = filtro.validated_data.get('fecha') or timezone.localdate()
+        return Response({
+            'producto': producto.pk,
+            'fecha': fecha,
+            'stock': kardex.stock_en(producto.pk, _fin_del_dia(fecha)),
+        })
+
+    @swagger_auto_schema(
+        operation_description="Stock de cierre por dia entre ?desde y ?hasta (por defecto los ultimos 30 dias).",
+        query_serializer=HistorialStockFiltroSerializer,
+    )
+    @action(detail=True, methods=['get'])
+    def historial_stock(self, request, pk=None):
+        filtro = HistorialStockFiltroSerializer(data=request.query_params)
+        filtro.is_valid(raise_exception=True)
+        hasta = filtro.validated_data.get('hasta') or timezone.localdate()
+        desde = filtro.validated_data.get('desde') or hasta - timedelta(days=30)
+        producto = self.get_object()
+        inicio = timezone.make_aware(datetime.combine(desde, time.min))
+        return Response([
+            {'fecha': fecha, 'stock': saldo}
+            for fecha, saldo in kardex.historial(producto.pk, inicio, _fin_del_dia(hasta))
+        ])
 
 
-class ProveedorViewset(viewsets.ModelViewSet):
+class ProveedorViewset(ConsultaCondicionalMixin, CacheCatalogoMixin, viewsets.ModelViewSet):
     """Gestiona proveedores con permisos para admin/proveedor."""
     queryset = Proveedor.objects.all()
     serializer_class = ProveedorSerializer
+    recurso_cache = 'proveedor'
     permission_classes = [IsAuthenticated, IsAdmin | IsProvider]
 
 
-class ClienteViewset(viewsets.ModelViewSet):
+class ClienteViewset(ConsultaCondicionalMixin, viewsets.ModelViewSet):
     """Maneja clientes con permisos amplios."""
     queryset = Cliente.objects.all()
     serializer_class = ClienteSerializer
     permission_classes = [IsAuthenticated, IsClient | IsEmployee | IsAdmin]
 
 
-class EmpleadoViewset(viewsets.ModelViewSet):
+class EmpleadoViewset(ConsultaCondicionalMixin, viewsets.ModelViewSet):
     """Gestiona empleados restringido a admin."""
     queryset = Empleado.objects.all()
     serializer_class = EmpleadoSerializer
     permission_classes = [IsAuthenticated, IsAdmin]
 
 
-class FacturaVentaViewset(viewsets.ModelViewSet):
-    queryset = FacturaVenta.objects.all()
+class FacturaVentaViewset(ConsultaCondicionalMixin, ExportacionMixin, viewsets.ModelViewSet):
+    # Los detalles anidados leen id_producto.nombre; id_factura lo asigna el prefetch
+    queryset = FacturaVenta.objects.prefetch_related(
+        Prefetch('detalles', queryset=DetalleVenta.objects.select_related('id_producto').only(
+            'id', 'created', 'modified', 'cantidad', 'precio_unitario', 'subtotal',
+            'id_factura', 'id_producto__id', 'id_producto__nombre',
+        ))
+    )
     serializer_class = FacturaVentaSerializer
+    etag_dependencias = (DetalleVenta, Producto)
+    columnas_exportacion = COLUMNAS_FACTURA_VENTA
+    nombre_exportacion = 'facturas_venta'
     permission_classes = [IsAuthenticated, IsEmployee | IsAdmin]
+    pagination_class = PaginacionCursor
     # Adaptado: Filtros por fecha/cliente
     filter_backends = [filters.SearchFilter]
     search_fields = ['fecha', 'id_cliente__nombre']
@@ -110,34 +302,41 @@ class FacturaVentaViewset(viewsets.ModelViewSet):
                 "username": request.user.username
             }, status=403)
 
-        facturas = FacturaVenta.objects.filter(id_cliente=cliente)
-        serializer = self.get_serializer(facturas, many=True)
-        return Response(serializer.data)
+        facturas = self.get_queryset().filter(id_cliente=cliente)
+        page = self.paginate_queryset(facturas)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(facturas, many=True).data)
 
 
-class DetalleVentaViewset(viewsets.ModelViewSet):
+class DetalleVentaViewset(ConsultaCondicionalMixin, LecturaRapidaMixin, ExportacionMixin, viewsets.ModelViewSet):
     """Gestiona detalles de venta con permisos  y acciones para PDFs."""
-    queryset = DetalleVenta.objects.all()
+    # producto_nombre y factura_fecha se resuelven con un JOIN
+    queryset = DetalleVenta.objects.select_related('id_producto', 'id_factura')
     serializer_class = DetalleVentaSerializer
+    lector_rapido = LectorRapido(DetalleVentaSerializer)
+    etag_dependencias = (Producto,)
+    columnas_exportacion = COLUMNAS_DETALLE_VENTA
+    nombre_exportacion = 'detalles_venta'
     permission_classes = [IsAuthenticated,  IsAdmin | IsEmployee]
+    pagination_class = PaginacionCursor
 
     @action(detail=True, methods=['get'])
     def pdf(self, request, pk=None):
         detalle_venta = self.get_object()
-        pdf_file = build_detalle_venta_id_pdf(detalle_venta)
-
-        response = HttpResponse(pdf_file, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="detalle_venta_{detalle_venta.id}.pdf"'
-        return response
+        return respuesta_pdf_cacheada(
+            request, self.get_queryset().filter(pk=detalle_venta.pk),
+            lambda _, salida: salida.write(build_detalle_venta_id_pdf(detalle_venta).getvalue()),
+            f'detalle_venta_{detalle_venta.id}.pdf', RELACIONES_PDF_DETALLE,
+        )
 
     @action(detail=False, methods=['get'])
     def all_pdf(self, request):
         detalles_venta = self.get_queryset()
-        pdf_file = build_todos_detalles_venta_pdf(detalles_venta)
-
-        response = HttpResponse(pdf_file, content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="todos_detalles_venta.pdf"'
-        return response
+        return respuesta_pdf_cacheada(
+            request, detalles_venta, escribir_todos_detalles_venta_pdf, 'todos_detalles_venta.pdf',
+            RELACIONES_PDF_DETALLE,
+        )
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def mis_detalles(self, request):
@@ -154,8 +353,10 @@ class DetalleVentaViewset(viewsets.ModelViewSet):
         facturas_cliente = FacturaVenta.objects.filter(id_cliente=cliente)
         detalles_venta = self.get_queryset().filter(id_factura__in=facturas_cliente)
 
-        serializer = self.get_serializer(detalles_venta, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(detalles_venta)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(detalles_venta, many=True).data)
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def all_pdf_cliente(self, request):
@@ -171,35 +372,170 @@ class DetalleVentaViewset(viewsets.ModelViewSet):
         facturas_cliente = FacturaVenta.objects.filter(id_cliente=cliente)
         detalles_venta = self.get_queryset().filter(id_factura__in=facturas_cliente)
 
-        pdf_file = build_todos_detalles_venta_pdf(detalles_venta)
-
-        response = HttpResponse(pdf_file, content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="mis_detalles_venta.pdf"'
-        return response
+        return respuesta_pdf_cacheada(
+            request, detalles_venta, escribir_todos_detalles_venta_pdf, 'mis_detalles_venta.pdf',
+            RELACIONES_PDF_DETALLE,
+        )
 
 
-class MovimientoViewset(viewsets.ModelViewSet):
-    queryset = Movimiento.objects.all()
+class MovimientoViewset(ConsultaCondicionalMixin, LecturaRapidaMixin, ExportacionMixin, viewsets.ModelViewSet):
+    # Los cuatro *_nombre del serializer se resuelven con un JOIN
+    queryset = Movimiento.objects.select_related('id_producto', 'id_proveedor', 'id_cliente', 'responsable')
     serializer_class = MovimientoSerializer
+    lector_rapido = LectorRapido(MovimientoSerializer)
+    etag_dependencias = (Producto, Proveedor, Cliente, Empleado)
+    columnas_exportacion = COLUMNAS_MOVIMIENTO
+    nombre_exportacion = 'movimientos'
     permission_classes = [IsAuthenticated, IsAdmin | IsEmployee]
+    pagination_class = PaginacionCursor
     filter_backends = [filters.SearchFilter]
     search_fields = ['tipo', 'fecha', 'id_producto__nombre']
 
+    def perform_destroy(self, instance):
+        # Borrar una entrada cuyo stock ya salio no puede revertirse (StockInsuficienteError): 400, no 500
+        try:
+            with transaction.atomic():  # Savepoint: el borrado se revierte sin romper la transaccion externa
+                instance.delete()
+        except DjangoValidationError as e:
+            raise ValidationError(e.messages)
+
     @action(detail=True, methods=['get'])
     def pdf(self, request, pk=None):
         movimiento = self.get_object()
-        pdf_file = build_movimiento_id_pdf(movimiento)
-        response = HttpResponse(pdf_file, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="movimiento_{movimiento.id}.pdf"'
-        return response
+        return respuesta_pdf_cacheada(
+            request, self.get_queryset().filter(pk=movimiento.pk),
+            lambda _, salida: salida.write(build_movimiento_id_pdf(movimiento).getvalue()),
+            f'movimiento_{movimiento.id}.pdf', RELACIONES_PDF_MOVIMIENTO,
+        )
     
     @action(detail=False, methods=['get'])
     def all_pdf(self, request):
         movimientos = self.get_queryset()
-        pdf_file = build_todos_movimientos_pdf(movimientos)
-        response = HttpResponse(pdf_file, content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="todos_movimientos.pdf"'
+        return respuesta_pdf_cacheada(
+            request, movimientos, escribir_todos_movimientos_pdf, 'todos_movimientos.pdf', RELACIONES_PDF_MOVIMIENTO,
+        )
+
+
+class DashboardViewSet(viewsets.ViewSet):
+    """Indicadores agregados para los dashboards, sin descargar los listados completos."""
+    permission_classes = [IsAuthenticated, IsAdmin | IsEmployee]
+
+    @swagger_auto_schema(
+        operation_description="Conteos de stock, valor del inventario, ventas y entradas/salidas. "
+                              "Acepta ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD para ventas y movimientos.",
+        query_serializer=DashboardFiltroSerializer,
+    )
+    def list(self, request):
+        filtro = DashboardFiltroSerializer(data=request.query_params)
+        filtro.is_valid(raise_exception=True)
+        return Response(resumen_dashboard(**filtro.validated_data))
+
+
+
+class ReporteViewSet(viewsets.ViewSet):
+    """Reportes PDF en segundo plano: POST encola, GET consulta el estado, /descargar/ entrega el PDF."""
+    permission_classes = [IsAuthenticated]
+
+    def _trabajo(self, pk):
+        """Devuelve el trabajo si existe y es del usuario autenticado; si no, None."""
+        try:
+            trabajo = cola_reportes.obtener(uuid.UUID(str(pk)))
+        except ValueError:
+            return None
+        if trabajo is None or trabajo.usuario_id != self.request.user.pk:
+            return None
+        return trabajo
+
+    @swagger_auto_schema(
+        operation_description="Encola la generacion de un reporte PDF y devuelve el id del trabajo.",
+        request_body=ReporteSolicitudSerializer,
+        responses={202: ReporteJobSerializer()}
+    )
+    def create(self, request):
+        solicitud = ReporteSolicitudSerializer(data=request.data)
+        solicitud.is_valid(raise_exception=True)
+        tipo = solicitud.validated_data['tipo']
+
+        permisos = cola_reportes.TIPOS_REPORTE[tipo].permisos
+        if permisos and not any(permiso().has_permission(request, self) for permiso in permisos):
+            return Response({"detail": "No tienes permiso para este reporte."}, status=403)
+
+        parametros = {}
+        if tipo == 'mis_detalles_venta':
+            cliente = Cliente.objects.filter(usuario=request.user).first()
+            if cliente is None:
+                return Response({"detail": "Tu cuenta no está registrada como cliente."}, status=403)
+            parametros['cliente_id'] = cliente.id
+
+        try:
+            trabajo = cola_reportes.encolar(tipo, request.user, parametros)
+        except cola_reportes.LimiteDeTrabajosError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        serializer = ReporteJobSerializer(trabajo, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    def retrieve(self, request, pk=None):
+        trabajo = self._trabajo(pk)
+        if trabajo is None:
+            return Response({"detail": "Reporte no encontrado."}, status=404)
+        return Response(ReporteJobSerializer(trabajo, context={'request': request}).data)
+
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        trabajo = self._trabajo(pk)
+        if trabajo is None:
+            return Response({"detail": "Reporte no encontrado."}, status=404)
+        if trabajo.estado != 'listo':
+            datos = ReporteJobSerializer(trabajo, context={'request': request}).data
+            codigo = status.HTTP_409_CONFLICT if trabajo.estado == 'error' else status.HTTP_202_ACCEPTED
+            return Response(datos, status=codigo)
+
+        response = HttpResponse(bytes(trabajo.contenido), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{trabajo.nombre_archivo}"'
         return response
-        
 
 
+class SincronizacionViewSet(viewsets.ViewSet):
+    """Altas, ediciones y borrados desde un cursor, para clientes fuera de linea (ver sincronizacion.py)."""
+    permission_classes = [IsAuthenticated]
+    # Cada recurso se lee con la vista de su listado: mismo queryset, formato y permisos
+    vistas = {
+        'categorias': CategoriaViewSet,
+        'proveedores': ProveedorViewset,
+        'productos': ProductoViewset,
+        'clientes': ClienteViewset,
+        'empleados': EmpleadoViewset,
+        'facturasventa': FacturaVentaViewset,
+        'detallesventa': DetalleVentaViewset,
+        'movimientos': MovimientoViewset,
+    }
+
+    def _vistas(self, request, recursos):
+        """{recurso: vista} de los recursos cuyo listado puede ver el usuario."""
+        vistas = {}
+        for recurso in recursos:
+            vista = self.vistas[recurso](request=request, format_kwarg=None, action='list', args=(), kwargs={})
+            if all(permiso.has_permission(request, vista) for permiso in vista.get_permissions()):
+                vistas[recurso] = vista
+        return vistas
+
+    @swagger_auto_schema(
+        operation_description="Filas creadas o editadas y ids borrados desde ?since= (el `hasta` de la "
+                              "llamada anterior), por recurso. Sin ?since= entrega todo. Si `completo` es "
+                              "false, repetir con el nuevo `hasta`. 410 si el cursor es mas viejo que la "
+                              "retencion de borrados.",
+        query_serializer=SincronizacionSerializer,
+    )
+    def list(self, request):
+        filtro = SincronizacionSerializer(data=request.query_params)
+        filtro.is_valid(raise_exception=True)
+        desde, posiciones = filtro.validated_data.get('since', (None, {}))
+        if sincronizacion.vencido(desde):
+            return Response({"detail": "El cursor es anterior a la retencion de borrados: sincroniza sin ?since=."},
+                            status=status.HTTP_410_GONE)
+
+        pedidos = filtro.validated_data.get('recursos') or list(self.vistas)
+        vistas = self._vistas(request, pedidos)
+        if not vistas or ('recursos' in filtro.validated_data and len(vistas) < len(pedidos)):
+            return Response({"detail": "No tienes permiso para sincronizar estos recursos."}, status=403)
+        return Response(sincronizacion.cambios(vistas, desde, posiciones=posiciones))
@@ -0,0 +1,85 @@
+"""Autenticacion JWT sin consultar la tabla Usuario en cada peticion.
+
+`JWTAuthentication` de simplejwt hace un SELECT de Usuario por llamada.
+`JWTSinConsultaAuthentication` (JWT_SIN_CONSULTA=true) arma el usuario con los
+claims del access token (user_id, username, email, telefono; el rol lo lee
+roles.py del claim 'rol'). Es una instancia real de Usuario con los demas
+campos diferidos: la vista que toque uno (p. ej. `request.user.rol_id`) lo
+carga de la base en ese momento, y las FK/filtros por usuario funcionan sin
+consultas.
+
+Como ya no se lee la fila, la desactivacion y los cambios de contraseña o de
+rol se aplican con una lista de revocacion en la cache JWT_DENYLIST_CACHE
+(una lectura get_many por peticion): los tokens emitidos antes de la
+revocacion se rechazan. Con varios procesos la cache debe ser compartida
+(Redis, Memcached o base de datos); con LocMem solo la ve el proceso que
+revoco.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import Usuario
+
+# Claim del token -> campo de Usuario que se carga sin ir a la base
+CLAIMS_USUARIO = {
+    api_settings.USER_ID_CLAIM: 'id',
+    'username': 'username',
+    'email': 'email',
+    'telefono': 'telefono',
+}
+
+
+def _cache():
+    return caches[settings.JWT_DENYLIST_CACHE]
+
+
+def _vigencia():
+    """Las entradas solo hacen falta mientras pueda existir un access token anterior."""
+    return int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()) + 60
+
+
+def revocar_usuario(usuario_id):
+    """Invalida todos los tokens del usuario emitidos hasta ahora."""
+    _cache().set(f'jwt-revocado:usuario:{usuario_id}', time.time(), _vigencia())
+
+
+def revocar_token(token):
+    """Invalida un token concreto (p. ej. al cerrar sesion)."""
+    _cache().set(f'jwt-revocado:jti:{token[api_settings.JTI_CLAIM]}', True, _vigencia())
+
+
+def token_revocado(token):
+    usuario_id = token[api_settings.USER_ID_CLAIM]
+    clave_usuario = f'jwt-revocado:usuario:{usuario_id}'
+    clave_token = f'jwt-revocado:jti:{token.get(api_settings.JTI_CLAIM)}'
+    revocados = _cache().get_many([clave_usuario, clave_token])
+    if clave_token in revocados:
+        return True
+    revocado_en = revocados.get(clave_usuario)
+    return revocado_en is not None and token.get('iat', 0) <= revocado_en
+
+
+def usuario_desde_token(token):
+    """Usuario con los campos de los claims cargados y el resto diferido."""
+    datos = {campo: token[claim] for claim, campo in CLAIMS_USUARIO.items() if claim in token}
+    datos['is_active'] = True  # Los inactivos se revocan al desactivarlos
+    campos = [f for f in Usuario._meta.concrete_fields if f.attname in datos]
+    # simplejwt guarda user_id como texto: to_python lo devuelve al tipo del campo
+    return Usuario.from_db(None, [f.attname for f in campos], [f.to_python(datos[f.attname]) for f in campos])
+
+
+class JWTSinConsultaAuthentication(JWTAuthentication):
+    """JWTAuthentication que confia en los claims del token y consulta la lista de revocacion."""
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken("El token no identifica a ningun usuario.")
+        if token_revocado(validated_token):
+            raise AuthenticationFailed("El token fue revocado; inicia sesion de nuevo.", code='token_revocado')
+        return usuario_desde_token(validated_token)
@@ -0,0 +1,60 @@
+"""Rol del usuario autenticado para los permisos.
+
+Los permisos de apps/task/permissions.py preguntan el rol varias veces por
+peticion (IsClient | IsEmployee | IsAdmin). `rol_de(request)` lo resuelve en
+este orden:
+
+1. claim 'rol' del JWT (lo agrega CustomTokenObtainPairSerializer), sin
+   consultar la base, solo si se puede saber que sigue vigente: la cache
+   JWT_DENYLIST_CACHE es compartida entre procesos, el token no fue revocado
+   (cambiar el rol de un usuario revoca sus tokens, ver signals.py) y se
+   emitio despues del ultimo cambio en la tabla Rol;
+2. si no, la base de datos a partir de `request.user.rol_id` (el Rol queda
+   cargado en el usuario para el resto de la peticion).
+
+Con una cache local (LocMem, la de por defecto) un cambio hecho en otro
+proceso o antes de reiniciar no se veria, asi que el claim no se usa.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .autenticacion import _vigencia, token_revocado
+
+CLAVE_CAMBIO_GLOBAL = 'roles:cambio-global'
+
+
+def _cache():
+    return caches[settings.JWT_DENYLIST_CACHE]
+
+
+def cache_compartida():
+    """True si las revocaciones y cambios de rol de un proceso los ven todos los demas."""
+    return not isinstance(_cache(), (LocMemCache, DummyCache))
+
+
+def _claim_vigente(token):
+    """True si el claim 'rol' del token refleja el rol actual del usuario."""
+    if token is None or 'rol' not in token or not cache_compartida():
+        return False
+    if token_revocado(token):  # Cambio de rol, contraseña o baja del usuario
+        return False
+    return token.get('iat', 0) > _cache().get(CLAVE_CAMBIO_GLOBAL, 0)
+
+
+def rol_de(request):
+    """Devuelve el nombre del rol del usuario de la peticion (None si no tiene)."""
+    token = getattr(request, 'auth', None)
+    if _claim_vigente(token):
+        return token['rol']
+    usuario = request.user
+    return usuario.rol.name if usuario.rol_id else None
+
+
+def invalidar_todos():
+    """Tras renombrar o borrar un Rol: descarta los claims 'rol' emitidos hasta ahora."""
+    _cache().set(CLAVE_CAMBIO_GLOBAL, time.time(), _vigencia())  # Mientras existan tokens anteriores
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from .models import Usuario, Rol
 
 
@@ -57,3 +59,21 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         }
 
         return data
+
+
+
+class RefreshTokenConRolActual(RefreshToken):
+    """Al emitir un access token vuelve a leer el rol: no hereda un claim 'rol' viejo del refresh."""
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        if 'rol' in self.payload:
+            access['rol'] = Rol.objects.filter(
+                usuarios__pk=self[api_settings.USER_ID_CLAIM]).values_list('name', flat=True).first()
+        return access
+
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresco de token que mantiene al dia el claim 'rol' (ver usuario/roles.py)"""
+    token_class = RefreshTokenConRolActual
@@ -0,0 +1,39 @@
+"""Señales que mantienen al dia la lista de revocacion de tokens (autenticacion.py) y la vigencia del claim rol (roles.py)."""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Rol, Usuario
+from .autenticacion import revocar_usuario
+from .roles import invalidar_todos
+
+CAMPOS_VIGILADOS = {'rol', 'rol_id', 'is_active', 'password'}
+
+
+@receiver(pre_save, sender=Usuario)
+def detectar_cambios_de_acceso(sender, instance, update_fields=None, **kwargs):
+    """
+    Si cambia el rol, se desactiva el usuario o cambia su contraseña, revoca
+    los tokens ya emitidos (y con ellos el claim 'rol' que llevan).
+    """
+    if instance.pk is None or (update_fields is not None and not CAMPOS_VIGILADOS & set(update_fields)):
+        return
+    anterior = Usuario.objects.filter(pk=instance.pk).values('rol_id', 'is_active', 'password').first()
+    if anterior is None:
+        return
+    if (anterior['rol_id'] != instance.rol_id or anterior['password'] != instance.password
+            or (anterior['is_active'] and not instance.is_active)):
+        revocar_usuario(instance.pk)
+
+
+@receiver(post_delete, sender=Usuario)
+def olvidar_usuario(sender, instance, **kwargs):
+    revocar_usuario(instance.pk)
+
+
+@receiver(post_save, sender=Rol)
+@receiver(post_delete, sender=Rol)
+def rol_modificado(sender, instance, created=False, **kwargs):
+    """Un Rol nuevo no afecta a nadie; renombrarlo o borrarlo cambia el rol de sus usuarios."""
+    if not created:
+        invalidar_todos()
@@ -1,10 +1,22 @@
+import time
+from types import SimpleNamespace
+from unittest import mock
+
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.db import connection
+from django.core.cache import caches
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
 from .models import Usuario, Rol
-from .serializers import UsuarioSerializer
+from .serializers import UsuarioSerializer, CustomTokenObtainPairSerializer
+from .autenticacion import JWTSinConsultaAuthentication, revocar_token
+from .roles import rol_de
 
 User = get_user_model()
 
@@ -103,6 +115,17 @@ class UsuarioAPITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 2)
 
+    def test_listar_usuarios_consultas_constantes(self):
+        """Prueba que el listado no haga consultas por usuario (groups/user_permissions)"""
+        url = reverse('usuario-list')
+        with CaptureQueriesContext(connection) as pocos:
+            self.client.get(url, format='json')
+        for i in range(10):
+            Usuario.objects.create_user(username=f'extra{i}', password='extrapass123')
+        with CaptureQueriesContext(connection) as muchos:
+            self.client.get(url, format='json')
+        self.assertEqual(len(pocos.captured_queries), len(muchos.captured_queries))
+
     def test_crear_usuario_sin_autenticacion(self):
         """Prueba crear usuario SIN autenticación"""
         self.client.force_authenticate(user=None)  
@@ -246,4 +269,134 @@ class UsuarioSerializerTests(TestCase):
         self.assertIn('username', serializer.data)
         self.assertIn('email', serializer.data)
         self.assertIn('rol', serializer.data)
-        self.assertIn('telefono', serializer.data)
\ No newline at end of file
+        self.assertIn('telefono', serializer.data)
+
+class RolCacheTests(APITestCase):
+    """Resolucion del rol para los permisos: claim del JWT solo con cache compartida, si no la base"""
+
+    def setUp(self):
+        self.peticion = SimpleNamespace
+        self.rol_admin = Rol.objects.create(name='administrador')
+        self.rol_cliente = Rol.objects.create(name='cliente')
+        self.usuario = Usuario.objects.create_user(
+            username='roluser', password='rolpass123', rol=self.rol_admin)
+        caches['default'].clear()  # Marcas de cambio del alta: iat tiene resolucion de segundos
+
+    def _compartida(self):
+        return mock.patch('apps.usuario.roles.cache_compartida', return_value=True)
+
+    def _token(self):
+        return CustomTokenObtainPairSerializer.get_token(self.usuario).access_token
+
+    def _rol(self, auth=None):
+        usuario = Usuario.objects.get(pk=self.usuario.pk)  # Instancia nueva: sin el Rol ya cargado
+        return rol_de(self.peticion(user=usuario, auth=auth))
+
+    def test_rol_desde_la_base_una_vez_por_usuario(self):
+        peticion = self.peticion(user=Usuario.objects.get(pk=self.usuario.pk), auth=None)
+        with self.assertNumQueries(1):
+            self.assertEqual(rol_de(peticion), 'administrador')
+            self.assertEqual(rol_de(peticion), 'administrador')  # El Rol queda cargado en el usuario
+        with self.assertNumQueries(0):
+            self.assertIsNone(rol_de(self.peticion(user=Usuario(pk=self.usuario.pk), auth=None)))
+
+    def test_claim_del_token_evita_consultas_con_cache_compartida(self):
+        usuario = Usuario(pk=self.usuario.pk, rol_id=self.rol_admin.pk)
+        token = self._token()
+        with self._compartida(), self.assertNumQueries(0):
+            self.assertEqual(rol_de(self.peticion(user=usuario, auth=token)), 'administrador')
+
+    def test_con_cache_local_el_claim_no_se_usa(self):
+        # Un cambio hecho en otro proceso no se veria: se lee la base aunque el claim diga otra cosa
+        token = self._token()
+        Usuario.objects.filter(pk=self.usuario.pk).update(rol=self.rol_cliente)  # Sin señales
+        self.assertEqual(self._rol(token), 'cliente')
+
+    def test_cambio_de_rol_invalida_claims_previos(self):
+        token = self._token()
+        with self._compartida():
+            self.assertEqual(self._rol(token), 'administrador')
+            self.usuario.rol = self.rol_cliente
+            self.usuario.save()
+            self.assertEqual(self._rol(token), 'cliente')
+
+    def test_renombrar_rol_invalida_claims_previos(self):
+        token = self._token()
+        with self._compartida():
+            self.rol_admin.name = 'gerente'
+            self.rol_admin.save()
+            self.assertEqual(self._rol(token), 'gerente')
+
+    def test_refresh_actualiza_el_claim_rol(self):
+        refresh = CustomTokenObtainPairSerializer.get_token(self.usuario)
+        self.usuario.rol = self.rol_cliente
+        self.usuario.save()
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(AccessToken(response.data['access'])['rol'], 'cliente')
+
+    def test_login_incluye_rol(self):
+        response = self.client.post(reverse('token_obtain_pair'),
+                                    {'username': 'roluser', 'password': 'rolpass123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user']['rol'], 'administrador')
+
+
+class JWTSinConsultaTests(APITestCase):
+    """Autenticacion con los claims del token y lista de revocacion"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.autenticacion = JWTSinConsultaAuthentication()
+        self.rol = Rol.objects.create(name='empleado')
+        self.usuario = Usuario.objects.create_user(
+            username='jwtuser', password='jwtpass123', email='jwt@example.com', rol=self.rol)
+
+    def _token(self):
+        return CustomTokenObtainPairSerializer.get_token(self.usuario).access_token
+
+    def _autenticar(self, token):
+        return self.autenticacion.get_user(self.autenticacion.get_validated_token(str(token)))
+
+    def test_usuario_sin_consultas_y_carga_diferida(self):
+        token = self._token()
+        with self.assertNumQueries(0):
+            usuario = self._autenticar(token)
+            self.assertIsInstance(usuario, Usuario)
+            self.assertEqual(usuario.pk, self.usuario.pk)
+            self.assertEqual(usuario.username, 'jwtuser')
+            self.assertTrue(usuario.is_authenticated)
+        with self.assertNumQueries(1):
+            self.assertEqual(usuario.rol_id, self.rol.pk)
+
+    def test_desactivar_usuario_revoca_sus_tokens(self):
+        token = self._token()
+        self.usuario.is_active = False
+        self.usuario.save()
+        with self.assertRaises(AuthenticationFailed):
+            self._autenticar(token)
+
+    def test_cambio_de_contrasena_revoca_y_tokens_nuevos_funcionan(self):
+        # iat tiene resolucion de segundos: el token viejo y la revocacion se fijan en segundos previos
+        token = self._token()
+        token['iat'] -= 2
+        with mock.patch('apps.usuario.autenticacion.time') as reloj:
+            reloj.time.return_value = time.time() - 1
+            self.usuario.set_password('otra-clave-123')
+            self.usuario.save()
+        with self.assertRaises(AuthenticationFailed):
+            self._autenticar(token)
+
+        self.assertEqual(self._autenticar(self._token()).pk, self.usuario.pk)
+
+    def test_revocar_token_individual(self):
+        token, otro = self._token(), self._token()
+        revocar_token(token)
+        with self.assertRaises(AuthenticationFailed):
+            self._autenticar(token)
+        self.assertEqual(self._autenticar(otro).pk, self.usuario.pk)
+
+    def test_actualizar_last_login_no_revoca(self):
+        token = self._token()
+        update_last_login(None, self.usuario)
+        self.assertEqual(self._autenticar(token).pk, self.usuario.pk)
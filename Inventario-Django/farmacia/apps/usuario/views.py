@@ -13,7 +13,8 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 
 
 class UsuarioViewset(viewsets.ModelViewSet):
-    queryset = Usuario.objects.all()
+    # UsuarioSerializer incluye los M2M groups/user_permissions
+    queryset = Usuario.objects.prefetch_related('groups', 'user_permissions')
     serializer_class = UsuarioSerializer
 
 class RolViewset(viewsets.ModelViewSet):
@@ -1,18 +1,217 @@
-import time
+"""Metricas de peticiones agregadas en el proceso y expuestas en /metrics.
+
+Por cada peticion se mide, con reloj monotono:
+
+- latencia (histograma), por metodo, ruta y codigo de estado (los metodos
+  fuera del estandar HTTP se agrupan como 'other');
+- consultas SQL (histograma) y tiempo en la base de datos;
+- bytes de la respuesta (las respuestas en streaming no se cuentan).
+
+La ruta es el nombre resuelto de la URL (p. ej. `producto-list`), no el path,
+para que /productos/1/ y /productos/2/ compartan serie. Los contadores viven en
+memoria del proceso: con varios workers cada uno expone los suyos.
+
+/metrics responde en el formato de texto de Prometheus. Con METRICAS_TOKEN
+exige la cabecera `Authorization: Bearer <token>` (es lo que sirve detras de
+un proxy como el de Render, donde REMOTE_ADDR es la IP del proxy); sin token
+solo responde a las IPs de METRICAS_IPS_PERMITIDAS, que se comparan con
+REMOTE_ADDR y por eso solo valen sin proxy delante.
+"""
+
+import hmac
 import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
 logger = logging.getLogger(__name__)
 
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Segundos
+BUCKETS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIN_RUTA = 'sin_ruta'  # 404 y rutas fuera del URLconf: una sola serie
+METODOS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'})
+OTRO_METODO = 'other'  # El metodo lo elige el cliente: sin esto cada verbo inventado abre series nuevas
+
+
+class Histograma:
+    """Conteos acumulables por bucket, mas suma y total (formato Prometheus)."""
+
+    __slots__ = ('buckets', 'conteos', 'suma', 'total')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.conteos = [0] * (len(buckets) + 1)  # El ultimo es +Inf
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.conteos[bisect_left(self.buckets, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def acumulados(self):
+        acumulado = 0
+        for limite, conteo in zip(self.buckets + ('+Inf',), self.conteos):
+            acumulado += conteo
+            yield limite, acumulado
+
+
+class SerieRuta:
+    __slots__ = ('latencia', 'consultas', 'segundos_db', 'bytes_respuesta')
+
+    def __init__(self):
+        self.latencia = Histograma(BUCKETS_LATENCIA)
+        self.consultas = Histograma(BUCKETS_CONSULTAS)
+        self.segundos_db = 0.0
+        self.bytes_respuesta = 0
+
+
+class RegistroMetricas:
+    """Series por (metodo, ruta, estado), protegidas con un lock."""
+
+    def __init__(self):
+        self._series = {}
+        self._contadores = {}  # nombre -> (ayuda, {etiquetas: valor}), para otros modulos
+        self._lock = threading.Lock()
+
+    def registrar(self, metodo, ruta, estado, segundos, consultas, segundos_db, bytes_respuesta):
+        clave = (metodo, ruta, str(estado))
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = SerieRuta()
+            serie.latencia.observar(segundos)
+            serie.consultas.observar(consultas)
+            serie.segundos_db += segundos_db
+            serie.bytes_respuesta += bytes_respuesta
+
+    def incrementar(self, nombre, ayuda, **etiquetas):
+        """Suma 1 a un contador propio (p. ej. aciertos de una cache), exportado junto a las series."""
+        clave = tuple(sorted(etiquetas.items()))
+        with self._lock:
+            _, valores = self._contadores.setdefault(nombre, (ayuda, {}))
+            valores[clave] = valores.get(clave, 0) + 1
+
+    def limpiar(self):
+        with self._lock:
+            self._series.clear()
+            self._contadores.clear()
+
+    def serie(self, metodo, ruta, estado):
+        return self._series.get((metodo, ruta, str(estado)))
+
+    def contador(self, nombre, **etiquetas):
+        _, valores = self._contadores.get(nombre, (None, {}))
+        return valores.get(tuple(sorted(etiquetas.items())), 0)
+
+    def exportar(self):
+        """Texto en el formato de exposicion de Prometheus."""
+        with self._lock:
+            series = sorted(self._series.items())
+            lineas = []
+            _histograma(lineas, 'farmacia_http_request_duration_seconds',
+                        'Latencia de las peticiones HTTP.', series, 'latencia')
+            _histograma(lineas, 'farmacia_http_request_db_queries',
+                        'Consultas SQL por peticion.', series, 'consultas')
+            _contador(lineas, 'farmacia_http_request_db_seconds_total',
+                      'Tiempo total en la base de datos.', series, 'segundos_db')
+            _contador(lineas, 'farmacia_http_response_bytes_total',
+                      'Bytes enviados en respuestas no streaming.', series, 'bytes_respuesta')
+            for nombre, (ayuda, valores) in sorted(self._contadores.items()):
+                lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} counter']
+                for clave, valor in sorted(valores.items()):
+                    etiquetas = ','.join(f'{k}="{_escapar(v)}"' for k, v in clave)
+                    lineas.append(f'{nombre}{{{etiquetas}}} {valor}')
+        return '\n'.join(lineas) + '\n'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _etiquetas(clave, **extra):
+    metodo, ruta, estado = clave
+    valores = {'method': metodo, 'route': ruta, 'status': estado, **extra}
+    return ','.join(f'{k}="{_escapar(v)}"' for k, v in valores.items())
+
+
+def _histograma(lineas, nombre, ayuda, series, atributo):
+    lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} histogram']
+    for clave, serie in series:
+        histograma = getattr(serie, atributo)
+        for limite, acumulado in histograma.acumulados():
+            lineas.append(f'{nombre}_bucket{{{_etiquetas(clave, le=limite)}}} {acumulado}')
+        lineas.append(f'{nombre}_sum{{{_etiquetas(clave)}}} {histograma.suma:.6f}')
+        lineas.append(f'{nombre}_count{{{_etiquetas(clave)}}} {histograma.total}')
+
+
+def _contador(lineas, nombre, ayuda, series, atributo):
+    lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} counter']
+    for clave, serie in series:
+        lineas.append(f'{nombre}{{{_etiquetas(clave)}}} {getattr(serie, atributo)}')
+
+
+registro = RegistroMetricas()
+
+
+class _MedidorSQL:
+    """execute_wrapper que cuenta las consultas de la peticion y su duracion."""
+
+    __slots__ = ('consultas', 'segundos')
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.consultas += 1
+
+
 class MetricsMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        start = time.time()
+        medidor = _MedidorSQL()
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(medidor))
+            response = self.get_response(request)
+        segundos = time.perf_counter() - inicio
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        ruta = coincidencia.view_name if coincidencia and coincidencia.view_name else SIN_RUTA
+        tamano = 0 if response.streaming else len(response.content)
+        metodo = request.method if request.method in METODOS else OTRO_METODO
+        registro.registrar(metodo, ruta, response.status_code, segundos,
+                           medidor.consultas, medidor.segundos, tamano)
+
+        if segundos * 1000 >= settings.METRICAS_PETICION_LENTA_MS:
+            logger.warning("[METRICA] %s %s (%s) - %.1f ms, %d consultas",
+                           request.method, request.path, ruta, segundos * 1000, medidor.consultas)
+        return response
 
-        response = self.get_response(request)
 
-        duration = round((time.time() - start) * 1000, 2)
+def _autorizada(request):
+    if settings.METRICAS_TOKEN:
+        cabecera = request.META.get('HTTP_AUTHORIZATION', '')
+        return hmac.compare_digest(cabecera.encode(), f'Bearer {settings.METRICAS_TOKEN}'.encode())
+    return request.META.get('REMOTE_ADDR') in settings.METRICAS_IPS_PERMITIDAS
 
-        logger.info(f"[METRICA] {request.method} {request.path} - {duration}ms")
 
-        return response
\ No newline at end of file
+def vista_metricas(request):
+    """GET /metrics: metricas del proceso en formato Prometheus (con token o desde IPs permitidas)."""
+    if not _autorizada(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registro.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
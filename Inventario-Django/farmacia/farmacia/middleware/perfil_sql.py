@@ -0,0 +1,160 @@
+"""Modo de perfilado SQL por peticion, con deteccion de N+1.
+
+Se activa para todas las peticiones con PERFIL_SQL_ACTIVO, o para una sola
+enviando la cabecera `X-Perfil-SQL: 1` (si PERFIL_SQL_CABECERA lo permite;
+por defecto solo con DEBUG). Mientras dura la peticion un execute_wrapper
+anota cada sentencia, su duracion y la pila de Python que la lanzo.
+
+Las sentencias se agrupan por forma normalizada (sin literales ni listas
+IN de largo variable). Una forma que se repite PERFIL_SQL_UMBRAL_N1 veces o
+mas se marca como probable N+1, con la pila de su primera ejecucion y, si
+la lanzo un serializer de DRF, el campo que la provoco.
+
+La respuesta lleva un resumen en `X-Perfil-SQL` y un id en `X-Perfil-SQL-Id`;
+el informe completo se guarda en la cache y se lee en
+/debug/perfil-sql/<id>/ (mismas IPs que /metrics).
+"""
+
+import logging
+import re
+import sys
+import time
+import traceback
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponseForbidden, JsonResponse
+from rest_framework.fields import Field
+
+logger = logging.getLogger(__name__)
+
+CABECERA = 'HTTP_X_PERFIL_SQL'
+PREFIJO_CACHE = 'perfil-sql:'
+FRAMES_POR_PILA = 12
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r'\((?:\s*(?:%s|\?|:\w+)\s*,)+\s*(?:%s|\?|:\w+)\s*\)')
+_ESPACIOS = re.compile(r'\s+')
+_INTERNOS = ('/django/', '/rest_framework/', '/farmacia/middleware/', '/asgiref/', '/contextlib.py')
+
+
+def forma_sql(sql):
+    """Normaliza una sentencia: literales -> ?, IN (%s, %s, ...) -> (...)."""
+    sql = _LITERALES.sub('?', sql)
+    sql = _LISTAS.sub('(...)', sql)
+    return _ESPACIOS.sub(' ', sql).strip()
+
+
+def _campo_serializer(frame):
+    """Campo de DRF que se estaba leyendo cuando se lanzo la consulta (p. ej. un source='x.nombre')."""
+    while frame is not None:
+        campo = frame.f_locals.get('self') if frame.f_code.co_name == 'get_attribute' else None
+        if isinstance(campo, Field) and campo.parent is not None:
+            return f"{type(campo.parent).__name__}.{campo.field_name} (source='{campo.source}')"
+        frame = frame.f_back
+    return None
+
+
+def _pila():
+    """Pila de la consulta: frames recientes (sin django.db), origen en el proyecto y campo de DRF."""
+    frames = [f for f in traceback.extract_stack()[:-2] if '/django/db/' not in f.filename]
+    lineas = [f'{f.filename}:{f.lineno} en {f.name}' for f in frames]
+    origen = next((
+        linea for linea in reversed(lineas)
+        if 'site-packages' not in linea and not any(interno in linea for interno in _INTERNOS)
+    ), None)
+    return lineas[-FRAMES_POR_PILA:], origen, _campo_serializer(sys._getframe(2))
+
+
+class _Grabador:
+    """execute_wrapper que agrupa las sentencias de la peticion por forma."""
+
+    def __init__(self):
+        self.formas = {}
+        self.consultas = 0
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.consultas += 1
+            self.segundos += duracion
+            forma = forma_sql(sql)
+            grupo = self.formas.get(forma)
+            if grupo is None:
+                pila, origen, campo = _pila()
+                grupo = self.formas[forma] = {'sql': forma, 'veces': 0, 'ms': 0.0,
+                                              'origen': origen, 'campo': campo, 'pila': pila}
+            grupo['veces'] += 1
+            grupo['ms'] += duracion * 1000
+
+    def informe(self, request, response):
+        umbral = settings.PERFIL_SQL_UMBRAL_N1
+        formas = sorted(self.formas.values(), key=lambda g: (-g['veces'], -g['ms']))
+        for grupo in formas:
+            grupo['ms'] = round(grupo['ms'], 3)
+            grupo['n_mas_1'] = grupo['veces'] >= umbral
+            if not grupo['n_mas_1']:
+                del grupo['pila']  # La pila solo interesa en las formas repetidas
+        return {
+            'metodo': request.method,
+            'path': request.get_full_path(),
+            'estado': response.status_code,
+            'consultas': self.consultas,
+            'ms_db': round(self.segundos * 1000, 3),
+            'n_mas_1': sum(grupo['n_mas_1'] for grupo in formas),
+            'formas': formas,
+        }
+
+
+def _perfilar(request):
+    if settings.PERFIL_SQL_ACTIVO:
+        return True
+    return settings.PERFIL_SQL_CABECERA and request.META.get(CABECERA) in ('1', 'true')
+
+
+class PerfilSQLMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _perfilar(request):
+            return self.get_response(request)
+
+        grabador = _Grabador()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(grabador))
+            response = self.get_response(request)
+
+        informe = grabador.informe(request, response)
+        perfil_id = uuid.uuid4().hex
+        cache.set(PREFIJO_CACHE + perfil_id, informe, settings.PERFIL_SQL_EXPIRACION)
+        response['X-Perfil-SQL'] = (
+            f"consultas={informe['consultas']}; ms_db={informe['ms_db']}; "
+            f"formas={len(informe['formas'])}; n+1={informe['n_mas_1']}"
+        )
+        response['X-Perfil-SQL-Id'] = perfil_id
+
+        for grupo in informe['formas']:
+            if grupo['n_mas_1']:
+                logger.warning("[PERFIL SQL] Probable N+1 en %s %s: %d x %s (origen: %s)",
+                               request.method, request.path, grupo['veces'], grupo['sql'][:200],
+                               grupo['campo'] or grupo['origen'])
+        return response
+
+
+def vista_perfil_sql(request, perfil_id):
+    """GET /debug/perfil-sql/<id>/: informe completo de una peticion perfilada."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICAS_IPS_PERMITIDAS:
+        return HttpResponseForbidden()
+    informe = cache.get(PREFIJO_CACHE + perfil_id)
+    if informe is None:
+        return JsonResponse({'detail': 'Perfil no encontrado o expirado.'}, status=404)
+    return JsonResponse(informe)
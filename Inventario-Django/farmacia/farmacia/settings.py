@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'farmacia.middleware.metrics.MetricsMiddleware',  # Primero: mide toda la pila
+    'farmacia.middleware.perfil_sql.PerfilSQLMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -55,20 +57,65 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    # 'farmacia.middleware.metrics.MetricsMiddleware',
 ]
 
+# Metricas por ruta en /metrics (ver farmacia/middleware/metrics.py)
+# Detras de un proxy REMOTE_ADDR es el proxy: ahi se usa METRICAS_TOKEN (Authorization: Bearer)
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+METRICAS_IPS_PERMITIDAS = os.environ.get('METRICAS_IPS_PERMITIDAS', '127.0.0.1,::1').split(',')  # Sin token
+METRICAS_PETICION_LENTA_MS = int(os.environ.get('METRICAS_PETICION_LENTA_MS', 1000))  # Se registran en el log
+
+# Perfilado SQL por peticion (ver farmacia/middleware/perfil_sql.py)
+PERFIL_SQL_ACTIVO = os.environ.get('PERFIL_SQL_ACTIVO', 'false').lower() == 'true'  # Todas las peticiones
+PERFIL_SQL_CABECERA = os.environ.get('PERFIL_SQL_CABECERA', str(DEBUG)).lower() == 'true'  # X-Perfil-SQL: 1
+PERFIL_SQL_UMBRAL_N1 = int(os.environ.get('PERFIL_SQL_UMBRAL_N1', 5))
+PERFIL_SQL_EXPIRACION = int(os.environ.get('PERFIL_SQL_EXPIRACION', 600))
+
 ROOT_URLCONF = 'farmacia.urls'
 
+# Redis compartido por todos los procesos (en Render, el servicio Key Value de
+# render.yaml). Sin REDIS_URL todas las caches son locales del proceso.
+REDIS_URL = os.environ.get('REDIS_URL')
+
+# JWT_SIN_CONSULTA=true: el usuario se arma con los claims del token en lugar de
+# leer la tabla Usuario en cada peticion (apps/usuario/autenticacion.py).
+# Las revocaciones viven en la cache JWT_DENYLIST_CACHE, que debe ser
+# compartida y sobrevivir a los reinicios: solo entonces roles.py confia en el
+# claim 'rol' y los permisos no consultan la tabla Rol. Con REDIS_URL se usa
+# Redis; con la cache local ('default') el rol se lee de la base.
+JWT_SIN_CONSULTA = os.environ.get('JWT_SIN_CONSULTA', 'False').lower() == 'true'
+JWT_DENYLIST_CACHE = os.environ.get('JWT_DENYLIST_CACHE', 'compartida' if REDIS_URL else 'default')
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.usuario.autenticacion.JWTSinConsultaAuthentication'
+        if JWT_SIN_CONSULTA
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     # 'DEFAULT_PERMISSION_CLASSES': [
     #     'rest_framework.permissions.IsAuthenticated',
     # ],
+    # JSON con orjson (si esta instalado); misma salida que el JSONRenderer de DRF
+    'DEFAULT_RENDERER_CLASSES': (
+        'apps.task.renderers.JSONRapidoRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'apps.task.renderers.JSONRapidoParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'apps.task.pagination.PaginacionPorPagina',
+    'PAGE_SIZE': int(os.environ.get('PAGE_SIZE', 100)),
 }
 
+# Listados de productos, movimientos y detalles con values() en lugar del
+# serializer por fila (misma salida; ver apps/task/lectura_rapida.py)
+LECTURA_RAPIDA = os.environ.get('LECTURA_RAPIDA', 'true').lower() == 'true'
+
+# Tope para ?page_size= en todos los listados
+PAGINACION_MAX_PAGE_SIZE = int(os.environ.get('PAGINACION_MAX_PAGE_SIZE', 1000))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -120,8 +167,73 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Con escrituras concurrentes (ventas y movimientos a la vez) una transaccion
+        # diferida falla con "database is locked" al pasar de lectura a escritura;
+        # IMMEDIATE toma el bloqueo al empezar y las demas esperan hasta `timeout` s.
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+    }
+}
+
+
+# Caches
+# 'reportes' guarda los PDFs generados (ver apps/task/reportes.py). Por defecto
+# vive en la memoria del proceso; con REPORTES_CACHE_DIR se guarda en disco.
+# MAX_ENTRIES limita cuantos reportes se conservan (se descartan los mas viejos).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reportes': {
+        'BACKEND': (
+            'django.core.cache.backends.filebased.FileBasedCache'
+            if os.environ.get('REPORTES_CACHE_DIR')
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('REPORTES_CACHE_DIR', 'reportes-pdf'),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('REPORTES_CACHE_MAX_ENTRIES', 50))},
+    },
+}
+if REDIS_URL:
+    CACHES['compartida'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
     }
+REPORTES_CACHE_ALIAS = 'reportes'
+
+# Listados de categorias, proveedores y productos (apps/task/cache_catalogo.py).
+# Memoria local por defecto; CATALOGO_CACHE_BACKEND/LOCATION admiten cualquier
+# backend de Django (p. ej. django.core.cache.backends.redis.RedisCache).
+CACHES['catalogo'] = {
+    'BACKEND': os.environ.get('CATALOGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+    'LOCATION': os.environ.get('CATALOGO_CACHE_LOCATION', 'catalogo'),
 }
+CATALOGO_CACHE_ALIAS = 'catalogo'
+CATALOGO_CACHE_ACTIVO = os.environ.get('CATALOGO_CACHE_ACTIVO', 'true').lower() == 'true'
+CATALOGO_CACHE_SEGUNDOS = int(os.environ.get('CATALOGO_CACHE_SEGUNDOS', 5 * 60))  # Tope para cambios hechos por fuera de Django
+# Con LocMem cada worker solo ve sus propias invalidaciones: los listados duran esto
+CATALOGO_CACHE_SEGUNDOS_LOCAL = int(os.environ.get('CATALOGO_CACHE_SEGUNDOS_LOCAL', 5))
+
+# Version del indice de autocompletado (apps/task/autocompletado.py). Con una
+# cache local los demas workers no ven la version: reconstruyen su indice cada
+# AUTOCOMPLETADO_SEGUNDOS_LOCAL.
+AUTOCOMPLETADO_CACHE_ALIAS = 'compartida' if REDIS_URL else 'default'
+AUTOCOMPLETADO_SEGUNDOS_LOCAL = int(os.environ.get('AUTOCOMPLETADO_SEGUNDOS_LOCAL', 30))
+REPORTES_CACHE_MAX_BYTES = int(os.environ.get('REPORTES_CACHE_MAX_BYTES', 5 * 1024 * 1024))  # PDFs mas grandes no se guardan
+REPORTES_CACHE_TIMEOUT = int(os.environ.get('REPORTES_CACHE_TIMEOUT', 24 * 60 * 60))
+
+# Reportes en segundo plano (apps/task/cola_reportes.py)
+REPORTES_COLA = os.environ.get('REPORTES_COLA', 'memoria')  # 'memoria' o 'db'
+REPORTES_MAX_CONCURRENCIA = int(os.environ.get('REPORTES_MAX_CONCURRENCIA', 2))  # Hilos que generan PDFs
+REPORTES_MAX_PENDIENTES_POR_USUARIO = int(os.environ.get('REPORTES_MAX_PENDIENTES_POR_USUARIO', 5))
+REPORTES_EXPIRACION = int(os.environ.get('REPORTES_EXPIRACION', 60 * 60))  # Segundos que se conserva un reporte listo
+REPORTES_TIMEOUT_PROCESANDO = int(os.environ.get('REPORTES_TIMEOUT_PROCESANDO', 30 * 60))  # Sin latido por este tiempo se reclama (proceso caido)
+REPORTES_MAX_TERMINADOS_MEMORIA = int(os.environ.get('REPORTES_MAX_TERMINADOS_MEMORIA', 50))  # Cola 'memoria': PDFs listos que se conservan
+REPORTES_EJECUCION_INMEDIATA = False  # True: se genera dentro de la peticion (pruebas)
+
+# Sincronizacion incremental /farmacia/sync/?since= (apps/task/sincronizacion.py)
+SINCRONIZACION_MAX_FILAS = int(os.environ.get('SINCRONIZACION_MAX_FILAS', 5000))  # Por recurso y llamada (>= un lote de importacion)
+SINCRONIZACION_MARGEN_SEGUNDOS = int(os.environ.get('SINCRONIZACION_MARGEN_SEGUNDOS', 5))  # Solape del cursor
+SINCRONIZACION_RETENCION_DIAS = int(os.environ.get('SINCRONIZACION_RETENCION_DIAS', 90))  # Marcas de borrado
 
 
 # Password validation
@@ -175,6 +287,9 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
     "USER_ID_FIELD": "id",
     "USER_ID_CLAIM": "user_id",
+    # Agregan el claim 'rol' que usan los permisos (apps/usuario/roles.py)
+    "TOKEN_OBTAIN_SERIALIZER": "apps.usuario.serializers.CustomTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "apps.usuario.serializers.CustomTokenRefreshSerializer",
 }
 
 
@@ -187,6 +302,8 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+# Cabeceras de paginacion que el frontend debe poder leer
+CORS_EXPOSE_HEADERS = ['Link', 'X-Total-Count']
 
 # Agrega esto temporalmente al final de settings.py
 LOGGING = {
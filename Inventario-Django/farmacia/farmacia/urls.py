@@ -5,6 +5,9 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from farmacia.middleware.metrics import vista_metricas
+from farmacia.middleware.perfil_sql import vista_perfil_sql
+
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -34,6 +37,10 @@ urlpatterns = [
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
+    # Metricas de peticiones (formato Prometheus)
+    path('metrics', vista_metricas, name='metricas'),
+    path('debug/perfil-sql/<str:perfil_id>/', vista_perfil_sql, name='perfil-sql'),
+
     # Documentación Swagger y Redoc
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),